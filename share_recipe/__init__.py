@@ -10,7 +10,48 @@ def create_app(test_config=None):
         SECRET_KEY='dev',
         DATABASE=os.path.join(app.instance_path, 'share_recipe.sqlite'),
         UPLOAD_FOLDER=os.path.join('share_recipe', 'static', 'uploads'),
-        MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max-limit
+        MAX_CONTENT_LENGTH = 16 * 1024 * 1024,  # 16MB max-limit
+        UPLOAD_TYPE_LIMITS={  # bytes per uploaded image, by type sniffed from its content
+            'jpg': 8 * 1024 * 1024,
+            'png': 8 * 1024 * 1024,
+            'gif': 4 * 1024 * 1024,
+        },
+        DATABASE_POOL_SIZE=5,
+        DATABASE_POOL_TIMEOUT=30.0,
+        DATABASE_BUSY_TIMEOUT=5000,  # ms
+        DATABASE_CACHE_SIZE=-16000,  # negative = KiB, ~16MB page cache
+        DATABASE_MMAP_SIZE=256 * 1024 * 1024,
+        AUTO_MIGRATE=True,
+        SQL_INSTRUMENTATION=True,
+        SQL_SLOW_QUERY_MS=100,
+        SQL_N_PLUS_ONE_THRESHOLD=5,  # same statement shape per request
+        SQL_DEBUG_HEADERS=False,  # X-SQL-* / Server-Timing (always on in debug)
+        SEARCH_PER_PAGE=12,
+        SEARCH_MAX_RESULTS=600,  # hard cap: no page beyond this many results
+        SEARCH_CACHE_SIZE=256,  # entries; 0 disables the search result cache
+        SEARCH_CACHE_TTL=60.0,  # seconds
+        COMMENTS_PER_PAGE=20,
+        REPLIES_PER_PAGE=20,
+        CACHE_BACKEND='memory',  # 'memory', 'sqlite' (shared by workers) or 'null'
+        CACHE_DEFAULT_TTL=300.0,  # seconds
+        CACHE_STALE_TTL=60.0,  # serve an expired entry this long while it is refreshed
+        CACHE_WAIT_TIMEOUT=10.0,  # seconds to wait for another request computing the same key
+        CACHE_MAX_ENTRIES=1024,
+        CACHE_PATH=os.path.join(app.instance_path, 'cache.sqlite'),
+        HTTP_CACHE_MAX_AGE=30,  # seconds a proxy may reuse an anonymous page
+        USER_CACHE_SIZE=1024,  # logged-in users kept per process
+        USER_CACHE_TTL=30.0,  # seconds; blocks and role changes apply at once (user_generation)
+        FRAGMENT_CACHE_SIZE=2048,  # rendered recipe cards per process; 0 disables
+        FRAGMENT_CACHE_TTL=3600.0,
+        JOBS_EMBEDDED_WORKER=True,  # run jobs in each web process; False with `flask worker`
+        JOBS_WORKER_THREADS=2,
+        JOBS_POLL_INTERVAL=5.0,  # seconds between checks when no job was enqueued here
+        JOBS_MAX_ATTEMPTS=5,
+        JOBS_RETRY_DELAY=10.0,  # seconds before the first retry, doubled each time
+        JOBS_LEASE=300.0,  # seconds before a job claimed by a dead worker runs again
+        UPLOAD_GC_INTERVAL=24 * 3600.0,  # seconds between sweeps of uploads/blobs; 0 disables
+        UPLOAD_GC_GRACE=24 * 3600.0,  # never delete files younger than this
+        UPLOAD_GC_BATCH_SIZE=500,  # files deleted per write transaction
     )
 
     if test_config is None:
@@ -39,15 +80,62 @@ def create_app(test_config=None):
     
     from . import db
     db.init_app(app)
+
+    from . import migrate
+    migrate.init_app(app)
+
+    from . import query_plans
+    query_plans.init_app(app)
+
+    from . import counters
+    counters.init_app(app)
+
+    from . import recipe_search
+    recipe_search.init_app(app)
+
+    from . import ingredients
+    ingredients.init_app(app)
+
+    from . import autocomplete
+    autocomplete.init_app(app)
+
+    from . import search_cache
+    search_cache.init_app(app)
+
+    from . import cache
+    cache.init_app(app)
+
+    from . import http_cache
+    http_cache.init_app(app)
+
+    from . import fragments
+    fragments.init_app(app)
+
+    from . import images
+    images.init_app(app)
+
+    from . import storage
+    storage.init_app(app)
+
+    from . import jobs
+    jobs.init_app(app)
+
+    from . import upload_gc
+    upload_gc.init_app(app)
     
-    # Khởi tạo database và tạo admin mặc định chỉ khi database chưa tồn tại
+    # Áp dụng các migration còn thiếu; tạo admin mặc định chỉ khi database chưa tồn tại
     with app.app_context():
-        if not os.path.exists(app.config['DATABASE']):
-            db.init_db()
+        is_new_database = not os.path.exists(app.config['DATABASE'])
+        if is_new_database or app.config['AUTO_MIGRATE']:
+            migrate.upgrade()
+        if is_new_database:
             from . import admin
             admin.create_default_admin()
+        autocomplete.rebuild()
+        upload_gc.schedule()
     
     from . import auth
+    auth.init_app(app)
     app.register_blueprint(auth.bp)
     
     from . import blog
@@ -6,7 +6,8 @@ import string
 from flask import Blueprint, render_template, request, redirect, url_for, flash, g, abort, session
 from werkzeug.security import generate_password_hash
 
-from share_recipe.auth import login_required
+from share_recipe import autocomplete, cache, jobs, search_cache
+from share_recipe.auth import forget_user, login_required
 from share_recipe.db import get_db
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -19,6 +20,50 @@ def get_user_by_id(id):
         user['is_blocked'] = bool(user['is_blocked'])
     return user
 
+def release_post_images(db, post_ids):
+    """Queue deleting the image files of posts about to be deleted.
+
+    The jobs run after commit and keep files another row still uses.
+    """
+    for post_id in post_ids:
+        for image in db.execute(
+            'SELECT image_path, variants FROM blog_images WHERE post_id = ?', (post_id,)
+        ).fetchall():
+            jobs.enqueue('storage.release', path=image['image_path'], variants=image['variants'])
+
+def delete_user_rows(db, user_ids):
+    """Delete users together with the rows that reference them.
+
+    Several foreign keys to ``user`` (and ``saved_recipes.post_id``) have no
+    ON DELETE CASCADE, so with ``foreign_keys=ON`` they must be cleared first.
+    Their avatars and post images are deleted by background jobs after
+    commit. Returns the ids of the deleted posts.
+    """
+    params = [(user_id,) for user_id in user_ids]
+    post_ids = [
+        row['id'] for user_id in user_ids
+        for row in db.execute('SELECT id FROM post WHERE author_id = ?', (user_id,))
+    ]
+    release_post_images(db, post_ids)
+    for user_id in user_ids:
+        user = db.execute(
+            'SELECT avatar_path, avatar_variants FROM user WHERE id = ?', (user_id,)
+        ).fetchone()
+        if user and user['avatar_path']:
+            jobs.enqueue('storage.release', path=user['avatar_path'],
+                         variants=user['avatar_variants'])
+    db.executemany(
+        'DELETE FROM saved_recipes WHERE user_id = ? '
+        'OR post_id IN (SELECT id FROM post WHERE author_id = ?)',
+        [(user_id, user_id) for user_id in user_ids]
+    )
+    db.executemany('DELETE FROM comment_reactions WHERE user_id = ?', params)
+    db.executemany('DELETE FROM comment_replies WHERE author_id = ?', params)
+    db.executemany('DELETE FROM comments WHERE author_id = ?', params)
+    db.executemany('DELETE FROM post WHERE author_id = ?', params)
+    db.executemany('DELETE FROM user WHERE id = ?', params)
+    return post_ids
+
 @bp.route('/users')
 @login_required
 def users():
@@ -61,6 +106,7 @@ def create_user():
             except db.IntegrityError:
                 error = f"Email {email} đã được đăng ký."
             else:
+                cache.invalidate(cache.USERS)
                 return redirect(url_for("admin.users"))
 
         flash(error)
@@ -84,6 +130,7 @@ def block_user(id):
     db = get_db()
     db.execute('UPDATE user SET is_blocked = 1 WHERE id = ?', (id,))
     db.commit()
+    forget_user(id)
 
     return redirect(url_for('admin.users'))
 
@@ -100,6 +147,7 @@ def unblock_user(id):
     db = get_db()
     db.execute('UPDATE user SET is_blocked = 0 WHERE id = ?', (id,))
     db.commit()
+    forget_user(id)
 
     return redirect(url_for('admin.users'))
 
@@ -149,6 +197,8 @@ def update_user(id):
                     (username, role, id)
                 )
                 db.commit()
+                forget_user(id)
+                cache.invalidate(cache.PROFILES)
                 return redirect(url_for('admin.users'))
             except db.IntegrityError:
                 error = f"Lỗi khi cập nhật người dùng."
@@ -169,23 +219,22 @@ def delete_user(id):
 
     db = get_db()
     try:
-        db.execute('DELETE FROM user WHERE id = ?', (id,))
+        post_ids = delete_user_rows(db, [id])
         db.commit()
+        forget_user(id)
+        cache.invalidate(cache.USERS, cache.PROFILES, cache.LISTINGS)
+        autocomplete.remove_posts(post_ids)
     except Exception as e:
         logging.error(f"Lỗi khi xóa người dùng (ID: {id}): {e}")
         flash(f"Lỗi khi xóa người dùng.")
         db.rollback()
     return redirect(url_for('admin.users'))
 
-@bp.route('/')
-@login_required
-def dashboard():
-    if g.user['role'] != 'admin':
-        return redirect(url_for('index'))
-    
+@cache.cached('admin.dashboard', tags=(cache.USERS, cache.LISTINGS))
+def load_dashboard(total_users, total_posts, listing_generation, user_generation):
+    # Các tham số là khóa cache: đọc từ counters nên mọi process thấy thay đổi ngay,
+    # không phụ thuộc vào invalidate (chỉ có tác dụng trong process gọi nó)
     db = get_db()
-    total_users = db.execute('SELECT COUNT(*) as count FROM user').fetchone()['count']
-    total_posts = db.execute('SELECT COUNT(*) as count FROM post').fetchone()['count']
     recent_posts = db.execute('''
         SELECT p.*, u.email as author_email 
         FROM post p 
@@ -193,12 +242,42 @@ def dashboard():
         ORDER BY p.created DESC 
         LIMIT 5
     ''').fetchall()
+    return total_users, total_posts, [dict(post) for post in recent_posts]
+
+@bp.route('/')
+@login_required
+def dashboard():
+    if g.user['role'] != 'admin':
+        return redirect(url_for('index'))
+    
+    # Tổng số user/bài viết do trigger duy trì trong bảng counters
+    counters = dict(get_db().execute(
+        "SELECT name, value FROM counters "
+        "WHERE name IN ('users', 'posts', 'listing_generation', 'user_generation')"
+    ).fetchall())
+    total_users, total_posts, recent_posts = load_dashboard(
+        counters.get('users', 0), counters.get('posts', 0),
+        counters.get('listing_generation', 0), counters.get('user_generation', 0))
     
     return render_template('admin/dashboard.html', 
                          total_users=total_users,
                          total_posts=total_posts,
                          recent_posts=recent_posts)
 
+@bp.route('/search-cache')
+@login_required
+def search_cache_stats():
+    if g.user['role'] != 'admin':
+        return redirect(url_for('index'))
+    return search_cache.get_cache().stats()
+
+@bp.route('/cache')
+@login_required
+def cache_stats():
+    if g.user['role'] != 'admin':
+        return redirect(url_for('index'))
+    return cache.get_cache().stats()
+
 @bp.route('/posts')
 @login_required
 def posts():
@@ -210,8 +289,7 @@ def posts():
     
     # Base query with joins
     base_query = '''
-        SELECT p.*, u.username as author_name, u.email as author_email,
-        (SELECT COUNT(*) FROM favorites f WHERE f.post_id = p.id) as like_count
+        SELECT p.*, u.username as author_name, u.email as author_email
         FROM post p
         JOIN user u ON p.author_id = u.id
     '''
@@ -220,7 +298,7 @@ def posts():
     if sort_order == 'oldest':
         base_query += ' ORDER BY p.created ASC'
     elif sort_order == 'likes':
-        base_query += ' ORDER BY like_count DESC'
+        base_query += ' ORDER BY p.like_count DESC, p.created DESC'
     else:  # Default to newest
         base_query += ' ORDER BY p.created DESC'
     
@@ -239,8 +317,12 @@ def delete_post(id):
         abort(404)
     
     try:
+        release_post_images(db, [id])
+        db.execute('DELETE FROM saved_recipes WHERE post_id = ?', (id,))
         db.execute('DELETE FROM post WHERE id = ?', (id,))
         db.commit()
+        cache.invalidate(cache.LISTINGS, cache.post_tag(id))
+        autocomplete.remove_posts([id])
     except Exception as e:
         logging.error(f"Lỗi khi xóa bài viết (ID: {id}): {e}")
         flash(f"Lỗi khi xóa bài viết.")
@@ -257,8 +339,12 @@ def delete_posts():
     ids = request.json.get('ids', [])
     db = get_db()
     try:
+        release_post_images(db, ids)
+        db.executemany('DELETE FROM saved_recipes WHERE post_id = ?', [(id,) for id in ids])
         db.executemany('DELETE FROM post WHERE id = ?', [(id,) for id in ids])
         db.commit()
+        cache.invalidate(cache.LISTINGS, *[cache.post_tag(id) for id in ids])
+        autocomplete.remove_posts(ids)
     except Exception as e:
         logging.error(f"Error deleting posts: {e}")
         db.rollback()
@@ -274,8 +360,12 @@ def delete_users():
     ids = request.json.get('ids', [])
     db = get_db()
     try:
-        db.executemany('DELETE FROM user WHERE id = ?', [(id,) for id in ids])
+        post_ids = delete_user_rows(db, ids)
         db.commit()
+        for user_id in ids:
+            forget_user(user_id)
+        cache.invalidate(cache.USERS, cache.PROFILES, cache.LISTINGS)
+        autocomplete.remove_posts(post_ids)
     except Exception as e:
         logging.error(f"Error deleting users: {e}")
         db.rollback()
@@ -1,21 +1,37 @@
 import functools
-import secrets
-import os
-from werkzeug.utils import secure_filename
 
 from flask import (Blueprint, flash, g, redirect, render_template, request, session, url_for, current_app)
 from werkzeug.security import check_password_hash, generate_password_hash
 
+from share_recipe import cache, images, jobs, recipe_search, storage
 from share_recipe.db import get_db
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
+# Các cột của user mà view/template dùng qua g.user (không có mật khẩu)
+USER_COLUMNS = ('id, username, email, avatar_path, avatar_variants, role, is_blocked, '
+                'gender, birthdate, phone')
+
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def set_avatar(db, avatar_path, old_avatar):
+    """Đổi avatar của g.user trong transaction hiện tại.
+
+    Các bản WebP vuông được tạo và avatar cũ được xóa (nếu không còn ai dùng)
+    bằng job chạy ở background sau commit.
+    """
+    db.execute(
+        'UPDATE user SET avatar_path = ?, avatar_variants = NULL WHERE id = ?',
+        (avatar_path, g.user['id'])
+    )
+    jobs.enqueue('images.build_variants', kind=images.AVATAR, path=avatar_path)
+    if old_avatar[0]:
+        jobs.enqueue('storage.release', path=old_avatar[0], variants=old_avatar[1])
+
 @bp.route('/register', methods=('GET', 'POST'))
 def register():
     if request.method == 'POST':
@@ -46,6 +62,7 @@ def register():
                     (email, generate_password_hash(password), username, gender, birthdate, phone),
                 )
                 db.commit()
+                cache.invalidate(cache.USERS)
                 flash('Đăng ký thành công! Vui lòng đăng nhập.', 'success')
                 return redirect(url_for('auth.login'))
             except db.IntegrityError:
@@ -80,6 +97,42 @@ def login():
 
     return render_template('auth/login.html')
 
+def fetch_user(user_id):
+    """Load the ``USER_COLUMNS`` of one user as a dict, or None."""
+    user = get_db().execute(
+        f'SELECT {USER_COLUMNS} FROM user WHERE id = ?', (user_id,)
+    ).fetchone()
+    return dict(user) if user else None
+
+def forget_user(user_id):
+    """Drop the cached row of ``user_id``; call after changing or blocking the user."""
+    current_app.extensions['user_cache'].delete(int(user_id))
+
+def load_user(user_id):
+    """The current user's row, from the per-process cache on safe requests.
+
+    Write requests (POST...) always re-read the row. Cached rows are stored
+    with the ``user_generation`` counter, which triggers bump when any user
+    is blocked, changes role or is deleted (migration 0015), so those
+    changes apply to the next request in every worker process. Other
+    profile edits may show up to ``USER_CACHE_TTL`` seconds late elsewhere.
+    """
+    user_cache = current_app.extensions['user_cache']
+    # Đọc generation trước khi đọc user: nếu nó đổi ở giữa, lần sau sẽ đọc lại
+    generation = get_db().execute(
+        "SELECT value FROM counters WHERE name = 'user_generation'"
+    ).fetchone()[0]
+    user = cache.MISSING
+    if request.method in ('GET', 'HEAD'):
+        entry = user_cache.get(user_id)
+        if entry is not cache.MISSING and entry[0] == generation:
+            user = entry[1]
+    if user is cache.MISSING:
+        user = fetch_user(user_id)
+        user_cache.set(user_id, (generation, user), current_app.config['USER_CACHE_TTL'], ())
+    # Mỗi request một bản sao: view có thể sửa g.user mà không ảnh hưởng cache
+    return dict(user) if user else None
+
 @bp.before_app_request
 def load_logged_in_user():
     user_id = session.get('user_id')
@@ -87,14 +140,10 @@ def load_logged_in_user():
     if user_id is None:
         g.user = None
     else:
-        user = get_db().execute(
-            'SELECT * FROM user WHERE id = ?', (user_id,)
-        ).fetchone()
+        user = load_user(user_id)
 
         if user:
-            user_dict = dict(user)
-            is_blocked = user_dict.get('is_blocked')
-            if is_blocked:
+            if user['is_blocked']:
                 g.user = None
                 session.clear()
                 flash('Tài khoản đã bị khóa. Mời đăng nhập lại.')
@@ -133,6 +182,7 @@ def create_admin():
             except db.IntegrityError:
                 error = f"User {email} is already registered."
             else:
+                cache.invalidate(cache.USERS)
                 return redirect(url_for("index"))  # Chuyển hướng đến trang blog
 
         flash(error)
@@ -169,17 +219,22 @@ def profile():
     params = [g.user['id']]
     where_clause = 'WHERE p.author_id = ?'
     if q:
-        where_clause += ' AND p.title LIKE ?'
-        params.append(f'%{q}%')
+        # Tìm theo tiêu đề không dấu qua chỉ mục FTS (cột search_key)
+        match = recipe_search.match_expression(q, column='search_key')
+        if match:
+            where_clause += ' AND p.id IN (SELECT rowid FROM post_fts WHERE post_fts MATCH ?)'
+            params.append(match)
+        else:
+            where_clause += ' AND 0'
     # Sắp xếp
     if sort == 'oldest':
         order_clause = 'ORDER BY p.created ASC'
     elif sort == 'likes':
-        order_clause = 'ORDER BY like_count DESC'
+        order_clause = 'ORDER BY p.like_count DESC, p.created DESC'
     else:
         order_clause = 'ORDER BY p.created DESC'
     user_posts = db.execute(
-        f'SELECT p.*, bi.image_path, (SELECT COUNT(*) FROM favorites f WHERE f.post_id = p.id) as like_count '
+        f'SELECT p.*, bi.image_path, bi.variants AS image_variants '
         f'FROM post p '
         f'LEFT JOIN blog_images bi ON p.id = bi.post_id AND bi.is_main_image = 1 '
         f'{where_clause} '
@@ -207,19 +262,10 @@ def edit_profile():
         if 'avatar' in request.files:
             file = request.files['avatar']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                # Tạo tên file unique
-                unique_filename = f"avatar_{g.user['id']}_{filename}"
-                # Lưu file
-                avatar_path = os.path.join('uploads/avatars', unique_filename)
-                file_path = os.path.join(current_app.static_folder, avatar_path)
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                file.save(file_path)
+                # Lưu file theo nội dung; avatar cũ chỉ bị xóa sau khi commit
+                avatar_path = storage.save(file)
                 # Cập nhật đường dẫn trong database
-                db.execute(
-                    'UPDATE user SET avatar_path = ? WHERE id = ?',
-                    (avatar_path, g.user['id'])
-                )
+                set_avatar(db, avatar_path, (g.user['avatar_path'], g.user['avatar_variants']))
 
         if error is None:
             try:
@@ -229,6 +275,9 @@ def edit_profile():
                     (username, gender, birthdate, phone, g.user['id'])
                 )
                 db.commit()
+                storage.publish()
+                forget_user(g.user['id'])
+                cache.invalidate(cache.PROFILES)
                 flash('Thông tin đã được cập nhật thành công!', 'success')
                 return redirect(url_for('auth.profile'))
             except db.IntegrityError:
@@ -248,8 +297,12 @@ def change_password():
         
         error = None
         db = get_db()
+        # g.user không chứa mật khẩu: đọc riêng
+        password_hash = db.execute(
+            'SELECT password FROM user WHERE id = ?', (g.user['id'],)
+        ).fetchone()['password']
 
-        if not check_password_hash(g.user['password'], old_password):
+        if not check_password_hash(password_hash, old_password):
             error = 'Mật khẩu hiện tại không đúng.'
         elif new_password != confirm_password:
             error = 'Mật khẩu mới không khớp.'
@@ -260,6 +313,7 @@ def change_password():
                 (generate_password_hash(new_password), g.user['id'])
             )
             db.commit()
+            forget_user(g.user['id'])
             flash('Mật khẩu đã được thay đổi thành công!', 'success')
             return redirect(url_for('auth.profile'))
         
@@ -281,40 +335,19 @@ def update_avatar():
     
     if file and allowed_file(file.filename):
         try:
-            # Xóa avatar cũ nếu có
-            if hasattr(g.user, 'avatar_path') and g.user.avatar_path:
-                old_avatar_path = os.path.join(current_app.static_folder, g.user.avatar_path)
-                if os.path.exists(old_avatar_path):
-                    try:
-                        os.remove(old_avatar_path)
-                    except OSError:
-                        pass
+            # Lưu file mới theo nội dung (uploads/blobs/...)
+            avatar_path = storage.save(file)
             
-            # Tạo tên file unique
-            filename = secure_filename(file.filename)
-            unique_filename = f"avatar_{g.user['id']}_{secrets.token_hex(8)}_{filename}"
-            
-            # Đảm bảo thư mục uploads/avatars tồn tại
-            avatar_dir = os.path.join(current_app.static_folder, 'uploads', 'avatars')
-            os.makedirs(avatar_dir, exist_ok=True)
-            
-            # Lưu file mới
-            avatar_path = f'uploads/avatars/{unique_filename}'
-            file_path = os.path.join(current_app.static_folder, 'uploads', 'avatars', unique_filename)
-            file.save(file_path)
-            
-            # Cập nhật database
+            # Cập nhật database; avatar cũ được xóa ở background nếu không còn ai dùng
             db = get_db()
-            db.execute(
-                'UPDATE user SET avatar_path = ? WHERE id = ?',
-                (avatar_path, g.user['id'])
-            )
+            set_avatar(db, avatar_path, (g.user['avatar_path'], g.user['avatar_variants']))
             db.commit()
+            storage.publish()
+            forget_user(g.user['id'])
+            cache.invalidate(cache.PROFILES)
             
             # Cập nhật session để refresh avatar ngay lập tức
-            g.user = db.execute(
-                'SELECT * FROM user WHERE id = ?', (g.user['id'],)
-            ).fetchone()
+            g.user = fetch_user(g.user['id'])
             
             flash('Avatar đã được cập nhật thành công!', 'success')
         except Exception as e:
@@ -322,4 +355,7 @@ def update_avatar():
     else:
         flash('File không hợp lệ. Chỉ chấp nhận các file ảnh (png, jpg, jpeg, gif)', 'error')
     
-    return redirect(url_for('auth.profile'))
\ No newline at end of file
+    return redirect(url_for('auth.profile'))
+
+def init_app(app):
+    app.extensions['user_cache'] = cache.MemoryBackend(app.config['USER_CACHE_SIZE'])
@@ -0,0 +1,268 @@
+"""In-memory prefix index for search-box autocomplete.
+
+Post titles and tag names are folded with ``recipe_search.fold_text`` and
+every word suffix of the folded text is stored as a key in a sorted list,
+so "kho" suggests "Cá kho tộ" as well as "Khoai lang". There is one list per
+ranking group (tags, whole labels, later words), and a lookup is a bisect
+plus a short forward scan in each: no SQL on the request path.
+
+The index is built when the app starts and kept current by the write paths
+(blog create/update/delete, admin deletes). It lives in process memory, so
+with several worker processes each one only sees its own writes until it
+restarts or ``rebuild()`` runs.
+"""
+import bisect
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+import click
+from flask import current_app
+
+from share_recipe.db import get_db
+from share_recipe.recipe_search import fold_text
+
+POST = 'post'
+TAG = 'tag'
+DEFAULT_LIMIT = 8
+# Số entry tối đa được duyệt trong mỗi nhóm cho một tiền tố rất ngắn ("c", "b"...)
+SCAN_LIMIT = 200
+
+# Nhóm xếp hạng, theo thứ tự gợi ý: tag, tiêu đề bắt đầu bằng tiền tố, rồi từ ở giữa tiêu đề
+TAGS, STARTS, WORDS = range(3)
+
+
+class SortedKeys:
+    """Parallel lists of folded keys and their ``(kind, id)``, sorted by key."""
+
+    def __init__(self, entries=()):
+        self.keys = []
+        self.refs = []
+        for key, ref in sorted(entries):
+            # Dùng chung một đối tượng str cho các key trùng nhau ("ga", "chay"...)
+            self.keys.append(self.keys[-1] if self.keys and self.keys[-1] == key else key)
+            self.refs.append(ref)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def insert(self, key, ref):
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            key = self.keys[i]
+        self.keys.insert(i, key)
+        self.refs.insert(i, ref)
+
+    def delete(self, key, ref):
+        i = bisect.bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i] == key:
+            if self.refs[i] == ref:
+                del self.keys[i]
+                del self.refs[i]
+                return
+            i += 1
+
+    def scan(self, prefix, limit):
+        """Yield ``(key, ref)`` for at most ``limit`` keys starting with ``prefix``."""
+        i = bisect.bisect_left(self.keys, prefix)
+        end = min(len(self.keys), i + limit)
+        while i < end and self.keys[i].startswith(prefix):
+            yield self.keys[i], self.refs[i]
+            i += 1
+
+
+class PrefixIndex:
+    def __init__(self):
+        # Mỗi nhóm xếp hạng có danh sách riêng, nên giới hạn duyệt của nhóm sau
+        # (rất nhiều từ giữa tiêu đề) không che mất tag hay tiêu đề khớp từ đầu
+        self._buckets = [SortedKeys() for _ in range(3)]
+        self._labels = {}  # (kind, id) -> (label, folded label)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._labels)
+
+    @staticmethod
+    def _suffixes(folded):
+        words = folded.split()
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    @classmethod
+    def _entries(cls, ref, folded):
+        """``(bucket, key)`` for every word suffix of ``folded``."""
+        suffixes = cls._suffixes(folded)
+        if ref[0] == TAG:
+            return [(TAGS, key) for key in suffixes]
+        return [(STARTS if i == 0 else WORDS, key) for i, key in enumerate(suffixes)]
+
+    def load(self, items):
+        """Replace the whole index with ``items`` of ``(kind, id, label)``."""
+        labels = {}
+        entries = [[] for _ in range(3)]
+        for kind, ref_id, label in items:
+            ref = (kind, ref_id)
+            folded = fold_text(label)
+            labels[ref] = (label, folded)
+            for bucket, key in self._entries(ref, folded):
+                entries[bucket].append((key, ref))
+        buckets = [SortedKeys(bucket_entries) for bucket_entries in entries]
+        del entries
+        with self._lock:
+            self._buckets, self._labels = buckets, labels
+
+    def add(self, kind, ref_id, label):
+        """Insert or replace one entry."""
+        ref = (kind, ref_id)
+        folded = fold_text(label)
+        with self._lock:
+            self._remove(ref)
+            self._labels[ref] = (label, folded)
+            for bucket, key in self._entries(ref, folded):
+                self._buckets[bucket].insert(key, ref)
+
+    def remove(self, kind, ref_id):
+        with self._lock:
+            self._remove((kind, ref_id))
+
+    def _remove(self, ref):
+        entry = self._labels.pop(ref, None)
+        if entry is None:
+            return
+        for bucket, key in self._entries(ref, entry[1]):
+            self._buckets[bucket].delete(key, ref)
+
+    def suggest(self, prefix, limit=DEFAULT_LIMIT):
+        """Return up to ``limit`` ``(kind, id, label)`` whose words start with ``prefix``.
+
+        Tags come first, then labels that start with the prefix, then
+        shorter labels. Each group is looked up in its own sorted list, so
+        a group is never crowded out by the matches of a later one.
+        """
+        prefix = fold_text(prefix)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            for bucket in self._buckets:
+                found = {}
+                for key, ref in bucket.scan(prefix, SCAN_LIMIT):
+                    if ref in seen:
+                        continue
+                    label, folded = self._labels[ref]
+                    # at_start: tiền tố khớp từ đầu nhãn (chỉ phân biệt trong nhóm tag)
+                    found[ref] = (label, found.get(ref, (label, False))[1] or key == folded)
+                ranked = sorted(found.items(),
+                                key=lambda item: (not item[1][1], len(item[1][0])))
+                for (kind, ref_id), (label, _) in ranked[:limit - len(results)]:
+                    seen.add((kind, ref_id))
+                    results.append((kind, ref_id, label))
+                if len(results) >= limit:
+                    break
+        return results
+
+    def memory_usage(self):
+        """Approximate bytes held by the index (lists, keys, labels)."""
+        with self._lock:
+            size = sys.getsizeof(self._labels)
+            seen = set()
+            for bucket in self._buckets:
+                size += sys.getsizeof(bucket.keys) + sys.getsizeof(bucket.refs)
+                for key in bucket.keys:
+                    if id(key) not in seen:
+                        seen.add(id(key))
+                        size += sys.getsizeof(key)
+            for ref, entry in self._labels.items():
+                size += sum(sys.getsizeof(obj) for obj in (ref, entry, *entry))
+        return size
+
+    def stats(self):
+        return {
+            'labels': len(self._labels),
+            'keys': sum(len(bucket) for bucket in self._buckets),
+            'bytes': self.memory_usage(),
+        }
+
+
+def get_index(app=None):
+    app = app or current_app
+    return app.extensions['autocomplete']
+
+
+def rebuild(db=None, index=None):
+    """(Re)load every post title and tag name from the database."""
+    db = get_db() if db is None else db
+    index = get_index() if index is None else index
+    items = [(POST, row['id'], row['title']) for row in db.execute('SELECT id, title FROM post')]
+    items += [(TAG, row['id'], row['name']) for row in db.execute('SELECT id, name FROM tags')]
+    index.load(items)
+    return index
+
+
+def add_post(post_id, title):
+    get_index().add(POST, post_id, title)
+
+
+def remove_posts(post_ids):
+    index = get_index()
+    for post_id in post_ids:
+        index.remove(POST, int(post_id))
+
+
+def add_tag(tag_id, name):
+    get_index().add(TAG, tag_id, name)
+
+
+def _measure(index, prefixes):
+    timings = []
+    for prefix in prefixes:
+        started = time.perf_counter()
+        index.suggest(prefix)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.99) - 1]
+
+
+@click.command('autocomplete-stats')
+@click.option('--synthetic', type=int, default=0,
+              help='Also build a throwaway index of N generated titles.')
+@click.option('--queries', type=int, default=2000, help='Lookups to time.')
+def autocomplete_stats_command(synthetic, queries):
+    """Report autocomplete index size, memory use and lookup latency."""
+    index = get_index()
+    stats = index.stats()
+    click.echo(f"live: {stats['labels']} labels, {stats['keys']} keys, "
+               f"{stats['bytes'] / 1024:.1f} KiB")
+
+    words = sorted({word for _, folded in index._labels.values()
+                    for word in folded.split()}) or ['bun', 'bo', 'hue', 'ca', 'kho', 'to']
+    rng = random.Random(0)
+    prefixes = [rng.choice(words)[:rng.randint(1, 4)] for _ in range(queries)]
+    if len(index):
+        p50, p99 = _measure(index, prefixes)
+        click.echo(f'live: p50 {p50:.3f} ms, p99 {p99:.3f} ms over {queries} lookups')
+
+    if synthetic:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        titles = [' '.join(rng.choice(words) for _ in range(rng.randint(2, 6)))
+                  for _ in range(synthetic)]
+        big = PrefixIndex()
+        big.load((POST, i, title) for i, title in enumerate(titles))
+        del titles
+        traced = sum(stat.size_diff for stat in
+                     tracemalloc.take_snapshot().compare_to(before, 'filename'))
+        tracemalloc.stop()
+        p50, p99 = _measure(big, prefixes)
+        per_100k = traced * 100_000 / synthetic
+        keys = sum(len(bucket) for bucket in big._buckets)
+        click.echo(f'synthetic: {synthetic} titles, {keys} keys, '
+                   f'{traced / 2**20:.1f} MiB ({per_100k / 2**20:.1f} MiB per 100k titles)')
+        click.echo(f'synthetic: p50 {p50:.3f} ms, p99 {p99:.3f} ms over {queries} lookups')
+
+
+def init_app(app):
+    app.extensions['autocomplete'] = PrefixIndex()
+    app.cli.add_command(autocomplete_stats_command)
@@ -1,65 +1,91 @@
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, url_for, jsonify
+    Blueprint, flash, g, redirect, render_template, request, url_for, jsonify,
+    current_app, get_flashed_messages, stream_template
 )
-from werkzeug.exceptions import abort
-import os
-from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
+from werkzeug.exceptions import HTTPException, abort
+from datetime import timedelta
+import json
 import random
 
 from share_recipe.auth import login_required
 from share_recipe.db import get_db
+from share_recipe.pagination import paginate
+from share_recipe import recipe_search
+from share_recipe import ingredients as ingredient_index
+from share_recipe import autocomplete
+from share_recipe import search_cache
+from share_recipe import comments as comment_threads
+from share_recipe import images as image_variants
+from share_recipe import storage
+from share_recipe import jobs
+from share_recipe import cache
+from share_recipe import http_cache
 
 bp = Blueprint('blog', __name__)
 
 # Thêm config cho upload ảnh
-UPLOAD_FOLDER = 'share_recipe/static/uploads/blog_images'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def delete_image_file(image_path):
-    """Xóa file ảnh từ hệ thống file"""
-    if image_path:
-        # Chuyển đổi đường dẫn relative thành absolute
-        full_path = os.path.join('share_recipe/static', image_path)
-        try:
-            if os.path.exists(full_path):
-                os.remove(full_path)
-                return True
-        except Exception as e:
-            print(f"Error deleting image file: {e}")
-    return False
+def delete_image_file(image_path, variants=None):
+    """Xếp job xóa file ảnh (và các bản WebP thu nhỏ) khi không còn dòng nào dùng đến nó.
 
-@bp.route('/', methods=('GET',))
-def index():
+    Gọi trong transaction đã xóa/sửa các dòng blog_images: job chỉ có (và chạy) sau commit.
+    """
+    jobs.enqueue('storage.release', path=image_path, variants=variants)
+
+def build_image_variants(image_path):
+    """Xếp job tạo các bản WebP thu nhỏ cho ảnh vừa lưu (các dòng có variants NULL)"""
+    jobs.enqueue('images.build_variants', kind=image_variants.POST, path=image_path)
+
+# Các cột mà recipe_card() cần (bí danh p, u, bi). Mọi trang danh sách dùng đúng bộ cột này:
+# thẻ được cache theo (id, version), nên trang render trước không được quyết định nội dung thẻ
+CARD_COLUMNS = ('p.id, p.title, p.description, p.created, p.author_id, u.username, '
+                'bi.image_path, bi.variants AS image_variants, p.like_count, p.version')
+
+@cache.cached('blog.index', tags=(cache.LISTINGS, cache.PROFILES))
+def load_index_page(page, cursor, generation):
+    # generation (listing_generation) chỉ để làm khóa cache
     db = get_db()
-    page = request.args.get('page', 1, type=int)
     per_page = 9
-    offset = (page - 1) * per_page
 
-    posts = db.execute(
-        'SELECT p.id, p.title, p.created, p.author_id, '
-        'u.username, bi.image_path, '
-        '(SELECT COUNT(*) FROM favorites f WHERE f.post_id = p.id) as like_count '
+    # Tổng số bài viết được trigger duy trì trong bảng counters
+    total_posts = db.execute(
+        "SELECT value FROM counters WHERE name = 'posts'"
+    ).fetchone()[0]
+
+    return paginate(
+        db,
+        'SELECT ' + CARD_COLUMNS + ', '
+        'p.created AS cursor_sort, p.id AS cursor_id '
         'FROM post p '
         'JOIN user u ON p.author_id = u.id '
-        'LEFT JOIN blog_images bi ON p.id = bi.post_id AND bi.is_main_image = 1 '
-        'ORDER BY p.created DESC '
-        'LIMIT ? OFFSET ?',
-        (per_page, offset)
-    ).fetchall()
+        'LEFT JOIN blog_images bi ON p.id = bi.post_id AND bi.is_main_image = 1',
+        [], [], 'p.created', 'p.id', per_page,
+        page=page, cursor=cursor, total=total_posts
+    )
 
-    posts = [dict(post) for post in posts]
-    total_posts = db.execute('SELECT COUNT(*) FROM post').fetchone()[0]
-    total_pages = (total_posts + per_page - 1) // per_page
+@bp.route('/', methods=('GET',))
+def index():
+    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
+    # Trả 304 trước mọi truy vấn nặng nếu danh sách không đổi
+    generation, modified = http_cache.listing_validators(get_db())
+    response = http_cache.not_modified(
+        http_cache.make_etag('index', page, cursor, generation), modified)
+    if response is not None:
+        return response
+    result = load_index_page(page, cursor, generation)
 
     return render_template('blog/index.html', 
-                         posts=posts, 
+                         posts=result.items, 
                          page=page, 
-                         total_pages=total_pages)
+                         total_pages=result.total_pages,
+                         next_cursor=result.next_cursor,
+                         prev_cursor=result.prev_cursor)
 
 @bp.route('/create', methods=('GET', 'POST'))
 @login_required
@@ -101,12 +127,16 @@ def create():
 
                 # Insert bài viết
                 cursor = db.execute(
-                    'INSERT INTO post (id, author_id, title, description, ingredients, instructions, cooking_time, servings) '
-                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-                    (random_id, g.user['id'], title, description, ingredients, instructions, cooking_time, servings)
+                    'INSERT INTO post (id, author_id, title, description, ingredients, instructions, cooking_time, servings, search_key) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (random_id, g.user['id'], title, description, ingredients, instructions, cooking_time, servings,
+                     recipe_search.fold_text(title))
                 )
                 post_id = cursor.lastrowid
 
+                # Cập nhật chỉ mục nguyên liệu
+                ingredient_index.index_post(db, post_id, ingredients)
+
                 # Xử lý tag
                 if tag:  # Kiểm tra nếu có tag
                     # Kiểm tra xem tag đã tồn tại chưa
@@ -130,28 +160,30 @@ def create():
                         'INSERT INTO post_tags (post_id, tag_id) VALUES (?, ?)',
                         (post_id, tag_id)
                     )
+                else:
+                    tag_id = None
 
                 # Xử lý upload ảnh nếu có
                 if 'image' in request.files:
                     image = request.files['image']
                     if image and allowed_file(image.filename):
-                        filename = secure_filename(image.filename)
-                        unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                        
-                        # Tạo thư mục nếu chưa tồn tại
-                        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-                        
-                        # Lưu file
-                        image_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-                        image.save(image_path)
+                        # Lưu file theo nội dung (ảnh trùng chỉ lưu một lần), hiện ra sau commit
+                        relative_path = storage.save(image)
                         
-                        # Lưu thông tin ảnh vào database
+                        # Lưu thông tin ảnh vào database; các bản thu nhỏ được tạo ở background
                         db.execute(
                             'INSERT INTO blog_images (post_id, image_path, is_main_image) VALUES (?, ?, ?)',
-                            (post_id, f'uploads/blog_images/{unique_filename}', 1)
+                            (post_id, relative_path, 1)
                         )
+                        build_image_variants(relative_path)
 
                 db.commit()
+                storage.publish()
+                cache.invalidate(cache.LISTINGS)
+                # Cập nhật chỉ mục gợi ý tìm kiếm
+                autocomplete.add_post(post_id, title)
+                if tag_id is not None:
+                    autocomplete.add_tag(tag_id, tag)
                 return redirect(url_for('blog.detail', id=post_id))
                 
             except Exception as e:
@@ -210,50 +242,48 @@ def update(id):
                 # Update bài viết
                 db.execute(
                     'UPDATE post SET title = ?, description = ?, ingredients = ?, '
-                    'instructions = ?, cooking_time = ?, servings = ? '
+                    'instructions = ?, cooking_time = ?, servings = ?, search_key = ? '
                     'WHERE id = ?',
-                    (title, description, ingredients, instructions, cooking_time, servings, id)
+                    (title, description, ingredients, instructions, cooking_time, servings,
+                     recipe_search.fold_text(title), id)
                 )
+                ingredient_index.index_post(db, id, ingredients)
 
                 # Xử lý upload ảnh nếu có
                 if 'image' in request.files:
                     image = request.files['image']
                     if image and allowed_file(image.filename):
-                        # Xóa ảnh cũ nếu có
                         old_image = db.execute(
-                            'SELECT image_path FROM blog_images WHERE post_id = ? AND is_main_image = 1',
+                            'SELECT image_path, variants FROM blog_images WHERE post_id = ? AND is_main_image = 1',
                             (id,)
                         ).fetchone()
-                        
-                        if old_image:
-                            # Xóa file ảnh cũ
-                            delete_image_file(old_image['image_path'])
                             
                         # Lưu ảnh mới
-                        filename = secure_filename(image.filename)
-                        unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                        
-                        # Tạo thư mục nếu chưa tồn tại
-                        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-                        
-                        # Lưu file
-                        image_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-                        image.save(image_path)
+                        relative_path = storage.save(image)
                         
                         if old_image:
-                            # Update đường dẫn ảnh trong database
+                            # Update đường dẫn ảnh trong database (bản thu nhỏ tạo lại ở background)
                             db.execute(
-                                'UPDATE blog_images SET image_path = ? WHERE post_id = ? AND is_main_image = 1',
-                                (f'uploads/blog_images/{unique_filename}', id)
+                                'UPDATE blog_images SET image_path = ?, width = NULL, height = NULL, '
+                                'variants = NULL WHERE post_id = ? AND is_main_image = 1',
+                                (relative_path, id)
                             )
                         else:
                             # Thêm mới nếu chưa có ảnh
                             db.execute(
                                 'INSERT INTO blog_images (post_id, image_path, is_main_image) VALUES (?, ?, ?)',
-                                (id, f'uploads/blog_images/{unique_filename}', 1)
+                                (id, relative_path, 1)
                             )
+                        build_image_variants(relative_path)
+
+                        if old_image:
+                            # Xóa file ảnh cũ (sau commit) nếu không bài nào khác còn dùng
+                            delete_image_file(old_image['image_path'], old_image['variants'])
 
                 db.commit()
+                storage.publish()
+                cache.invalidate(cache.LISTINGS, cache.post_tag(id))
+                autocomplete.add_post(id, title)
                 return redirect(url_for('blog.detail', id=id))
                 
             except Exception as e:
@@ -281,18 +311,21 @@ def delete(id):
     try:
         # Lấy thông tin ảnh trước khi xóa bài viết
         images = db.execute(
-            'SELECT image_path FROM blog_images WHERE post_id = ?',
+            'SELECT image_path, variants FROM blog_images WHERE post_id = ?',
             (id,)
         ).fetchall()
         
-        # Xóa bài viết
+        # Xóa bài viết (saved_recipes không có ON DELETE CASCADE)
+        db.execute('DELETE FROM saved_recipes WHERE post_id = ?', (id,))
         db.execute('DELETE FROM post WHERE id = ?', (id,))
         
-        # Xóa các file ảnh
+        # Xóa các file ảnh ở background, sau commit
         for image in images:
-            delete_image_file(image['image_path'])
+            delete_image_file(image['image_path'], image['variants'])
             
         db.commit()
+        cache.invalidate(cache.LISTINGS, cache.post_tag(id))
+        autocomplete.remove_posts([id])
         flash('Bài viết đã được xóa thành công.')
     except Exception as e:
         print(f"Error deleting post: {e}")
@@ -337,22 +370,25 @@ def delete_multiple():
         for post_id in post_ids:
             # Get image paths
             images = db.execute(
-                'SELECT image_path FROM blog_images WHERE post_id = ?',
+                'SELECT image_path, variants FROM blog_images WHERE post_id = ?',
                 (post_id,)
             ).fetchall()
             
-            # Delete image files
-            for image in images:
-                delete_image_file(image['image_path'])
-            
             # Delete image records
             db.execute('DELETE FROM blog_images WHERE post_id = ?', (post_id,))
+            
+            # Queue deleting image files (only those no other row still uses)
+            for image in images:
+                delete_image_file(image['image_path'], image['variants'])
         
         # Delete the posts
         for post_id in post_ids:
+            db.execute('DELETE FROM saved_recipes WHERE post_id = ?', (post_id,))
             db.execute('DELETE FROM post WHERE id = ?', (post_id,))
         
         db.commit()
+        cache.invalidate(cache.LISTINGS, *[cache.post_tag(post_id) for post_id in post_ids])
+        autocomplete.remove_posts(post_ids)
         return jsonify({'success': True, 'message': 'Xóa công thức thành công'})
         
     except Exception as e:
@@ -365,27 +401,76 @@ def convert_utc_to_local(utc_dt):
     local_tz = timedelta(hours=7)
     return utc_dt + local_tz
 
+@cache.cached('blog.detail', tags=lambda id, version: (cache.post_tag(id), cache.PROFILES))
+def load_post(id, version):
+    """Post, author, main image, tags and first comment page; None if missing.
+
+    Nothing here depends on the viewer, so one cached copy serves everyone.
+    ``version`` (``post.version``) only makes the cache key follow changes.
+    """
+    db = get_db()
+    # Bài viết, tác giả, ảnh chính và tags trong một câu truy vấn
+    post = db.execute(
+        'SELECT p.*, u.username, '
+        ' (SELECT bi.image_path FROM blog_images bi '
+        '  WHERE bi.post_id = p.id AND bi.is_main_image = 1 LIMIT 1) AS image_path, '
+        ' (SELECT bi.variants FROM blog_images bi '
+        '  WHERE bi.post_id = p.id AND bi.is_main_image = 1 LIMIT 1) AS image_variants, '
+        " (SELECT json_group_array(json_object('id', t.id, 'name', t.name)) "
+        '  FROM post_tags pt JOIN tags t ON t.id = pt.tag_id '
+        '  WHERE pt.post_id = p.id) AS tags_json '
+        'FROM post p JOIN user u ON p.author_id = u.id '
+        'WHERE p.id = ?',
+        (id,)
+    ).fetchone()
+    if post is None:
+        return None
+
+    # Convert post to dictionary and adjust timezone
+    post = dict(post)
+    post['created'] = convert_utc_to_local(post['created'])
+    post['tags'] = json.loads(post.pop('tags_json'))
+    # Chỉ trang bình luận đầu tiên; phản hồi được tải khi người dùng mở luồng
+    return post, load_comment_page(db, id)
+
 @bp.route('/<int:id>/detail', methods=('GET', 'POST'))
 def detail(id):
     try:
-        post = get_post(id, check_author=False)
-        if post is None:
-            abort(404)
-            
-        # Convert post to dictionary and adjust timezone
-        post = dict(post)
-        post['created'] = convert_utc_to_local(post['created'])
-        
         db = get_db()
-        
-        # Get tags for the post
-        tags = db.execute(
-            'SELECT t.id, t.name FROM tags t '
-            'JOIN post_tags pt ON t.id = pt.tag_id '
-            'WHERE pt.post_id = ?',
-            (id,)
-        ).fetchall()
-        post['tags'] = [dict(tag) for tag in tags]
+        user_id = g.user['id'] if g.user else None
+
+        # post.version đổi theo mọi thay đổi hiển thị trên trang (trigger, migration 0011)
+        current = db.execute(
+            'SELECT version, modified FROM post WHERE id = ?', (id,)
+        ).fetchone()
+        if current is None:
+            abort(404)
+        response = http_cache.not_modified(
+            http_cache.make_etag('detail', id, current['version']), current['modified'])
+        if response is not None:
+            return response
+
+        loaded = load_post(id, current['version'])
+        if loaded is None:
+            abort(404)
+        post, comments_page = loaded
+
+        # Trạng thái yêu thích/đã lưu và phản ứng của người dùng lấy riêng, không cache
+        is_favorite = is_saved = False
+        user_reactions = {}
+        if user_id:
+            # Một câu lệnh dù trang có 0 hay 20 bình luận: id truyền vào dạng mảng JSON
+            comment_ids = json.dumps([comment['id'] for comment in comments_page.items])
+            status = db.execute(
+                'SELECT EXISTS (SELECT 1 FROM favorites WHERE user_id = ? AND post_id = ?), '
+                ' EXISTS (SELECT 1 FROM saved_recipes WHERE user_id = ? AND post_id = ?), '
+                ' (SELECT json_group_object(comment_id, reaction_type) FROM comment_reactions '
+                '  WHERE user_id = ? AND comment_id IN (SELECT value FROM json_each(?)))',
+                (user_id, id, user_id, id, user_id, comment_ids)
+            ).fetchone()
+            is_favorite, is_saved = bool(status[0]), bool(status[1])
+            user_reactions = {int(comment_id): reaction
+                              for comment_id, reaction in json.loads(status[2]).items()}
         
         # Handle comment submission
         if request.method == 'POST' and g.user:
@@ -396,118 +481,78 @@ def detail(id):
                     (id, g.user['id'], content)
                 )
                 db.commit()
+                cache.invalidate(cache.post_tag(id))
                 return redirect(url_for('blog.detail', id=id))
         
-        # Get post image
-        image = db.execute(
-            'SELECT image_path FROM blog_images WHERE post_id = ? AND is_main_image = 1',
-            (id,)
-        ).fetchone()
-        
-        # Get comments with reaction counts and user's reactions
-        comments_query = '''
-            SELECT c.*, u.username, u.avatar_path,
-                (SELECT COUNT(DISTINCT user_id) FROM comment_reactions cr 
-                 WHERE cr.comment_id = c.id AND cr.reaction_type = 'like') as likes_count,
-                (SELECT COUNT(DISTINCT user_id) FROM comment_reactions cr 
-                 WHERE cr.comment_id = c.id AND cr.reaction_type = 'dislike') as dislikes_count
-        '''
-        
-        # Get current user's reaction if logged in
-        if g.user:
-            comments_query += ''',
-                (SELECT reaction_type FROM comment_reactions cr 
-                 WHERE cr.comment_id = c.id AND cr.user_id = ?) as user_reaction
-            '''
-        else:
-            comments_query += ', NULL as user_reaction'
-        
-        comments_query += '''
-            FROM comments c JOIN user u ON c.author_id = u.id
-            WHERE c.post_id = ?
-            ORDER BY c.created DESC
-        '''
-        
-        if g.user:
-            comments = db.execute(comments_query, (g.user['id'], id)).fetchall()
-        else:
-            comments = db.execute(comments_query, (id,)).fetchall()
-        
-        # Convert comments to list of dictionaries and adjust timezone
-        comments = [dict(comment) for comment in comments]
-        for comment in comments:
-            comment['created'] = convert_utc_to_local(comment['created'])
-        
-        # Get replies for each comment
-        for comment in comments:
-            replies = db.execute(
-                'SELECT r.*, u.username, u.avatar_path '
-                'FROM comment_replies r '
-                'JOIN user u ON r.author_id = u.id '
-                'WHERE r.comment_id = ? '
-                'ORDER BY r.created ASC',
-                (comment['id'],)
-            ).fetchall()
-            # Convert replies to list of dictionaries and adjust timezone
-            comment['replies'] = [dict(reply) for reply in replies]
-            for reply in comment['replies']:
-                reply['created'] = convert_utc_to_local(reply['created'])
-        
-        # Check if current user has favorited this post
-        is_favorite = False
-        if g.user:
-            favorite = db.execute(
-                'SELECT * FROM favorites WHERE user_id = ? AND post_id = ?',
-                (g.user['id'], id)
-            ).fetchone()
-            is_favorite = favorite is not None
-        
-        if image:
-            post['image_path'] = image['image_path']
-            
-        # Check if current user has saved this post
-        is_saved = False
-        if g.user:
-            saved = db.execute(
-                'SELECT * FROM saved_recipes WHERE user_id = ? AND post_id = ?',
-                (g.user['id'], id)
-            ).fetchone()
-            is_saved = saved is not None
-        
         return render_template('blog/detail.html', 
                              post=post, 
-                             comments=comments,
+                             comments=comments_page.items,
+                             comments_page=comments_page,
+                             user_reactions=user_reactions,
                              is_favorite=is_favorite,
                              is_saved=is_saved)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in detail route: {e}")  # For debugging
         abort(500)
 
+def load_comment_page(db, post_id, cursor=None):
+    page = comment_threads.comment_page(
+        db, post_id, current_app.config['COMMENTS_PER_PAGE'], cursor=cursor)
+    for comment in page.items:
+        comment['created'] = convert_utc_to_local(comment['created'])
+    return page
+
+def comment_json(row):
+    row = {key: value for key, value in row.items() if not key.startswith('cursor_')}
+    row['created'] = row['created'].isoformat(sep=' ')
+    return row
+
+@bp.route('/<int:id>/comments')
+def post_comments(id):
+    # Trang bình luận tiếp theo: cùng nội dung cho mọi người xem (không có phản ứng riêng)
+    page = load_comment_page(get_db(), id, request.args.get('cursor'))
+    return jsonify({
+        'comments': [comment_json(comment) for comment in page.items],
+        'html': render_template('blog/_comments.html', comments=page.items),
+        'next_cursor': page.next_cursor,
+    })
+
+@bp.route('/comment/<int:comment_id>/replies')
+def comment_replies(comment_id):
+    replies, next_cursor = comment_threads.reply_page(
+        get_db(), comment_id, current_app.config['REPLIES_PER_PAGE'],
+        request.args.get('cursor'))
+    for reply in replies:
+        reply['created'] = convert_utc_to_local(reply['created'])
+    return jsonify({
+        'replies': [comment_json(reply) for reply in replies],
+        'html': render_template('blog/_replies.html', replies=replies),
+        'next_cursor': next_cursor,
+    })
+
+@bp.route('/comments/reactions')
+@login_required
+def comment_reactions():
+    # Phản ứng của người dùng hiện tại cho các bình luận đã tải: {comment_id: 'like'|'dislike'}
+    ids = [int(value) for value in request.args.get('ids', '').split(',')[:100] if value.isdigit()]
+    return jsonify(comment_threads.user_reactions(get_db(), g.user['id'], ids))
+
 def save_recipe_image(file, post_id):
     if file and allowed_file(file.filename):
-        # Tạo tên file unique
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_filename = f"{timestamp}_{filename}"
-        
-        # Tạo đường dẫn lưu file
-        upload_folder = os.path.join('share_recipe', 'static', 'uploads', 'recipe_images')
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-            
-        file_path = os.path.join(upload_folder, unique_filename)
-        
-        # Lưu file
-        file.save(file_path)
+        # Lưu file theo nội dung (uploads/blobs/...)
+        relative_path = storage.save(file)
         
         # Lưu thông tin vào database
         db = get_db()
-        relative_path = os.path.join('uploads', 'recipe_images', unique_filename)
         db.execute(
             'INSERT INTO blog_images (post_id, image_path, is_main_image) VALUES (?, ?, ?)',
             (post_id, relative_path, 1)
         )
+        build_image_variants(relative_path)
         db.commit()
+        storage.publish()
         
         return relative_path
     return None
@@ -533,64 +578,103 @@ def delete_comment(comment_id):
 
     db.execute('DELETE FROM comments WHERE id = ?', (comment_id,))
     db.commit()
+    cache.invalidate(cache.post_tag(comment['post_id']))
     
     return redirect(url_for('blog.detail', id=comment['post_id']))
 
 @bp.route('/search', methods=['GET'])
 def search():
-    query = request.args.get('q', '')
+    query = request.args.get('q', '').strip()
     selected_tag = request.args.get('tag', '')
-    sort_by = request.args.get('sort', 'newest')
+    # Bộ lọc theo thời gian nấu và khẩu phần (facet)
+    time_bucket = request.args.get('time', '')
+    if time_bucket not in [key for key, *_ in recipe_search.TIME_BUCKETS]:
+        time_bucket = ''
+    servings_bucket = request.args.get('servings', '')
+    if servings_bucket not in [key for key, *_ in recipe_search.SERVINGS_BUCKETS]:
+        servings_bucket = ''
+    # Chế độ "nấu với những gì tôi có": danh sách nguyên liệu
+    have = request.args.get('have', '').strip()
+    if have:
+        sort_by = request.args.get('sort', 'coverage')
+        if sort_by not in ingredient_index.SORTS:
+            sort_by = 'coverage'
+    else:
+        # Mặc định sắp xếp theo độ phù hợp khi có từ khóa
+        sort_by = request.args.get('sort', 'relevance' if query else 'newest')
+        if sort_by not in recipe_search.SORTS:
+            sort_by = 'newest'
     
     # Chỉ chuyển hướng nếu không có bất kỳ tiêu chí tìm kiếm nào
-    if not query and not selected_tag:
+    if not query and not selected_tag and not have and not time_bucket and not servings_bucket:
         return redirect(url_for('blog.index'))
 
     db = get_db()
     
-    # Base query
-    base_query = '''
-        SELECT DISTINCT p.id, p.title, p.description, p.created, p.author_id,
-        u.username, bi.image_path,
-        (SELECT COUNT(*) FROM favorites f WHERE f.post_id = p.id) as like_count,
-        t.name as tag
-        FROM post p
-        JOIN user u ON p.author_id = u.id
-        LEFT JOIN blog_images bi ON p.id = bi.post_id AND bi.is_main_image = 1
-        LEFT JOIN post_tags pt ON p.id = pt.post_id
-        LEFT JOIN tags t ON pt.tag_id = t.id
-    '''
-    
-    # Build WHERE clause
-    conditions = []
-    params = []
-    
-    if query:
-        conditions.append('p.title LIKE ?')
-        params.append(f'%{query}%')
-    
-    if selected_tag:
-        conditions.append('t.name = ?')
-        params.append(selected_tag)
-    
-    if conditions:
-        base_query += ' WHERE ' + ' AND '.join(conditions)
-    
-    # Add ORDER BY clause based on sort_by
-    if sort_by == 'likes':
-        base_query += ' ORDER BY like_count DESC'
-    else:  # Default to newest
-        base_query += ' ORDER BY p.created DESC'
-    
-    # Execute query
-    posts = db.execute(base_query, params).fetchall()
-    posts = [dict(post) for post in posts]
-    
-    return render_template('blog/search.html', 
+    # Phân trang có giới hạn: không trả về quá SEARCH_MAX_RESULTS kết quả
+    per_page = current_app.config['SEARCH_PER_PAGE']
+    max_results = current_app.config['SEARCH_MAX_RESULTS']
+    max_pages = max(1, (max_results + per_page - 1) // per_page)
+    page = min(max(request.args.get('page', 1, type=int), 1), max_pages)
+    offset = (page - 1) * per_page
+    limit = min(per_page, max_results - offset)
+
+    def run_search():
+        facets = None
+        if have:
+            # Xếp hạng theo số nguyên liệu trùng khớp (chỉ mục nguyên liệu)
+            posts = ingredient_index.search_by_ingredients(db, have, selected_tag, sort_by,
+                                                           limit=limit + 1, offset=offset)
+            total = ingredient_index.count_by_ingredients(db, have, selected_tag, cap=max_results)
+        else:
+            # Tìm kiếm full-text (FTS5, xếp hạng BM25) kết hợp lọc theo tag
+            posts = recipe_search.search_posts(db, query, selected_tag, sort_by,
+                                               time_bucket, servings_bucket,
+                                               limit=limit + 1, offset=offset)
+            # Số kết quả cho từng bộ lọc và tổng số, tính trong một câu truy vấn
+            facets = recipe_search.search_facets(db, query, selected_tag,
+                                                 time_bucket, servings_bucket)
+            total = facets['total']
+        return posts, total, facets
+
+    # Kết quả được cache theo bộ tham số đã chuẩn hóa
+    cache_key = (search_cache.normalize_query(query), search_cache.normalize_query(have),
+                 selected_tag, time_bucket, servings_bucket, sort_by, page, per_page)
+    posts, total, facets = search_cache.cached(db, cache_key, sort_by, run_search)
+
+    has_next = len(posts) > limit and offset + limit < max_results
+    posts = posts[:limit]
+    total_pages = max(1, (min(total, max_results) + per_page - 1) // per_page)
+
+    # Đọc flash trước khi stream để session được lưu cùng header
+    get_flashed_messages(with_categories=True)
+    return stream_template('blog/search.html', 
                          posts=posts, 
                          query=query, 
+                         have=have,
                          selected_tag=selected_tag,
-                         sort_by=sort_by)
+                         time_bucket=time_bucket,
+                         servings_bucket=servings_bucket,
+                         facets=facets,
+                         sort_by=sort_by,
+                         page=page,
+                         total=total,
+                         total_pages=total_pages,
+                         has_next=has_next,
+                         max_results=max_results)
+
+@bp.route('/autocomplete')
+def autocomplete_suggestions():
+    # Gợi ý tìm kiếm từ chỉ mục trong bộ nhớ, không truy vấn SQL
+    query = request.args.get('q', '').strip()
+    suggestions = []
+    for kind, ref_id, label in autocomplete.get_index().suggest(query):
+        if kind == autocomplete.TAG:
+            url = url_for('blog.category', category=label)
+        else:
+            url = url_for('blog.detail', id=ref_id)
+        suggestions.append({'type': kind, 'label': label, 'url': url})
+    return jsonify({'query': query, 'suggestions': suggestions})
 
 @bp.route('/comment/<int:comment_id>/edit', methods=['POST'])
 @login_required
@@ -620,6 +704,7 @@ def edit_comment(comment_id):
         (content, comment_id)
     )
     db.commit()
+    cache.invalidate(cache.post_tag(comment['post_id']))
     
     return redirect(url_for('blog.detail', id=comment['post_id']))
 
@@ -670,23 +755,19 @@ def react_to_comment(comment_id):
             action = 'added'
 
         db.commit()
+        cache.invalidate(cache.post_tag(comment['post_id']))
 
-        # Get updated counts using DISTINCT to count unique users
-        likes = db.execute(
-            'SELECT COUNT(DISTINCT user_id) as count FROM comment_reactions WHERE comment_id = ? AND reaction_type = ?',
-            (comment_id, 'like')
-        ).fetchone()['count']
-        
-        dislikes = db.execute(
-            'SELECT COUNT(DISTINCT user_id) as count FROM comment_reactions WHERE comment_id = ? AND reaction_type = ?',
-            (comment_id, 'dislike')
-        ).fetchone()['count']
+        # Số lượt like/dislike được trigger cập nhật sẵn trên bảng comments
+        counts = db.execute(
+            'SELECT likes_count, dislikes_count FROM comments WHERE id = ?',
+            (comment_id,)
+        ).fetchone()
 
         return jsonify({
             'success': True,
             'action': action,
-            'likes': likes,
-            'dislikes': dislikes
+            'likes': counts['likes_count'],
+            'dislikes': counts['dislikes_count']
         })
 
     except Exception as e:
@@ -719,6 +800,7 @@ def toggle_favorite(id):
                     (g.user['id'], id)
                 )
                 db.commit()
+                cache.invalidate(cache.LISTINGS, cache.post_tag(id))
                 message = 'Đã thêm vào yêu thích!'
                 is_favorite = True
             else:
@@ -728,6 +810,7 @@ def toggle_favorite(id):
                     (g.user['id'], id)
                 )
                 db.commit()
+                cache.invalidate(cache.LISTINGS, cache.post_tag(id))
                 message = 'Đã xóa khỏi yêu thích!'
                 is_favorite = False
 
@@ -753,35 +836,29 @@ def favorites():
     db = get_db()
     page = request.args.get('page', 1, type=int)
     per_page = 9
-    offset = (page - 1) * per_page
     
-    # Lấy danh sách bài viết yêu thích
-    favorites = db.execute(
-        'SELECT p.id, p.title, p.created, p.author_id, '
-        'u.username, bi.image_path, '
-        '(SELECT COUNT(*) FROM favorites f WHERE f.post_id = p.id) as like_count '
+    # Lấy danh sách bài viết yêu thích; tổng số lấy từ user.favorite_count
+    total = db.execute(
+        'SELECT favorite_count FROM user WHERE id = ?', (g.user['id'],)
+    ).fetchone()[0]
+    result = paginate(
+        db,
+        'SELECT ' + CARD_COLUMNS + ', '
+        'f.created_at AS cursor_sort, f.post_id AS cursor_id '
         'FROM favorites f '
         'JOIN post p ON f.post_id = p.id '
         'JOIN user u ON p.author_id = u.id '
-        'LEFT JOIN blog_images bi ON p.id = bi.post_id AND bi.is_main_image = 1 '
-        'WHERE f.user_id = ? '
-        'ORDER BY f.created_at DESC '
-        'LIMIT ? OFFSET ?',
-        (g.user['id'], per_page, offset)
-    ).fetchall()
-    
-    # Đếm tổng số bài viết yêu thích
-    total_favorites = db.execute(
-        'SELECT COUNT(*) FROM favorites WHERE user_id = ?',
-        (g.user['id'],)
-    ).fetchone()[0]
-    
-    total_pages = (total_favorites + per_page - 1) // per_page
+        'LEFT JOIN blog_images bi ON p.id = bi.post_id AND bi.is_main_image = 1',
+        ['f.user_id = ?'], [g.user['id']], 'f.created_at', 'f.post_id', per_page,
+        page=page, cursor=request.args.get('cursor'), total=total
+    )
     
     return render_template('blog/favorites.html',
-                         favorites=favorites,
+                         favorites=result.items,
                          page=page,
-                         total_pages=total_pages)
+                         total_pages=result.total_pages,
+                         next_cursor=result.next_cursor,
+                         prev_cursor=result.prev_cursor)
 
 @bp.route('/<int:id>/toggle_save', methods=['POST'])
 @login_required
@@ -843,34 +920,29 @@ def saved_recipes():
     db = get_db()
     page = request.args.get('page', 1, type=int)
     per_page = 9
-    offset = (page - 1) * per_page
 
-    # Lấy danh sách công thức đã lưu với phân trang
-    saved_recipes = db.execute(
-        'SELECT p.*, u.username as author_name, bi.image_path, '
-        '(SELECT COUNT(*) FROM favorites f WHERE f.post_id = p.id) as like_count '
+    # Lấy danh sách công thức đã lưu; tổng số lấy từ user.saved_count
+    total = db.execute(
+        'SELECT saved_count FROM user WHERE id = ?', (g.user['id'],)
+    ).fetchone()[0]
+    result = paginate(
+        db,
+        'SELECT ' + CARD_COLUMNS + ', '
+        'sr.created AS cursor_sort, sr.post_id AS cursor_id '
         'FROM post p '
         'JOIN saved_recipes sr ON p.id = sr.post_id '
         'JOIN user u ON p.author_id = u.id '
-        'LEFT JOIN blog_images bi ON p.id = bi.post_id AND bi.is_main_image = 1 '
-        'WHERE sr.user_id = ? '
-        'ORDER BY sr.created DESC '
-        'LIMIT ? OFFSET ?',
-        (g.user['id'], per_page, offset)
-    ).fetchall()
-
-    # Đếm tổng số công thức đã lưu
-    total_saved = db.execute(
-        'SELECT COUNT(*) FROM saved_recipes WHERE user_id = ?',
-        (g.user['id'],)
-    ).fetchone()[0]
-
-    total_pages = (total_saved + per_page - 1) // per_page
+        'LEFT JOIN blog_images bi ON p.id = bi.post_id AND bi.is_main_image = 1',
+        ['sr.user_id = ?'], [g.user['id']], 'sr.created', 'sr.post_id', per_page,
+        page=page, cursor=request.args.get('cursor'), total=total
+    )
 
     return render_template('blog/saved_recipes.html',
-                         saved_recipes=saved_recipes,
+                         saved_recipes=result.items,
                          page=page,
-                         total_pages=total_pages)
+                         total_pages=result.total_pages,
+                         next_cursor=result.next_cursor,
+                         prev_cursor=result.prev_cursor)
 
 def get_saved_status(post_id):
     """Check if current user has saved the post."""
@@ -883,47 +955,49 @@ def get_saved_status(post_id):
         return saved is not None
     return False
 
-@bp.route('/category/<category>')
-def category(category):
+@cache.cached('blog.category', tags=(cache.LISTINGS, cache.PROFILES))
+def load_category_page(category, page, cursor, generation):
     db = get_db()
-    page = request.args.get('page', 1, type=int)
     per_page = 9
-    offset = (page - 1) * per_page
 
-    posts = db.execute(
-        'SELECT p.id, p.title, p.created, p.author_id, '
-        'u.username, bi.image_path, '
-        '(SELECT COUNT(*) FROM favorites f WHERE f.post_id = p.id) as like_count '
+    # Số bài viết của tag được trigger duy trì trong tags.post_count
+    tag = db.execute(
+        'SELECT post_count FROM tags WHERE name = ?', (category,)
+    ).fetchone()
+    total_posts = tag['post_count'] if tag else 0
+
+    return paginate(
+        db,
+        'SELECT ' + CARD_COLUMNS + ', '
+        'p.created AS cursor_sort, p.id AS cursor_id '
         'FROM post p '
         'JOIN user u ON p.author_id = u.id '
         'LEFT JOIN blog_images bi ON p.id = bi.post_id AND bi.is_main_image = 1 '
         'JOIN post_tags pt ON p.id = pt.post_id '
-        'JOIN tags t ON pt.tag_id = t.id '
-        'WHERE t.name = ? '
-        'ORDER BY p.created DESC '
-        'LIMIT ? OFFSET ?',
-        (category, per_page, offset)
-    ).fetchall()
-
-    posts = [dict(post) for post in posts]
-
-    # Get total number of posts for pagination
-    total_posts = db.execute(
-        'SELECT COUNT(*) FROM post p '
-        'JOIN post_tags pt ON p.id = pt.post_id '
-        'JOIN tags t ON pt.tag_id = t.id '
-        'WHERE t.name = ?',
-        (category,)
-    ).fetchone()[0]
+        'JOIN tags t ON pt.tag_id = t.id',
+        ['t.name = ?'], [category], 'p.created', 'p.id', per_page,
+        page=page, cursor=cursor, total=total_posts
+    )
 
-    total_pages = (total_posts + per_page - 1) // per_page
+@bp.route('/category/<category>')
+def category(category):
+    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
+    generation, modified = http_cache.listing_validators(get_db())
+    response = http_cache.not_modified(
+        http_cache.make_etag('category', category, page, cursor, generation), modified)
+    if response is not None:
+        return response
+    result = load_category_page(category, page, cursor, generation)
 
     return render_template('blog/category.html',
-                         posts=posts,
+                         posts=result.items,
                          category=category,
                          page=page,
-                         total_pages=total_pages,
-                         total_posts=total_posts)
+                         total_pages=result.total_pages,
+                         total_posts=result.total,
+                         next_cursor=result.next_cursor,
+                         prev_cursor=result.prev_cursor)
 
 @bp.route('/comment/<int:comment_id>/reply', methods=['POST'])
 @login_required
@@ -951,8 +1025,9 @@ def reply_comment(comment_id):
             (comment_id, g.user['id'], content)
         )
         db.commit()
+        cache.invalidate(cache.post_tag(comment['post_id']))
         
-        return redirect(url_for('blog.detail', id=comment['post_id']))
+        return redirect(url_for('blog.detail', id=comment['post_id'], _anchor=f'comment-{comment_id}'))
     except Exception as e:
         print(f"Error in reply_comment: {e}")
         abort(500)
@@ -979,6 +1054,7 @@ def delete_reply(reply_id):
 
         db.execute('DELETE FROM comment_replies WHERE id = ?', (reply_id,))
         db.commit()
+        cache.invalidate(cache.post_tag(reply['post_id']))
         
         return redirect(url_for('blog.detail', id=reply['post_id']))
     except Exception as e:
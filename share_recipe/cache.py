@@ -0,0 +1,439 @@
+"""Application cache for page loaders, with tag-based invalidation.
+
+Loaders wrapped with :func:`cached` store their result under a key built
+from their name and arguments, together with a set of tags. Write paths
+call :func:`invalidate` with the tags they affect once their transaction
+has committed, e.g. ``invalidate('listings', post_tag(id))``.
+
+Two backends, chosen with ``CACHE_BACKEND``:
+
+``memory``
+    A size-bounded LRU in the process. Fastest, but every worker process
+    has its own copy and only sees its own invalidations.
+``sqlite``
+    A separate SQLite file (``CACHE_PATH``) shared by every process on the
+    host; values are pickled. Use this when running several workers.
+
+``null`` disables caching. Cached values are shared between requests and
+must be treated as read-only.
+
+Misses are coalesced: concurrent requests for the same key in a process
+wait for a single computation instead of each querying SQLite. Once an
+entry's TTL has passed it is kept for ``CACHE_STALE_TTL`` more seconds and
+served stale while one background thread recomputes it. Invalidation
+removes entries outright, so a write is never hidden behind a stale copy.
+"""
+import functools
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import click
+from flask import current_app
+
+MISSING = object()
+
+# Tags dùng chung giữa các loader và các đường ghi
+LISTINGS = 'listings'  # trang chủ, danh mục, bài mới trên dashboard
+PROFILES = 'profiles'  # tên/ảnh đại diện hiển thị cạnh bài viết và bình luận
+USERS = 'users'  # số lượng người dùng
+
+
+def post_tag(post_id):
+    return f'post:{int(post_id)}'
+
+
+def make_key(name, *args):
+    return name + ':' + json.dumps(args, separators=(',', ':'), default=str)
+
+
+class MemoryBackend:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires, tags, value)
+        self._by_tag = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                return MISSING
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, value, ttl, tags):
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, tags, value)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def delete(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def invalidate(self, tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._by_tag.get(tag, set())
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'tags': len(self._by_tag),
+                'max_entries': self.max_entries,
+                'evictions': self.evictions,
+            }
+
+
+class SQLiteBackend:
+    """Cache shared by processes through a small SQLite database file."""
+
+    SWEEP_EVERY = 256  # lần ghi giữa hai lần dọn entry hết hạn
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().executescript(
+            'CREATE TABLE IF NOT EXISTS cache_entry ('
+            ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS idx_cache_entry_expires ON cache_entry(expires);'
+            'CREATE TABLE IF NOT EXISTS cache_tag ('
+            ' tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key)) WITHOUT ROWID;'
+            'CREATE INDEX IF NOT EXISTS idx_cache_tag_key ON cache_tag(key);'
+        )
+
+    def _conn(self):
+        # Mỗi luồng (và mỗi tiến trình sau fork) một kết nối riêng
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            conn.execute('PRAGMA busy_timeout = 2000')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM cache_entry WHERE key = ? AND expires >= ?',
+            (key, time.time())
+        ).fetchone()
+        return MISSING if row is None else pickle.loads(row[0])
+
+    def set(self, key, value, ttl, tags):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)',
+                (key, blob, time.time() + ttl)
+            )
+            conn.execute('DELETE FROM cache_tag WHERE key = ?', (key,))
+            conn.executemany('INSERT INTO cache_tag (tag, key) VALUES (?, ?)',
+                             [(tag, key) for tag in tags])
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            self.sweep()
+
+    def _delete_keys(self, conn, key_query, params):
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS doomed (key TEXT PRIMARY KEY)')
+        conn.execute('DELETE FROM doomed')
+        conn.execute(f'INSERT OR IGNORE INTO doomed {key_query}', params)
+        conn.execute('DELETE FROM cache_entry WHERE key IN (SELECT key FROM doomed)')
+        conn.execute('DELETE FROM cache_tag WHERE key IN (SELECT key FROM doomed)')
+        return conn.execute('SELECT COUNT(*) FROM doomed').fetchone()[0]
+
+    def delete(self, key):
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+            conn.execute('DELETE FROM cache_tag WHERE key = ?', (key,))
+
+    def invalidate(self, tags):
+        tags = list(tags)
+        if not tags:
+            return 0
+        placeholders = ', '.join('?' for _ in tags)
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            return self._delete_keys(
+                conn, f'SELECT key FROM cache_tag WHERE tag IN ({placeholders})', tags)
+
+    def sweep(self):
+        """Drop expired entries, then the soonest-expiring ones above ``max_entries``."""
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            removed = self._delete_keys(
+                conn, 'SELECT key FROM cache_entry WHERE expires < ?', (time.time(),))
+            removed += self._delete_keys(
+                conn,
+                'SELECT key FROM cache_entry ORDER BY expires '
+                'LIMIT max(0, (SELECT COUNT(*) FROM cache_entry) - ?)',
+                (self.max_entries,))
+        return removed
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM cache_entry')
+            conn.execute('DELETE FROM cache_tag')
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            'entries': conn.execute('SELECT COUNT(*) FROM cache_entry').fetchone()[0],
+            'tags': conn.execute('SELECT COUNT(DISTINCT tag) FROM cache_tag').fetchone()[0],
+            'max_entries': self.max_entries,
+            'path': self.path,
+        }
+
+
+class NullBackend:
+    def get(self, key):
+        return MISSING
+
+    def set(self, key, value, ttl, tags):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def invalidate(self, tags):
+        return 0
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+class _Flight:
+    """One in-progress computation of a key that other threads can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = MISSING
+
+
+class Cache:
+    def __init__(self, backend, default_ttl=300.0, stale_ttl=60.0, wait_timeout=10.0,
+                 logger=None):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.wait_timeout = wait_timeout
+        self.logger = logger
+        self._flights = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        # Tăng mỗi lần invalidate: kết quả tính trước đó có thể đã cũ, không lưu
+        self._generation = 0
+        self.hits = self.misses = self.errors = 0
+        self.stale_hits = self.coalesced = self.refreshes = 0
+
+    def _warn(self, action, error):
+        self.errors += 1
+        if self.logger is not None:
+            self.logger.warning('Cache %s failed: %s', action, error)
+
+    def get_or_set(self, key, compute, tags=(), ttl=None):
+        """Return the cached value for ``key``, computing and storing it on a miss.
+
+        A stale value is returned as is while a background refresh runs.
+        A failing backend is logged and bypassed: the page is still served.
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        tags = tuple(tags)
+        try:
+            entry = self.backend.get(key)
+        except (sqlite3.Error, pickle.PickleError, EOFError) as e:
+            self._warn('get', e)
+            entry = MISSING
+        if entry is not MISSING:
+            fresh_until, value = entry
+            if fresh_until >= time.time():
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._refresh_in_background(key, compute, tags, ttl)
+            return value
+        self.misses += 1
+        return self._compute_once(key, compute, tags, ttl)
+
+    def _store(self, key, compute, tags, ttl):
+        generation = self._generation
+        value = compute()
+        if generation == self._generation:
+            try:
+                self.backend.set(key, (time.time() + ttl, value), ttl + self.stale_ttl, tags)
+            except (sqlite3.Error, pickle.PickleError, TypeError) as e:
+                self._warn('set', e)
+        return value
+
+    def _compute_once(self, key, compute, tags, ttl):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            self.coalesced += 1
+            # Chờ luồng đang tính; nếu nó lỗi hoặc quá lâu thì tự tính
+            if flight.done.wait(self.wait_timeout) and flight.value is not MISSING:
+                return flight.value
+            return compute()
+        try:
+            flight.value = self._store(key, compute, tags, ttl)
+            return flight.value
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _refresh_in_background(self, key, compute, tags, ttl):
+        with self._lock:
+            if key in self._flights:
+                return
+            flight = self._flights[key] = _Flight()
+        self.refreshes += 1
+        app = current_app._get_current_object()
+
+        def refresh():
+            try:
+                with app.app_context():
+                    flight.value = self._store(key, compute, tags, ttl)
+            except Exception as e:
+                self._warn('refresh', e)
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+        threading.Thread(target=refresh, name=f'cache-refresh {key}', daemon=True).start()
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._generation += 1
+        try:
+            return self.backend.invalidate(tags)
+        except sqlite3.Error as e:
+            self._warn('invalidate', e)
+            return 0
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        served = self.hits + self.stale_hits
+        lookups = served + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'default_ttl': self.default_ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(served / lookups, 3) if lookups else None,
+            'stale_ttl': self.stale_ttl,
+            'stale_hits': self.stale_hits,
+            'refreshes': self.refreshes,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._flights),
+            'errors': self.errors,
+            **self.backend.stats(),
+        }
+
+
+def get_cache(app=None):
+    app = app or current_app
+    return app.extensions['cache']
+
+
+def invalidate(*tags):
+    """Drop every entry carrying one of ``tags``. Call after the write commits."""
+    return get_cache().invalidate(*tags)
+
+
+def cached(name, tags=(), ttl=None):
+    """Cache a loader's result per ``(name, args)``.
+
+    ``tags`` is a sequence of tags or a function of the loader's arguments
+    returning one. The undecorated loader stays available as ``.uncached``.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            entry_tags = tags(*args) if callable(tags) else tags
+            return get_cache().get_or_set(
+                make_key(name, *args), lambda: func(*args), entry_tags, ttl)
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def create_backend(config):
+    kind = config['CACHE_BACKEND']
+    if kind == 'memory':
+        return MemoryBackend(config['CACHE_MAX_ENTRIES'])
+    if kind == 'sqlite':
+        return SQLiteBackend(config['CACHE_PATH'], config['CACHE_MAX_ENTRIES'])
+    if kind in ('null', None):
+        return NullBackend()
+    raise ValueError(f'Unknown CACHE_BACKEND: {kind!r}')
+
+
+@click.command('clear-cache')
+def clear_cache_command():
+    """Empty the application cache."""
+    get_cache().clear()
+    click.echo('Cache cleared.')
+
+
+def init_app(app):
+    app.extensions['cache'] = Cache(
+        create_backend(app.config),
+        default_ttl=app.config['CACHE_DEFAULT_TTL'],
+        stale_ttl=app.config['CACHE_STALE_TTL'],
+        wait_timeout=app.config['CACHE_WAIT_TIMEOUT'],
+        logger=app.logger,
+    )
+    app.cli.add_command(clear_cache_command)
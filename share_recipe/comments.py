@@ -0,0 +1,60 @@
+"""Paginated comment threads for ``blog.detail`` and the comments JSON API.
+
+Comments are listed newest first with keyset cursors on ``(created, id)``;
+replies stay collapsed behind ``comments.reply_count`` and are fetched one
+page at a time, oldest first. The payload is the same for every viewer: the
+current user's reactions are looked up separately by ``user_reactions``.
+"""
+from share_recipe.pagination import decode_cursor, encode_cursor, paginate
+
+_COMMENT_SELECT = (
+    'SELECT c.id, c.post_id, c.author_id, c.content, c.created, '
+    'c.likes_count, c.dislikes_count, c.reply_count, u.username, u.avatar_path, u.avatar_variants, '
+    'c.created AS cursor_sort, c.id AS cursor_id '
+    'FROM comments c JOIN user u ON c.author_id = u.id'
+)
+_REPLY_SELECT = (
+    'SELECT r.id, r.comment_id, r.author_id, r.content, r.created, '
+    'u.username, u.avatar_path, u.avatar_variants '
+    'FROM comment_replies r JOIN user u ON r.author_id = u.id'
+)
+
+
+def comment_page(db, post_id, per_page, cursor=None):
+    """One page of a post's comments, newest first, as a ``Page``."""
+    return paginate(db, _COMMENT_SELECT, ['c.post_id = ?'], [post_id],
+                    'c.created', 'c.id', per_page, cursor=cursor)
+
+
+def reply_page(db, comment_id, per_page, cursor=None):
+    """One page of replies, oldest first. Returns ``(replies, next_cursor)``."""
+    conditions = ['r.comment_id = ?']
+    params = [comment_id]
+    key = decode_cursor(cursor)
+    if key and key[0] == 'next':
+        conditions.append('(r.created, r.id) > (?, ?)')
+        params.extend(key[1:])
+    rows = db.execute(
+        f"{_REPLY_SELECT} WHERE {' AND '.join(conditions)} "
+        'ORDER BY r.created, r.id LIMIT ?',
+        params + [per_page + 1]
+    ).fetchall()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor('next', rows[-1]['created'], rows[-1]['id'])
+    return [dict(row) for row in rows], next_cursor
+
+
+def user_reactions(db, user_id, comment_ids):
+    """``{comment_id: 'like' | 'dislike'}`` for the comments ``user_id`` reacted to."""
+    comment_ids = list(comment_ids)
+    if not user_id or not comment_ids:
+        return {}
+    placeholders = ', '.join('?' for _ in comment_ids)
+    rows = db.execute(
+        'SELECT comment_id, reaction_type FROM comment_reactions '
+        f'WHERE user_id = ? AND comment_id IN ({placeholders})',
+        [user_id] + comment_ids
+    ).fetchall()
+    return {row['comment_id']: row['reaction_type'] for row in rows}
@@ -0,0 +1,56 @@
+"""Denormalized counters.
+
+The counter columns are maintained by triggers (see the migrations); this
+module recomputes them from the source tables in case they ever drift,
+e.g. after rows were edited by hand with triggers missing.
+"""
+import click
+
+from share_recipe.db import get_db
+
+# (table, column, subquery computing the true value, optional row filter)
+COUNTERS = [
+    ('post', 'like_count',
+     'SELECT COUNT(*) FROM favorites f WHERE f.post_id = post.id', None),
+    ('comments', 'likes_count',
+     "SELECT COUNT(*) FROM comment_reactions cr "
+     "WHERE cr.comment_id = comments.id AND cr.reaction_type = 'like'", None),
+    ('comments', 'dislikes_count',
+     "SELECT COUNT(*) FROM comment_reactions cr "
+     "WHERE cr.comment_id = comments.id AND cr.reaction_type = 'dislike'", None),
+    ('comments', 'reply_count',
+     'SELECT COUNT(*) FROM comment_replies r WHERE r.comment_id = comments.id', None),
+    ('counters', 'value', 'SELECT COUNT(*) FROM post', "name = 'posts'"),
+    ('tags', 'post_count',
+     'SELECT COUNT(*) FROM post_tags pt WHERE pt.tag_id = tags.id', None),
+    ('user', 'favorite_count',
+     'SELECT COUNT(*) FROM favorites f WHERE f.user_id = user.id', None),
+    ('user', 'saved_count',
+     'SELECT COUNT(*) FROM saved_recipes sr WHERE sr.user_id = user.id', None),
+]
+
+
+def recount(db=None):
+    """Recompute every counter. Returns ``{counter: rows fixed}``."""
+    db = get_db() if db is None else db
+    fixed = {}
+    with db:
+        for table, column, subquery, row_filter in COUNTERS:
+            where = f'{column} IS NOT ({subquery})'
+            if row_filter:
+                where += f' AND {row_filter}'
+            fixed[f'{table}.{column}'] = db.execute(
+                f'UPDATE {table} SET {column} = ({subquery}) WHERE {where}'
+            ).rowcount
+    return fixed
+
+
+@click.command('recount')
+def recount_command():
+    """Recompute denormalized counters (likes, reactions, listing totals)."""
+    for name, n in recount().items():
+        click.echo(f'{name}: {n} rows corrected')
+
+
+def init_app(app):
+    app.cli.add_command(recount_command)
@@ -1,49 +1,129 @@
+import queue
 import sqlite3
+import threading
 from datetime import datetime
 
 import click
 from flask import current_app, g
 
+from share_recipe import profiling
+
+
+class ConnectionPool:
+    """A thread-safe pool of tuned SQLite connections.
+
+    Connections are opened lazily, up to ``size`` of them, and handed back
+    to the pool at the end of each app context instead of being closed.
+    """
+
+    def __init__(self, database, size=5, timeout=30.0, busy_timeout=5000,
+                 cache_size=-16000, mmap_size=256 * 1024 * 1024):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout = busy_timeout
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+
+    def acquire(self):
+        """Check out an idle connection, opening a new one if allowed."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError('Timed out waiting for a database connection.')
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding it if it is broken."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+def get_pool(app=None):
+    app = app or current_app
+    return app.extensions['db_pool']
+
 
 def get_db():
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        db = get_pool().acquire()
+        if current_app.config['SQL_INSTRUMENTATION']:
+            db = profiling.InstrumentedConnection(db, profiling.get_stats())
+        g.db = db
     return g.db
 
 
 def close_db(e=None):
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        get_pool().release(profiling.unwrap(db))
 
 def init_db():
-    db = get_db()
-    cursor = db.cursor()
-
-    with current_app.open_resource('schema.sql') as f:
-        sql_commands = f.read().decode('utf8').split(';')
-        for command in sql_commands:
-            command = command.strip()
-            if command:
-                if command.lower().startswith('create table'):
-                    table_name = command.split(' ')[2].strip()
-                    cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-                    if cursor.fetchone() is None:
-                        cursor.execute(command)
-                        print(f"Created table: {table_name}")
-                elif not command.lower().startswith('drop table'):
-                    cursor.execute(command)
-                    print(f"Executed command: {command}")
-    db.commit()
+    """Create or upgrade the schema by applying pending migrations."""
+    from share_recipe import migrate
+    return migrate.upgrade(get_db())
 
 
 @click.command('init-db')
 def init_db_command():
-    """Clear the existing data and create new tables."""
+    """Create missing tables and apply pending migrations."""
     init_db()
     click.echo('Initialized or updated the database.')
 
@@ -53,5 +133,14 @@ sqlite3.register_converter(
 )
 
 def init_app(app):
+    app.extensions['db_pool'] = ConnectionPool(
+        app.config['DATABASE'],
+        size=app.config['DATABASE_POOL_SIZE'],
+        timeout=app.config['DATABASE_POOL_TIMEOUT'],
+        busy_timeout=app.config['DATABASE_BUSY_TIMEOUT'],
+        cache_size=app.config['DATABASE_CACHE_SIZE'],
+        mmap_size=app.config['DATABASE_MMAP_SIZE'],
+    )
     app.teardown_appcontext(close_db)
-    app.cli.add_command(init_db_command)
\ No newline at end of file
+    profiling.init_app(app)
+    app.cli.add_command(init_db_command)
@@ -0,0 +1,80 @@
+"""Rendered-fragment cache for recipe cards.
+
+Listing templates call ``recipe_card(post)`` instead of inlining the card
+markup. The HTML is rendered once from ``blog/_recipe_card.html`` and kept
+in a per-process LRU keyed by ``(post id, post.version, variant)``; since
+triggers bump ``post.version`` on every change a card shows (title, image,
+likes, author name), an entry can never be stale and needs no
+invalidation. Since the key does not include the row's shape, every
+listing must select the same columns (``blog.CARD_COLUMNS``).
+"""
+import time
+
+import click
+from flask import current_app, g, render_template
+from markupsafe import Markup
+
+from share_recipe.cache import MISSING, MemoryBackend
+from share_recipe.db import get_db
+
+CARD_TEMPLATE = 'blog/_recipe_card.html'
+VARIANTS = ('listing', 'profile')
+
+
+def _render(post, variant):
+    template = current_app.jinja_env.get_template(CARD_TEMPLATE)
+    return Markup(template.render(post=post, variant=variant))
+
+
+def recipe_card(post, variant='listing'):
+    """The card HTML for ``post``, from the fragment cache when possible."""
+    fragments = current_app.extensions['fragment_cache']
+    if fragments is None or post['version'] is None:
+        return _render(post, variant)
+    key = (post['id'], post['version'], variant)
+    html = fragments.get(key)
+    if html is MISSING:
+        html = _render(post, variant)
+        fragments.set(key, html, current_app.config['FRAGMENT_CACHE_TTL'], ())
+    return html
+
+
+@click.command('bench-cards')
+@click.option('--rounds', type=int, default=200, help='Renders per measurement.')
+def bench_cards_command(rounds):
+    """Time a 9-card home page render with and without the fragment cache."""
+    from share_recipe.blog import load_index_page
+    from share_recipe.http_cache import listing_validators
+
+    app = current_app._get_current_object()
+    with app.test_request_context('/'):
+        g.user = None
+        generation, _ = listing_validators(get_db())
+        page = load_index_page.uncached(1, None, generation)
+        context = dict(posts=page.items, page=1, total_pages=page.total_pages,
+                       next_cursor=page.next_cursor, prev_cursor=page.prev_cursor)
+        saved = app.extensions['fragment_cache']
+        results = {}
+        try:
+            for label, fragments in (('without fragment cache', None),
+                                     ('with fragment cache', MemoryBackend(1024))):
+                app.extensions['fragment_cache'] = fragments
+                render_template('blog/index.html', **context)  # làm nóng cache
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    render_template('blog/index.html', **context)
+                results[label] = (time.perf_counter() - started) * 1000 / rounds
+        finally:
+            app.extensions['fragment_cache'] = saved
+    click.echo(f'{len(page.items)} cards, {rounds} renders each')
+    for label, ms in results.items():
+        click.echo(f'{label}: {ms:.3f} ms per page')
+    baseline, cached = results.values()
+    click.echo(f'speed-up: {baseline / cached:.2f}x')
+
+
+def init_app(app):
+    size = app.config['FRAGMENT_CACHE_SIZE']
+    app.extensions['fragment_cache'] = MemoryBackend(size) if size > 0 else None
+    app.jinja_env.globals['recipe_card'] = recipe_card
+    app.cli.add_command(bench_cards_command)
@@ -0,0 +1,99 @@
+"""HTTP conditional GET for the recipe pages.
+
+Views compute a cheap validator first (``post.version`` / ``post.modified``
+for a recipe, the ``listing_generation`` counters for listings, all kept by
+triggers from migration 0011) and call :func:`not_modified`. When the
+client's ``If-None-Match`` / ``If-Modified-Since`` still matches, a 304 is
+returned before any heavy query or template rendering. Otherwise the
+validators are remembered and attached to the rendered response.
+
+The HTML also depends on the viewer (navbar, favourite/saved buttons), so
+the ETag includes the logged-in user and every response carries
+``Vary: Cookie``. Anonymous pages are ``public`` so a reverse proxy can
+serve them for ``HTTP_CACHE_MAX_AGE`` seconds; logged-in pages are
+``private, no-cache``. Pages with pending flash messages are never cached.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+
+from flask import current_app, g, request, session
+
+
+def _template_token(app):
+    # Đổi template khi deploy thì ETag cũ không còn khớp
+    latest = 0
+    for root, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        for name in files:
+            latest = max(latest, os.stat(os.path.join(root, name)).st_mtime_ns)
+    return latest
+
+
+def listing_validators(db):
+    """``(generation, last modified)`` for the home and category listings."""
+    rows = dict(db.execute(
+        "SELECT name, value FROM counters "
+        "WHERE name IN ('listing_generation', 'listing_modified')"
+    ).fetchall())
+    modified = datetime.fromtimestamp(rows.get('listing_modified', 0), timezone.utc)
+    return rows.get('listing_generation', 0), modified
+
+
+def make_etag(*parts):
+    user = g.get('user')
+    viewer = ((user['id'], user['username'], user['avatar_path'], user['avatar_variants'], user['role'])
+              if user else None)
+    token = current_app.extensions['http_cache_token']
+    return hashlib.sha1(repr((token, viewer) + parts).encode()).hexdigest()[:24]
+
+
+def not_modified(etag, last_modified):
+    """Return a 304 response if the client's copy is current, else None.
+
+    ``last_modified`` is a naive UTC or aware datetime, or None.
+    """
+    if request.method not in ('GET', 'HEAD') or '_flashes' in session:
+        return None
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        last_modified = last_modified.replace(microsecond=0)
+    g.http_validators = (etag, last_modified)
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified is not None:
+        fresh = last_modified <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    response = current_app.response_class(status=304)
+    _set_headers(response, etag, last_modified)
+    return response
+
+
+def _set_headers(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    if g.get('user'):
+        response.headers['Cache-Control'] = 'private, no-cache'
+    else:
+        response.headers['Cache-Control'] = (
+            f"public, max-age={int(current_app.config['HTTP_CACHE_MAX_AGE'])}"
+        )
+    response.vary.add('Cookie')
+
+
+def _attach_validators(response):
+    validators = g.pop('http_validators', None)
+    if validators is None or response.status_code != 200:
+        return response
+    _set_headers(response, *validators)
+    return response
+
+
+def init_app(app):
+    app.extensions['http_cache_token'] = _template_token(app)
+    app.after_request(_attach_validators)
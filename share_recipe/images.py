@@ -0,0 +1,269 @@
+"""Resized WebP derivatives of uploaded images.
+
+Uploads are kept as the original file and, next to it, one WebP file per
+width in :data:`SIZES` (``<name>.card-480.webp``...). Widths wider than the
+original are skipped, so a small photo only gets the sizes it can fill.
+The result is stored as JSON (``blog_images.variants``,
+``user.avatar_variants``)::
+
+    {"card": [{"path": "uploads/...card-320.webp", "width": 320, "height": 240}, ...]}
+
+and templates turn it into a ``<picture>`` with a WebP ``srcset`` and the
+original as fallback (``templates/_images.html``).
+
+Views store a new upload with ``NULL`` variants and queue an
+``images.build_variants`` job (share_recipe/jobs.py), so resizing never
+runs inside the request; until the job has run, pages show the original.
+
+Pillow is optional: without it :func:`make_variants` returns ``None``,
+pages keep serving the originals and ``flask image-variants`` can build
+the derivatives later.
+"""
+import json
+import os
+
+import click
+from flask import current_app, url_for
+
+from share_recipe import cache, jobs
+from share_recipe.db import get_db
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow không bắt buộc
+    Image = ImageOps = None
+
+POST = 'post'
+AVATAR = 'avatar'
+
+# kind -> {variant: widths}; avatar được cắt vuông
+SIZES = {
+    POST: {'card': (320, 480, 640), 'detail': (800, 1200, 1600)},
+    AVATAR: {'avatar': (64, 128, 256)},
+}
+WEBP_QUALITY = 80
+
+
+def available():
+    return Image is not None
+
+
+def _static_path(path):
+    return os.path.join(current_app.static_folder, path)
+
+
+def _open(full_path):
+    with Image.open(full_path) as original:
+        original.seek(0)  # GIF động: chỉ lấy khung đầu
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        image.load()
+    return image
+
+
+def make_variants(path, kind=POST, source=None):
+    """Write the WebP derivatives of static file ``path``.
+
+    ``source`` is where to read the image from if it is not at ``path`` yet
+    (an upload staged by ``storage.save``). Returns ``(width, height, variants_json)`` of the original, or ``None``
+    when Pillow is missing or the file cannot be decoded.
+    """
+    if not available():
+        return None
+    base = os.path.splitext(path)[0]
+    variants = {}
+    try:
+        image = _open(source or _static_path(path))
+        width, height = image.size
+        limit = min(width, height) if kind == AVATAR else width
+        # Upload đang chờ publish: thư mục của blob có thể chưa tồn tại
+        os.makedirs(os.path.dirname(_static_path(path)), exist_ok=True)
+        for name, widths in SIZES[kind].items():
+            for target in widths:
+                target = min(target, limit)
+                if kind == AVATAR:
+                    resized = ImageOps.fit(image, (target, target), Image.LANCZOS)
+                else:
+                    resized = image.resize(
+                        (target, max(1, round(height * target / width))), Image.LANCZOS
+                    )
+                variant_path = f'{base}.{name}-{target}.webp'
+                resized.save(_static_path(variant_path), 'WEBP',
+                             quality=WEBP_QUALITY, method=4)
+                variants.setdefault(name, []).append(
+                    {'path': variant_path, 'width': resized.width, 'height': resized.height}
+                )
+                # Không phóng to: ảnh nhỏ chỉ có các cỡ nó lấp đầy được
+                if target >= limit:
+                    break
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        current_app.logger.warning('Cannot build variants for %s: %s', path, e)
+        delete_variants(json.dumps(variants))
+        return None
+    return width, height, json.dumps(variants)
+
+
+def variants_for(db, path, kind=POST, source=None):
+    """Like :func:`make_variants`, but reuse the variants of another row
+    already pointing at the same (content-addressed) file."""
+    if kind == POST:
+        row = db.execute(
+            'SELECT width, height, variants FROM blog_images '
+            'WHERE image_path = ? AND variants IS NOT NULL LIMIT 1', (path,)
+        ).fetchone()
+        if row is not None:
+            return tuple(row)
+    else:
+        row = db.execute(
+            'SELECT avatar_variants FROM user '
+            'WHERE avatar_path = ? AND avatar_variants IS NOT NULL LIMIT 1', (path,)
+        ).fetchone()
+        if row is not None:
+            return None, None, row[0]
+    return make_variants(path, kind, source)
+
+
+@jobs.task('images.build_variants')
+def build_variants(kind, path):
+    """Fill in the variants of every ``kind`` row using ``path`` that has none."""
+    if not available():
+        return
+    db = get_db()
+    if kind == POST:
+        pending = db.execute(
+            'SELECT DISTINCT post_id FROM blog_images WHERE image_path = ? AND variants IS NULL',
+            (path,)
+        ).fetchall()
+    else:
+        pending = db.execute(
+            'SELECT id FROM user WHERE avatar_path = ? AND avatar_variants IS NULL', (path,)
+        ).fetchall()
+    if not pending:
+        return  # đã xóa/đổi ảnh, hoặc job khác đã làm xong
+    if not os.path.exists(_static_path(path)):
+        # View enqueue trong transaction rồi mới publish file: thử lại sau
+        raise FileNotFoundError(path)
+    result = variants_for(db, path, kind)
+    if result is None:
+        return  # file hỏng: make_variants đã ghi log, thử lại cũng vậy
+    width, height, variants = result
+    with db:
+        if kind == POST:
+            db.execute(
+                'UPDATE blog_images SET width = COALESCE(?, width), height = COALESCE(?, height), '
+                'variants = ? WHERE image_path = ? AND variants IS NULL',
+                (width, height, variants, path)
+            )
+        else:
+            db.execute(
+                'UPDATE user SET avatar_variants = ? WHERE avatar_path = ? AND avatar_variants IS NULL',
+                (variants, path)
+            )
+    if kind == POST:
+        cache.invalidate(cache.LISTINGS, *[cache.post_tag(row['post_id']) for row in pending])
+    else:
+        cache.invalidate(cache.PROFILES)
+
+
+def delete_variants(variants_json, keep=()):
+    """Remove the files listed in a variants JSON value, except ``keep``."""
+    for sources in _parse(variants_json).values():
+        for item in sources:
+            if item['path'] in keep:
+                continue
+            try:
+                os.remove(_static_path(item['path']))
+            except OSError:
+                pass
+
+
+def _parse(variants_json):
+    if not variants_json:
+        return {}
+    try:
+        return json.loads(variants_json)
+    except ValueError:
+        return {}
+
+
+def image_sources(variants_json, name):
+    """The ``name`` variants of an image, narrowest first (for templates)."""
+    return _parse(variants_json).get(name, [])
+
+
+def image_srcset(variants_json, name):
+    return ', '.join(
+        f"{url_for('static', filename=item['path'])} {item['width']}w"
+        for item in image_sources(variants_json, name)
+    )
+
+
+def build_missing(db, force=False):
+    """Build derivatives for images (and avatars) that have none yet.
+
+    Returns ``(processed, failed, original_bytes, variant_bytes)``; the
+    byte counts compare each processed original with its card/avatar
+    variant at the size listing pages ask for.
+    """
+    condition = '' if force else ' AND variants IS NULL'
+    images = db.execute(
+        f'SELECT id, image_path AS path, variants FROM blog_images '
+        f'WHERE image_path IS NOT NULL{condition}'
+    ).fetchall()
+    condition = '' if force else ' AND avatar_variants IS NULL'
+    avatars = db.execute(
+        f'SELECT id, avatar_path AS path, avatar_variants AS variants FROM user '
+        f"WHERE avatar_path IS NOT NULL AND avatar_path != ''{condition}"
+    ).fetchall()
+
+    processed = failed = original_bytes = variant_bytes = 0
+    for kind, rows, name in ((POST, images, 'card'), (AVATAR, avatars, 'avatar')):
+        for row in rows:
+            if not os.path.exists(_static_path(row['path'])):
+                failed += 1
+                continue
+            result = make_variants(row['path'], kind) if force else variants_for(db, row['path'], kind)
+            if result is None:
+                failed += 1
+                continue
+            width, height, variants = result
+            with db:
+                if kind == POST:
+                    db.execute(
+                        'UPDATE blog_images SET width = ?, height = ?, variants = ? WHERE id = ?',
+                        (width, height, variants, row['id'])
+                    )
+                else:
+                    db.execute('UPDATE user SET avatar_variants = ? WHERE id = ?',
+                               (variants, row['id']))
+            # Bỏ các file cũ không còn được dùng (khi --force đổi kích thước)
+            kept = {item['path'] for sources in _parse(variants).values() for item in sources}
+            delete_variants(row['variants'], keep=kept)
+            processed += 1
+            original_bytes += os.path.getsize(_static_path(row['path']))
+            sources = image_sources(variants, name)
+            if sources:
+                variant_bytes += os.path.getsize(_static_path(sources[len(sources) // 2]['path']))
+    return processed, failed, original_bytes, variant_bytes
+
+
+@click.command('image-variants')
+@click.option('--force', is_flag=True, help='Rebuild images that already have variants.')
+def image_variants_command(force):
+    """Build WebP card/detail/avatar variants for existing uploads."""
+    if not available():
+        raise click.ClickException('Pillow is not installed (pip install Pillow).')
+    processed, failed, original_bytes, variant_bytes = build_missing(get_db(), force)
+    click.echo(f'Processed {processed} images, {failed} missing or unreadable.')
+    if processed:
+        click.echo(f'Originals {original_bytes / 1024:.1f} KiB, listing-size variants '
+                   f'{variant_bytes / 1024:.1f} KiB '
+                   f'({variant_bytes * 100 / max(original_bytes, 1):.0f}%).')
+
+
+def init_app(app):
+    app.jinja_env.globals['image_sources'] = image_sources
+    app.jinja_env.globals['image_srcset'] = image_srcset
+    app.cli.add_command(image_variants_command)
@@ -0,0 +1,180 @@
+"""Ingredient inverted index and "cook with what I have" search.
+
+``post.ingredients`` is free text. On every create/update it is parsed into
+normalized ingredient keys (accent-folded, quantities and units removed)
+stored once in ``ingredient`` and linked to posts through
+``post_ingredient``, whose primary key ``(ingredient_id, post_id)`` is the
+inverted index. A search resolves the supplied ingredients to index ranges
+and counts, per post, how many of them it covers.
+
+A supplied ingredient matches every key it is a word prefix of: "nấm"
+finds "nấm hương" and "nấm đùi gà", "thịt bò" finds "thịt bò chay".
+"""
+import re
+import unicodedata
+
+import click
+
+from share_recipe.db import get_db
+from share_recipe.recipe_search import POST_COLUMNS, POST_JOINS, TAG_FILTER, fold_text
+
+MAX_NAME_LENGTH = 40
+MAX_NAME_WORDS = 5
+SORTS = ('coverage', 'likes', 'newest')
+
+_BULLET_RE = re.compile(r'^[-*•+–]+\s*')
+_PARENS_RE = re.compile(r'\([^)]*\)?')
+_SEPARATOR_RE = re.compile(r'[,;&/+]|\s(?:và|hoặc|hay)\s', re.IGNORECASE)
+_UNITS = (
+    r'(?:muỗng canh|muỗng cà phê|muỗng|thìa canh|thìa cà phê|thìa|chén|bát|'
+    r'cây|củ|quả|trái|tép|miếng|nhánh|gói|bịch|lát|con|cái|hộp|lon|chai|'
+    r'kg|gram|gr|g|ml|lít|l)'
+)
+_AMOUNT = r'[\d.,/½¼¾]+(?:\s*-\s*[\d.,/]+)?\s*'
+# "1-2 tép tỏi", "Thịt bò 500g"
+_QUANTITY_RE = re.compile(rf'^{_AMOUNT}{_UNITS}?\b\s*', re.IGNORECASE)
+_TRAILING_QUANTITY_RE = re.compile(rf'\s+{_AMOUNT}{_UNITS}?$', re.IGNORECASE)
+# Phần sau dấu ":" là định lượng chứ không phải tên nguyên liệu
+_AMOUNT_WORDS = ('du dung', 'vua du', 'tuy thich', 'tuy khau vi', 'it')
+_STOP_KEYS = {'nguyen lieu', 'nguyen lieu chinh', 'gia vi', 'cac loai gia vi', 'khac'}
+
+
+def _clean(part):
+    part = _QUANTITY_RE.sub('', part.strip())
+    part = _TRAILING_QUANTITY_RE.sub('', part)
+    return part.strip(' .…:-').strip()
+
+
+def _line_parts(line):
+    line = _PARENS_RE.sub('', _BULLET_RE.sub('', line.strip()))
+    if ':' in line:
+        label, rest = (s.strip() for s in line.split(':', 1))
+        folded_rest = fold_text(rest)
+        if not rest or fold_text(label).startswith('nguyen lieu'):
+            line = rest
+        elif any(ch.isdigit() for ch in rest) or folded_rest in _AMOUNT_WORDS:
+            # "Tỏi: 5 tép"
+            line = label
+        else:
+            # "Gia vị: muối, tiêu"
+            line = rest
+    return _SEPARATOR_RE.split(line)
+
+
+def parse_ingredients(text):
+    """Return ``[(key, name), ...]`` for the ingredients in ``text``, deduplicated."""
+    found = {}
+    for line in unicodedata.normalize('NFC', text or '').splitlines():
+        for part in _line_parts(line):
+            name = _clean(part)
+            key = fold_text(name)
+            if (not key or key in _STOP_KEYS or key.isdigit()
+                    or len(key) > MAX_NAME_LENGTH or key.count(' ') >= MAX_NAME_WORDS):
+                continue
+            found.setdefault(key, name.lower())
+    return list(found.items())
+
+
+def index_post(db, post_id, text):
+    """Replace the index entries of one post. Runs in the caller's transaction."""
+    db.execute('DELETE FROM post_ingredient WHERE post_id = ?', (post_id,))
+    parsed = parse_ingredients(text)
+    if not parsed:
+        return 0
+    db.executemany('INSERT OR IGNORE INTO ingredient (key, name) VALUES (?, ?)', parsed)
+    db.executemany(
+        'INSERT OR IGNORE INTO post_ingredient (ingredient_id, post_id) '
+        'SELECT id, ? FROM ingredient WHERE key = ?',
+        [(post_id, key) for key, _ in parsed]
+    )
+    return len(parsed)
+
+
+def reindex_all(db):
+    """Rebuild the index for every post and drop unused ingredients."""
+    rows = db.execute('SELECT id, ingredients FROM post').fetchall()
+    for row in rows:
+        index_post(db, row['id'], row['ingredients'])
+    db.execute(
+        'DELETE FROM ingredient WHERE NOT EXISTS '
+        '(SELECT 1 FROM post_ingredient pi WHERE pi.ingredient_id = ingredient.id)'
+    )
+    return len(rows)
+
+
+def _coverage_query(have, tag, sort):
+    keys = [key for key, _ in parse_ingredients(have)]
+    if not keys:
+        return None, []
+
+    # Mỗi nguyên liệu là một khoảng trên chỉ mục: key hoặc "key ..."
+    wanted = ', '.join('(?, ?, ?)' for _ in keys)
+    params = []
+    for term, key in enumerate(keys):
+        params.extend([term, key, key + '!'])
+
+    sql = (
+        f'WITH wanted(term, lo, hi) AS (VALUES {wanted}), '
+        'hits AS ('
+        ' SELECT pi.post_id, COUNT(DISTINCT w.term) AS matched'
+        ' FROM wanted w'
+        ' JOIN ingredient i ON i.key >= w.lo AND i.key < w.hi'
+        ' JOIN post_ingredient pi ON pi.ingredient_id = i.id'
+        ' GROUP BY pi.post_id'
+        ') '
+        f'SELECT {POST_COLUMNS}, h.matched, '
+        '(SELECT COUNT(*) FROM post_ingredient x WHERE x.post_id = p.id) AS ingredient_count '
+        f'FROM hits h JOIN post p ON p.id = h.post_id {POST_JOINS}'
+    )
+    if tag:
+        sql += f' WHERE {TAG_FILTER}'
+        params.append(tag)
+
+    if sort == 'likes':
+        sql += ' ORDER BY p.like_count DESC, p.created DESC'
+    elif sort == 'newest':
+        sql += ' ORDER BY p.created DESC'
+    else:
+        # Nhiều nguyên liệu trùng nhất, rồi ít nguyên liệu còn thiếu nhất
+        sql += ' ORDER BY h.matched DESC, ingredient_count - h.matched, p.created DESC'
+    return sql, params
+
+
+def search_by_ingredients(db, have, tag='', sort='coverage', limit=None, offset=0):
+    """Rank posts by how many of the ingredients in ``have`` they use.
+
+    Each result carries ``matched`` (supplied ingredients covered) and
+    ``ingredient_count`` (ingredients the recipe needs in total).
+    """
+    sql, params = _coverage_query(have, tag, sort)
+    if sql is None:
+        return []
+    if limit is not None:
+        sql += ' LIMIT ? OFFSET ?'
+        params.extend([limit, offset])
+    return [dict(row) for row in db.execute(sql, params).fetchall()]
+
+
+def count_by_ingredients(db, have, tag='', cap=None):
+    """Number of posts ``search_by_ingredients`` would return, counting at most ``cap + 1``."""
+    sql, params = _coverage_query(have, tag, 'newest')
+    if sql is None:
+        return 0
+    if cap is not None:
+        sql += ' LIMIT ?'
+        params.append(cap + 1)
+    return db.execute(f'SELECT COUNT(*) FROM ({sql})', params).fetchone()[0]
+
+
+@click.command('index-ingredients')
+def index_ingredients_command():
+    """Rebuild the ingredient index for all existing posts."""
+    db = get_db()
+    with db:
+        count = reindex_all(db)
+    total = db.execute('SELECT COUNT(*) FROM ingredient').fetchone()[0]
+    click.echo(f'Indexed {count} recipes, {total} distinct ingredients.')
+
+
+def init_app(app):
+    app.cli.add_command(index_ingredients_command)
@@ -0,0 +1,251 @@
+"""Durable background jobs backed by the ``jobs`` table.
+
+Request handlers call :func:`enqueue` inside their own transaction, so a
+job exists exactly when the change that needs it was committed, and return
+without waiting for the work. Tasks are plain functions registered with
+:func:`task`; their keyword arguments are stored as JSON.
+
+A :class:`Worker` claims due jobs one at a time with
+``UPDATE ... RETURNING`` (the write lock makes the claim atomic across
+processes) and runs them on a bounded thread pool, each in an app context.
+A claimed job is leased for ``JOBS_LEASE`` seconds; if its process dies
+the lease expires and another worker picks it up again. A failing job is
+retried with exponential backoff (``JOBS_RETRY_DELAY * 2**n``) until
+``JOBS_MAX_ATTEMPTS``, then kept as ``failed`` with its error.
+
+Each web process starts an embedded worker on its first request
+(``JOBS_EMBEDDED_WORKER``); ``flask worker`` runs one standalone, and
+``flask worker --once`` runs whatever is due and exits.
+"""
+import json
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app, g
+
+from share_recipe.db import get_db
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FAILED = 'failed'
+MAX_RETRY_DELAY = 3600.0
+
+TASKS = {}
+
+_CLAIM_SQL = (
+    "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ? "
+    'WHERE id = (SELECT id FROM jobs WHERE {condition} ORDER BY {order} LIMIT 1) '
+    'RETURNING id, name, payload, attempts, max_attempts'
+)
+# Job đến hạn trước, rồi tới job 'running' mà worker giữ nó đã chết (hết lease)
+_CLAIM_READY = _CLAIM_SQL.format(condition="status = 'queued' AND run_at <= ?",
+                                 order='run_at, id')
+_CLAIM_EXPIRED = _CLAIM_SQL.format(condition="status = 'running' AND locked_until < ?",
+                                   order='locked_until, id')
+
+
+def task(name):
+    """Register the decorated function as the task called ``name``."""
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, delay=0, **payload):
+    """Queue task ``name`` in the current transaction; it runs after commit."""
+    if name not in TASKS:
+        raise KeyError(f'Unknown task {name!r}')
+    get_db().execute(
+        'INSERT INTO jobs (name, payload, run_at, max_attempts) VALUES (?, ?, ?, ?)',
+        (name, json.dumps(payload), time.time() + delay, current_app.config['JOBS_MAX_ATTEMPTS'])
+    )
+    g.jobs_enqueued = True
+
+
+def schedule(name, delay=0, **payload):
+    """Queue task ``name`` unless one is already queued or running.
+
+    For periodic tasks that re-enqueue themselves: called at startup it
+    (re)starts the cycle without piling up copies. Returns True if queued.
+    """
+    if name not in TASKS:
+        raise KeyError(f'Unknown task {name!r}')
+    cursor = get_db().execute(
+        'INSERT INTO jobs (name, payload, run_at, max_attempts) SELECT ?, ?, ?, ? '
+        "WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE name = ? AND status != 'failed')",
+        (name, json.dumps(payload), time.time() + delay, current_app.config['JOBS_MAX_ATTEMPTS'],
+         name)
+    )
+    g.jobs_enqueued = True
+    return cursor.rowcount > 0
+
+
+def claim(db, lease):
+    """Mark the next due job as running and return it, or None."""
+    now = time.time()
+    with db:
+        for sql in (_CLAIM_READY, _CLAIM_EXPIRED):
+            job = db.execute(sql, (now + lease, now)).fetchone()
+            if job is not None:
+                return job
+    return None
+
+
+def run(db, job):
+    """Run a claimed job and record the outcome. Returns True on success."""
+    try:
+        TASKS[job['name']](**json.loads(job['payload']))
+    except Exception:
+        error = traceback.format_exc(limit=5)
+        current_app.logger.warning('Job %s (%s) failed, attempt %s/%s\n%s', job['id'],
+                                   job['name'], job['attempts'], job['max_attempts'], error)
+        db.rollback()
+        delay = min(current_app.config['JOBS_RETRY_DELAY'] * 2 ** (job['attempts'] - 1),
+                    MAX_RETRY_DELAY)
+        with db:
+            db.execute(
+                'UPDATE jobs SET status = ?, run_at = ?, locked_until = NULL, last_error = ? '
+                'WHERE id = ?',
+                (FAILED if job['attempts'] >= job['max_attempts'] else QUEUED,
+                 time.time() + delay, error, job['id'])
+            )
+        return False
+    with db:
+        db.execute('DELETE FROM jobs WHERE id = ?', (job['id'],))
+    return True
+
+
+def run_pending(app):
+    """Run every job that is due now in this thread; return (succeeded, failed)."""
+    succeeded = failed = 0
+    while True:
+        with app.app_context():
+            db = get_db()
+            job = claim(db, app.config['JOBS_LEASE'])
+            if job is None:
+                return succeeded, failed
+            if run(db, job):
+                succeeded += 1
+            else:
+                failed += 1
+
+
+class Worker:
+    """Claims due jobs and runs them on at most ``threads`` threads."""
+
+    def __init__(self, app, threads):
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job')
+        self._slots = threading.BoundedSemaphore(threads)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._dispatch, name='job-dispatcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _dispatch(self):
+        poll_interval = self.app.config['JOBS_POLL_INTERVAL']
+        while not self._stopping.is_set():
+            # Chỉ nhận job mới khi còn thread rảnh: job chờ trong DB, không trong bộ nhớ
+            self._slots.acquire()
+            try:
+                with self.app.app_context():
+                    job = claim(get_db(), self.app.config['JOBS_LEASE'])
+            except Exception:
+                self.app.logger.exception('Cannot claim a job')
+                job = None
+            if job is None:
+                self._slots.release()
+                self._wake.wait(poll_interval)
+                self._wake.clear()
+                continue
+            self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            with self.app.app_context():
+                run(get_db(), job)
+        finally:
+            self._slots.release()
+
+
+def get_worker(app=None):
+    """The embedded worker of this process, started on first use."""
+    app = app or current_app._get_current_object()
+    worker = app.extensions.get('job_worker')
+    if worker is None:
+        with app.extensions['job_worker_lock']:
+            worker = app.extensions.get('job_worker')
+            if worker is None:
+                worker = Worker(app, app.config['JOBS_WORKER_THREADS']).start()
+                app.extensions['job_worker'] = worker
+    return worker
+
+
+def _start_embedded_worker():
+    if current_app.config['JOBS_EMBEDDED_WORKER']:
+        get_worker()
+
+
+def _wake_worker(exc=None):
+    if g.pop('jobs_enqueued', False) and current_app.config['JOBS_EMBEDDED_WORKER']:
+        get_worker().wake()
+
+
+@click.command('worker')
+@click.option('--threads', type=int, default=None, help='Jobs run at the same time.')
+@click.option('--once', is_flag=True, help='Run the jobs that are due now, then exit.')
+def worker_command(threads, once):
+    """Run background jobs (image variants, file cleanup)."""
+    app = current_app._get_current_object()
+    if once:
+        succeeded, failed = run_pending(app)
+        click.echo(f'{succeeded} jobs done, {failed} failed.')
+        return
+    worker = Worker(app, threads or app.config['JOBS_WORKER_THREADS']).start()
+    click.echo(f'Worker running with {threads or app.config["JOBS_WORKER_THREADS"]} threads; '
+               'Ctrl+C to stop.')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        click.echo('Stopping: waiting for running jobs...')
+        worker.stop()
+
+
+@click.command('jobs')
+def jobs_command():
+    """Show queued, running and failed jobs."""
+    db = get_db()
+    for row in db.execute('SELECT status, name, COUNT(*) AS n FROM jobs GROUP BY status, name'):
+        click.echo(f"{row['status']:8} {row['name']}: {row['n']}")
+    for row in db.execute(
+        "SELECT id, name, attempts, last_error FROM jobs WHERE status = 'failed' "
+        'ORDER BY id DESC LIMIT 5'
+    ):
+        last_line = (row['last_error'] or '').strip().splitlines()[-1:] or ['']
+        click.echo(f"failed #{row['id']} {row['name']} after {row['attempts']} attempts: "
+                   f'{last_line[0]}')
+
+
+def init_app(app):
+    app.extensions['job_worker_lock'] = threading.Lock()
+    app.before_request(_start_embedded_worker)
+    app.teardown_request(_wake_worker)
+    app.cli.add_command(worker_command)
+    app.cli.add_command(jobs_command)
@@ -0,0 +1,227 @@
+"""Versioned schema migrations.
+
+Migrations live in ``share_recipe/migrations`` and are named
+``NNNN_description.sql`` or ``NNNN_description.py``. They are applied in
+version order and recorded in the ``schema_version`` table.
+
+A ``.sql`` migration runs inside a single ``BEGIN IMMEDIATE`` transaction
+together with its ``schema_version`` row. A file whose first line is
+``-- migrate: no-transaction`` instead commits every statement on its own,
+which keeps the write lock short while building indexes on a live database
+(WAL readers are never blocked). Such files must be idempotent, e.g. use
+``CREATE INDEX IF NOT EXISTS``.
+
+A ``.py`` migration defines ``upgrade(db)`` and runs inside the same kind
+of transaction; use it for backfills that need Python.
+"""
+import importlib.util
+import os
+import re
+import sqlite3
+import time
+
+import click
+from flask import current_app
+
+from share_recipe.db import get_db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+NO_TRANSACTION = '-- migrate: no-transaction'
+
+_FILENAME_RE = re.compile(r'^(\d{4})_(\w+)\.(sql|py)$')
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    @property
+    def label(self):
+        return f'{self.version:04d}_{self.name}'
+
+    def __repr__(self):
+        return f'<Migration {self.label}>'
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """Return all migrations found in ``directory``, sorted by version."""
+    migrations = {}
+    for filename in os.listdir(directory):
+        match = _FILENAME_RE.match(filename)
+        if match is None:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise RuntimeError(
+                f'Duplicate migration version {version:04d}: '
+                f'{migrations[version].path} and {filename}'
+            )
+        migrations[version] = Migration(
+            version, match.group(2), os.path.join(directory, filename)
+        )
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def split_statements(script):
+    """Split a SQL script into complete statements.
+
+    Unlike splitting on every ``;``, this keeps trigger bodies and string
+    literals containing semicolons intact.
+    """
+    statements = []
+    buffer = ''
+    for part in script.split(';'):
+        buffer += part + ';'
+        if sqlite3.complete_statement(buffer):
+            statement = buffer.strip()
+            if _strip_comments(statement).strip(' \t\n;'):
+                statements.append(statement)
+            buffer = ''
+    if _strip_comments(buffer).strip(' \t\n;'):
+        raise ValueError(f'Incomplete SQL statement: {buffer.strip()[:80]}')
+    return statements
+
+
+def _strip_comments(sql):
+    return '\n'.join(line.split('--', 1)[0] for line in sql.splitlines())
+
+
+def ensure_version_table(db):
+    db.execute(
+        'CREATE TABLE IF NOT EXISTS schema_version ('
+        ' version INTEGER PRIMARY KEY,'
+        ' name TEXT NOT NULL,'
+        ' applied TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP'
+        ')'
+    )
+    db.commit()
+
+
+def applied_versions(db):
+    ensure_version_table(db)
+    return {row['version'] for row in db.execute('SELECT version FROM schema_version')}
+
+
+def pending(db, migrations=None):
+    migrations = discover() if migrations is None else migrations
+    done = applied_versions(db)
+    return [m for m in migrations if m.version not in done]
+
+
+def _load_python(migration):
+    spec = importlib.util.spec_from_file_location(
+        f'share_recipe.migrations.m{migration.label}', migration.path
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _record(db, migration):
+    db.execute(
+        'INSERT INTO schema_version (version, name) VALUES (?, ?)',
+        (migration.version, migration.name)
+    )
+
+
+def _is_applied(db, migration):
+    return db.execute(
+        'SELECT 1 FROM schema_version WHERE version = ?', (migration.version,)
+    ).fetchone() is not None
+
+
+def apply(db, migration):
+    """Apply one migration. Returns False if another process beat us to it."""
+    if migration.path.endswith('.py'):
+        module = _load_python(migration)
+        statements = None
+    else:
+        with open(migration.path, encoding='utf8') as f:
+            script = f.read()
+        statements = split_statements(script)
+        if script.lstrip().startswith(NO_TRANSACTION):
+            return _apply_per_statement(db, migration, statements)
+
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        if _is_applied(db, migration):
+            db.rollback()
+            return False
+        if statements is None:
+            module.upgrade(db)
+        else:
+            for statement in statements:
+                db.execute(statement)
+        _record(db, migration)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return True
+
+
+def _apply_per_statement(db, migration, statements):
+    for statement in statements:
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(statement)
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        if _is_applied(db, migration):
+            db.rollback()
+            return False
+        _record(db, migration)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return True
+
+
+def upgrade(db=None, target=None, log=None):
+    """Apply every pending migration up to ``target`` (inclusive).
+
+    Returns the list of ``(migration, seconds)`` that were applied.
+    """
+    db = get_db() if db is None else db
+    log = log or current_app.logger.info
+    applied = []
+    for migration in pending(db):
+        if target is not None and migration.version > target:
+            break
+        started = time.perf_counter()
+        if apply(db, migration):
+            elapsed = time.perf_counter() - started
+            applied.append((migration, elapsed))
+            log(f'Applied migration {migration.label} ({elapsed * 1000:.1f} ms)')
+    return applied
+
+
+@click.command('migrate')
+@click.option('--status', is_flag=True, help='List migrations and exit.')
+@click.option('--target', type=int, default=None,
+              help='Stop after this migration version.')
+def migrate_command(status, target):
+    """Apply pending schema migrations."""
+    db = get_db()
+    if status:
+        done = applied_versions(db)
+        for migration in discover():
+            mark = 'x' if migration.version in done else ' '
+            click.echo(f'[{mark}] {migration.label}')
+        return
+
+    applied = upgrade(db, target=target, log=click.echo)
+    if not applied:
+        click.echo('Database is up to date.')
+
+
+def init_app(app):
+    app.cli.add_command(migrate_command)
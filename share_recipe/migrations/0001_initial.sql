@@ -1,142 +1,134 @@
-DROP TABLE IF EXISTS user;
-DROP TABLE IF EXISTS post;
-DROP TABLE IF EXISTS blog_images;
-DROP TABLE IF EXISTS comments;
-DROP TABLE IF EXISTS comment_replies;
-DROP TABLE IF EXISTS favorites;
-DROP TABLE IF EXISTS comment_reactions;
-DROP TABLE IF EXISTS saved_recipes;
-DROP TABLE IF EXISTS post_tags;
-DROP TABLE IF EXISTS tags;
-
-CREATE TABLE user (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE NOT NULL,
-    password TEXT NOT NULL,
-    email TEXT UNIQUE NOT NULL,
-    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    avatar_path TEXT,
-    role TEXT NOT NULL DEFAULT 'user',
-    is_blocked BOOLEAN NOT NULL DEFAULT 0,
-    gender TEXT,
-    birthdate DATE,
-    phone TEXT
-);
-
-CREATE TABLE post (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    author_id INTEGER NOT NULL,
-    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    title TEXT NOT NULL,
-    description TEXT,
-    ingredients TEXT NOT NULL,
-    instructions TEXT NOT NULL,
-    cooking_time INTEGER DEFAULT 0,
-    servings INTEGER DEFAULT 1,
-    FOREIGN KEY (author_id) REFERENCES user (id)
-);
-
-CREATE TABLE blog_images (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    post_id INTEGER NOT NULL,
-    image_path TEXT NOT NULL,
-    is_main_image BOOLEAN DEFAULT 0,
-    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE
-);
-
-CREATE TABLE comments (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    post_id INTEGER NOT NULL,
-    author_id INTEGER NOT NULL,
-    content TEXT NOT NULL,
-    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE,
-    FOREIGN KEY (author_id) REFERENCES user (id)
-);
-
-CREATE TABLE comment_replies (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    comment_id INTEGER NOT NULL,
-    author_id INTEGER NOT NULL,
-    content TEXT NOT NULL,
-    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (comment_id) REFERENCES comments (id) ON DELETE CASCADE,
-    FOREIGN KEY (author_id) REFERENCES user (id)
-);
-
-CREATE TABLE favorites (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    post_id INTEGER NOT NULL,
-    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES user (id) ON DELETE CASCADE,
-    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE,
-    UNIQUE(user_id, post_id)
-);
-
-CREATE TABLE comment_reactions (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    comment_id INTEGER NOT NULL,
-    user_id INTEGER NOT NULL,
-    reaction_type TEXT NOT NULL CHECK(reaction_type IN ('like', 'dislike')),
-    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (comment_id) REFERENCES comments (id) ON DELETE CASCADE,
-    FOREIGN KEY (user_id) REFERENCES user (id),
-    UNIQUE(comment_id, user_id)
-);
-
-CREATE TABLE saved_recipes (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    post_id INTEGER NOT NULL,
-    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES user (id),
-    FOREIGN KEY (post_id) REFERENCES post (id)
-);
-
-CREATE TABLE tags (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT UNIQUE NOT NULL,
-    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
-
-CREATE TABLE post_tags (
-    post_id INTEGER NOT NULL,
-    tag_id INTEGER NOT NULL,
-    PRIMARY KEY (post_id, tag_id),
-    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE,
-    FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE
-);
-
--- Create indexes
-CREATE INDEX IF NOT EXISTS idx_post_author ON post(author_id);
-CREATE INDEX IF NOT EXISTS idx_blog_images_post ON blog_images(post_id);
-CREATE INDEX IF NOT EXISTS idx_post_tags_post ON post_tags(post_id);
-CREATE INDEX IF NOT EXISTS idx_post_tags_tag ON post_tags(tag_id);
-
--- Insert default tags
-INSERT OR IGNORE INTO tags (name) VALUES
-  ('Món nước'),
-  ('Món cuốn'),
-  ('Món xào'),
-  ('Món kho'),
-  ('Món ăn truyền thống'),
-  ('Món chay từ đậu hũ'),
-  ('Món chay từ rau củ'),
-  ('Lẩu chay'),
-  ('Cơm chay'),
-  ('Món chay giả mặn'),
-  ('Keto'),
-  ('Eat clean'),
-  ('Low-carb'),
-  ('Chế độ giảm cân'),
-  ('Món Tết'),
-  ('Món Trung thu'),
-  ('Món Giáng sinh'),
-  ('Món ăn ngày cưới'),
-  ('Món Ý'),
-  ('Món Pháp'),
-  ('Món Mỹ'),
-  ('Món Nhật'),
-  ('Món Hàn');
\ No newline at end of file
+-- Baseline schema. Idempotent so databases created before schema_version
+-- existed are adopted without changes.
+
+CREATE TABLE IF NOT EXISTS user (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    avatar_path TEXT,
+    role TEXT NOT NULL DEFAULT 'user',
+    is_blocked BOOLEAN NOT NULL DEFAULT 0,
+    gender TEXT,
+    birthdate DATE,
+    phone TEXT
+);
+
+CREATE TABLE IF NOT EXISTS post (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    author_id INTEGER NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    title TEXT NOT NULL,
+    description TEXT,
+    ingredients TEXT NOT NULL,
+    instructions TEXT NOT NULL,
+    cooking_time INTEGER DEFAULT 0,
+    servings INTEGER DEFAULT 1,
+    FOREIGN KEY (author_id) REFERENCES user (id)
+);
+
+CREATE TABLE IF NOT EXISTS blog_images (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id INTEGER NOT NULL,
+    image_path TEXT NOT NULL,
+    is_main_image BOOLEAN DEFAULT 0,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS comments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE,
+    FOREIGN KEY (author_id) REFERENCES user (id)
+);
+
+CREATE TABLE IF NOT EXISTS comment_replies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    comment_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (comment_id) REFERENCES comments (id) ON DELETE CASCADE,
+    FOREIGN KEY (author_id) REFERENCES user (id)
+);
+
+CREATE TABLE IF NOT EXISTS favorites (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES user (id) ON DELETE CASCADE,
+    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE,
+    UNIQUE(user_id, post_id)
+);
+
+CREATE TABLE IF NOT EXISTS comment_reactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    comment_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    reaction_type TEXT NOT NULL CHECK(reaction_type IN ('like', 'dislike')),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (comment_id) REFERENCES comments (id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES user (id),
+    UNIQUE(comment_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS saved_recipes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES user (id),
+    FOREIGN KEY (post_id) REFERENCES post (id)
+);
+
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS post_tags (
+    post_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (post_id, tag_id),
+    FOREIGN KEY (post_id) REFERENCES post (id) ON DELETE CASCADE,
+    FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE
+);
+
+-- Create indexes
+CREATE INDEX IF NOT EXISTS idx_post_author ON post(author_id);
+CREATE INDEX IF NOT EXISTS idx_blog_images_post ON blog_images(post_id);
+CREATE INDEX IF NOT EXISTS idx_post_tags_post ON post_tags(post_id);
+CREATE INDEX IF NOT EXISTS idx_post_tags_tag ON post_tags(tag_id);
+
+-- Insert default tags
+INSERT OR IGNORE INTO tags (name) VALUES
+  ('Món nước'),
+  ('Món cuốn'),
+  ('Món xào'),
+  ('Món kho'),
+  ('Món ăn truyền thống'),
+  ('Món chay từ đậu hũ'),
+  ('Món chay từ rau củ'),
+  ('Lẩu chay'),
+  ('Cơm chay'),
+  ('Món chay giả mặn'),
+  ('Keto'),
+  ('Eat clean'),
+  ('Low-carb'),
+  ('Chế độ giảm cân'),
+  ('Món Tết'),
+  ('Món Trung thu'),
+  ('Món Giáng sinh'),
+  ('Món ăn ngày cưới'),
+  ('Món Ý'),
+  ('Món Pháp'),
+  ('Món Mỹ'),
+  ('Món Nhật'),
+  ('Món Hàn');
@@ -0,0 +1,66 @@
+-- Denormalized counters kept in sync by triggers, replacing the correlated
+-- COUNT(*) subqueries on favorites and comment_reactions.
+-- `flask recount` recomputes them from scratch.
+
+ALTER TABLE post ADD COLUMN like_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE comments ADD COLUMN likes_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE comments ADD COLUMN dislikes_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE post SET like_count = (
+    SELECT COUNT(*) FROM favorites f WHERE f.post_id = post.id
+);
+UPDATE comments SET
+    likes_count = (
+        SELECT COUNT(*) FROM comment_reactions cr
+        WHERE cr.comment_id = comments.id AND cr.reaction_type = 'like'
+    ),
+    dislikes_count = (
+        SELECT COUNT(*) FROM comment_reactions cr
+        WHERE cr.comment_id = comments.id AND cr.reaction_type = 'dislike'
+    );
+
+CREATE TRIGGER IF NOT EXISTS trg_favorites_insert_count
+AFTER INSERT ON favorites
+BEGIN
+    UPDATE post SET like_count = like_count + 1 WHERE id = NEW.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_favorites_delete_count
+AFTER DELETE ON favorites
+BEGIN
+    UPDATE post SET like_count = like_count - 1 WHERE id = OLD.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_comment_reactions_insert_count
+AFTER INSERT ON comment_reactions
+BEGIN
+    UPDATE comments SET
+        likes_count = likes_count + (NEW.reaction_type = 'like'),
+        dislikes_count = dislikes_count + (NEW.reaction_type = 'dislike')
+    WHERE id = NEW.comment_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_comment_reactions_delete_count
+AFTER DELETE ON comment_reactions
+BEGIN
+    UPDATE comments SET
+        likes_count = likes_count - (OLD.reaction_type = 'like'),
+        dislikes_count = dislikes_count - (OLD.reaction_type = 'dislike')
+    WHERE id = OLD.comment_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_comment_reactions_update_count
+AFTER UPDATE OF reaction_type, comment_id ON comment_reactions
+BEGIN
+    UPDATE comments SET
+        likes_count = likes_count - (OLD.reaction_type = 'like'),
+        dislikes_count = dislikes_count - (OLD.reaction_type = 'dislike')
+    WHERE id = OLD.comment_id;
+    UPDATE comments SET
+        likes_count = likes_count + (NEW.reaction_type = 'like'),
+        dislikes_count = dislikes_count + (NEW.reaction_type = 'dislike')
+    WHERE id = NEW.comment_id;
+END;
+
+-- sort=likes
+CREATE INDEX IF NOT EXISTS idx_post_like_count ON post(like_count, created);
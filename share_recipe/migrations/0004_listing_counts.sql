@@ -0,0 +1,68 @@
+-- Trigger-maintained totals for paginated listings, so page views no longer
+-- run a COUNT(*) over post / post_tags / favorites / saved_recipes.
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+INSERT OR REPLACE INTO counters (name, value) SELECT 'posts', COUNT(*) FROM post;
+
+ALTER TABLE tags ADD COLUMN post_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE user ADD COLUMN favorite_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE user ADD COLUMN saved_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE tags SET post_count = (
+    SELECT COUNT(*) FROM post_tags pt WHERE pt.tag_id = tags.id
+);
+UPDATE user SET
+    favorite_count = (SELECT COUNT(*) FROM favorites f WHERE f.user_id = user.id),
+    saved_count = (SELECT COUNT(*) FROM saved_recipes sr WHERE sr.user_id = user.id);
+
+CREATE TRIGGER IF NOT EXISTS trg_post_insert_count
+AFTER INSERT ON post
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'posts';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_delete_count
+AFTER DELETE ON post
+BEGIN
+    UPDATE counters SET value = value - 1 WHERE name = 'posts';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_tags_insert_count
+AFTER INSERT ON post_tags
+BEGIN
+    UPDATE tags SET post_count = post_count + 1 WHERE id = NEW.tag_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_tags_delete_count
+AFTER DELETE ON post_tags
+BEGIN
+    UPDATE tags SET post_count = post_count - 1 WHERE id = OLD.tag_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_favorites_insert_user_count
+AFTER INSERT ON favorites
+BEGIN
+    UPDATE user SET favorite_count = favorite_count + 1 WHERE id = NEW.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_favorites_delete_user_count
+AFTER DELETE ON favorites
+BEGIN
+    UPDATE user SET favorite_count = favorite_count - 1 WHERE id = OLD.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_saved_recipes_insert_count
+AFTER INSERT ON saved_recipes
+BEGIN
+    UPDATE user SET saved_count = saved_count + 1 WHERE id = NEW.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_saved_recipes_delete_count
+AFTER DELETE ON saved_recipes
+BEGIN
+    UPDATE user SET saved_count = saved_count - 1 WHERE id = OLD.user_id;
+END;
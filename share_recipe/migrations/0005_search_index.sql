@@ -0,0 +1,78 @@
+-- FTS5 index over recipe text and tag names, kept in sync by triggers.
+-- rowid = post.id. `flask rebuild-search-index` repopulates it.
+
+CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(
+    title,
+    description,
+    ingredients,
+    instructions,
+    tags,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+DELETE FROM post_fts;
+INSERT INTO post_fts (rowid, title, description, ingredients, instructions, tags)
+SELECT p.id, p.title, coalesce(p.description, ''), p.ingredients, p.instructions,
+       coalesce((SELECT group_concat(t.name, ' ')
+                 FROM post_tags pt JOIN tags t ON t.id = pt.tag_id
+                 WHERE pt.post_id = p.id), '')
+FROM post p;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_fts_insert
+AFTER INSERT ON post
+BEGIN
+    INSERT INTO post_fts (rowid, title, description, ingredients, instructions, tags)
+    VALUES (NEW.id, NEW.title, coalesce(NEW.description, ''),
+            NEW.ingredients, NEW.instructions, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_fts_update
+AFTER UPDATE OF title, description, ingredients, instructions ON post
+BEGIN
+    UPDATE post_fts SET
+        title = NEW.title,
+        description = coalesce(NEW.description, ''),
+        ingredients = NEW.ingredients,
+        instructions = NEW.instructions
+    WHERE rowid = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_fts_delete
+AFTER DELETE ON post
+BEGIN
+    DELETE FROM post_fts WHERE rowid = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_tags_fts_insert
+AFTER INSERT ON post_tags
+BEGIN
+    UPDATE post_fts SET tags = coalesce((
+        SELECT group_concat(t.name, ' ')
+        FROM post_tags pt JOIN tags t ON t.id = pt.tag_id
+        WHERE pt.post_id = NEW.post_id
+    ), '')
+    WHERE rowid = NEW.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_tags_fts_delete
+AFTER DELETE ON post_tags
+BEGIN
+    UPDATE post_fts SET tags = coalesce((
+        SELECT group_concat(t.name, ' ')
+        FROM post_tags pt JOIN tags t ON t.id = pt.tag_id
+        WHERE pt.post_id = OLD.post_id
+    ), '')
+    WHERE rowid = OLD.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tags_fts_rename
+AFTER UPDATE OF name ON tags
+BEGIN
+    UPDATE post_fts SET tags = coalesce((
+        SELECT group_concat(t.name, ' ')
+        FROM post_tags pt JOIN tags t ON t.id = pt.tag_id
+        WHERE pt.post_id = post_fts.rowid
+    ), '')
+    WHERE rowid IN (SELECT post_id FROM post_tags WHERE tag_id = NEW.id);
+END;
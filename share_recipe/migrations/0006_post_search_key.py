@@ -0,0 +1,27 @@
+"""Add post.search_key, the accent-folded title, and backfill it.
+
+The folding is a frozen copy of ``recipe_search.fold_text`` as of this
+migration, so later changes to the app cannot alter what it writes;
+``flask rebuild-search-index`` recomputes the keys with the current code.
+"""
+import re
+import unicodedata
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _fold_text(text):
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFD', text.lower().replace('đ', 'd'))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(_TOKEN_RE.findall(text))
+
+
+def upgrade(db):
+    db.execute('ALTER TABLE post ADD COLUMN search_key TEXT')
+    rows = db.execute('SELECT id, title FROM post').fetchall()
+    db.executemany(
+        'UPDATE post SET search_key = ? WHERE id = ?',
+        [(_fold_text(title), post_id) for post_id, title in rows]
+    )
@@ -0,0 +1,45 @@
+-- Add post.search_key as a sixth post_fts column. FTS5 tables cannot be
+-- altered, so the table and its post triggers are recreated.
+
+DROP TRIGGER IF EXISTS trg_post_fts_insert;
+DROP TRIGGER IF EXISTS trg_post_fts_update;
+DROP TABLE IF EXISTS post_fts;
+
+CREATE VIRTUAL TABLE post_fts USING fts5(
+    title,
+    description,
+    ingredients,
+    instructions,
+    tags,
+    search_key,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+INSERT INTO post_fts (rowid, title, description, ingredients, instructions, tags, search_key)
+SELECT p.id, p.title, coalesce(p.description, ''), p.ingredients, p.instructions,
+       coalesce((SELECT group_concat(t.name, ' ')
+                 FROM post_tags pt JOIN tags t ON t.id = pt.tag_id
+                 WHERE pt.post_id = p.id), ''),
+       coalesce(p.search_key, '')
+FROM post p;
+
+CREATE TRIGGER trg_post_fts_insert
+AFTER INSERT ON post
+BEGIN
+    INSERT INTO post_fts (rowid, title, description, ingredients, instructions, tags, search_key)
+    VALUES (NEW.id, NEW.title, coalesce(NEW.description, ''),
+            NEW.ingredients, NEW.instructions, '', coalesce(NEW.search_key, ''));
+END;
+
+CREATE TRIGGER trg_post_fts_update
+AFTER UPDATE OF title, description, ingredients, instructions, search_key ON post
+BEGIN
+    UPDATE post_fts SET
+        title = NEW.title,
+        description = coalesce(NEW.description, ''),
+        ingredients = NEW.ingredients,
+        instructions = NEW.instructions,
+        search_key = coalesce(NEW.search_key, '')
+    WHERE rowid = NEW.id;
+END;
@@ -0,0 +1,99 @@
+"""Ingredient tables for the inverted index, backfilled from post.ingredients.
+
+The parser below is a frozen copy of ``ingredients.parse_ingredients`` as
+of this migration, so later changes to the app cannot alter what it
+writes; ``flask index-ingredients`` rebuilds the index with the current code.
+"""
+import re
+import unicodedata
+
+MAX_NAME_LENGTH = 40
+MAX_NAME_WORDS = 5
+
+_TOKEN_RE = re.compile(r'\w+')
+_BULLET_RE = re.compile(r'^[-*•+–]+\s*')
+_PARENS_RE = re.compile(r'\([^)]*\)?')
+_SEPARATOR_RE = re.compile(r'[,;&/+]|\s(?:và|hoặc|hay)\s', re.IGNORECASE)
+_UNITS = (
+    r'(?:muỗng canh|muỗng cà phê|muỗng|thìa canh|thìa cà phê|thìa|chén|bát|'
+    r'cây|củ|quả|trái|tép|miếng|nhánh|gói|bịch|lát|con|cái|hộp|lon|chai|'
+    r'kg|gram|gr|g|ml|lít|l)'
+)
+_AMOUNT = r'[\d.,/½¼¾]+(?:\s*-\s*[\d.,/]+)?\s*'
+_QUANTITY_RE = re.compile(rf'^{_AMOUNT}{_UNITS}?\b\s*', re.IGNORECASE)
+_TRAILING_QUANTITY_RE = re.compile(rf'\s+{_AMOUNT}{_UNITS}?$', re.IGNORECASE)
+_AMOUNT_WORDS = ('du dung', 'vua du', 'tuy thich', 'tuy khau vi', 'it')
+_STOP_KEYS = {'nguyen lieu', 'nguyen lieu chinh', 'gia vi', 'cac loai gia vi', 'khac'}
+
+
+def _fold_text(text):
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFD', text.lower().replace('đ', 'd'))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(_TOKEN_RE.findall(text))
+
+
+def _clean(part):
+    part = _QUANTITY_RE.sub('', part.strip())
+    part = _TRAILING_QUANTITY_RE.sub('', part)
+    return part.strip(' .…:-').strip()
+
+
+def _line_parts(line):
+    line = _PARENS_RE.sub('', _BULLET_RE.sub('', line.strip()))
+    if ':' in line:
+        label, rest = (s.strip() for s in line.split(':', 1))
+        folded_rest = _fold_text(rest)
+        if not rest or _fold_text(label).startswith('nguyen lieu'):
+            line = rest
+        elif any(ch.isdigit() for ch in rest) or folded_rest in _AMOUNT_WORDS:
+            line = label
+        else:
+            line = rest
+    return _SEPARATOR_RE.split(line)
+
+
+def _parse_ingredients(text):
+    found = {}
+    for line in unicodedata.normalize('NFC', text or '').splitlines():
+        for part in _line_parts(line):
+            name = _clean(part)
+            key = _fold_text(name)
+            if (not key or key in _STOP_KEYS or key.isdigit()
+                    or len(key) > MAX_NAME_LENGTH or key.count(' ') >= MAX_NAME_WORDS):
+                continue
+            found.setdefault(key, name.lower())
+    return list(found.items())
+
+
+def upgrade(db):
+    db.execute(
+        'CREATE TABLE IF NOT EXISTS ingredient ('
+        ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+        ' key TEXT NOT NULL,'
+        ' name TEXT NOT NULL'
+        ')'
+    )
+    db.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_ingredient_key ON ingredient(key)')
+    db.execute(
+        'CREATE TABLE IF NOT EXISTS post_ingredient ('
+        ' ingredient_id INTEGER NOT NULL REFERENCES ingredient (id),'
+        ' post_id INTEGER NOT NULL REFERENCES post (id) ON DELETE CASCADE,'
+        ' PRIMARY KEY (ingredient_id, post_id)'
+        ') WITHOUT ROWID'
+    )
+    db.execute(
+        'CREATE INDEX IF NOT EXISTS idx_post_ingredient_post '
+        'ON post_ingredient(post_id, ingredient_id)'
+    )
+    for post_id, text in db.execute('SELECT id, ingredients FROM post').fetchall():
+        parsed = _parse_ingredients(text)
+        if not parsed:
+            continue
+        db.executemany('INSERT OR IGNORE INTO ingredient (key, name) VALUES (?, ?)', parsed)
+        db.executemany(
+            'INSERT OR IGNORE INTO post_ingredient (ingredient_id, post_id) '
+            'SELECT id, ? FROM ingredient WHERE key = ?',
+            [(post_id, key) for key, _ in parsed]
+        )
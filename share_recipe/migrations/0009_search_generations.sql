@@ -0,0 +1,73 @@
+-- Generation counters for the search result cache. Any write that can change
+-- a search result bumps 'search_generation'; favorites only affect sort=likes
+-- and bump 'likes_generation'. Cached entries are keyed by the generation, so
+-- a bump invalidates them in every worker process at once.
+
+INSERT OR IGNORE INTO counters (name, value) VALUES ('search_generation', 0);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('likes_generation', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_post_insert_search_generation
+AFTER INSERT ON post
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'search_generation';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_update_search_generation
+AFTER UPDATE OF title, description, ingredients, instructions, cooking_time, servings, search_key ON post
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'search_generation';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_delete_search_generation
+AFTER DELETE ON post
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'search_generation';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_tags_insert_search_generation
+AFTER INSERT ON post_tags
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'search_generation';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_tags_delete_search_generation
+AFTER DELETE ON post_tags
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'search_generation';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blog_images_insert_search_generation
+AFTER INSERT ON blog_images
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'search_generation';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blog_images_update_search_generation
+AFTER UPDATE ON blog_images
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'search_generation';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blog_images_delete_search_generation
+AFTER DELETE ON blog_images
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'search_generation';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_rename_search_generation
+AFTER UPDATE OF username ON user
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'search_generation';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_favorites_insert_likes_generation
+AFTER INSERT ON favorites
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'likes_generation';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_favorites_delete_likes_generation
+AFTER DELETE ON favorites
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'likes_generation';
+END;
@@ -0,0 +1,20 @@
+-- Trigger-maintained reply count per comment, so collapsed threads can show
+-- "N replies" without loading or counting the replies.
+
+ALTER TABLE comments ADD COLUMN reply_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE comments SET reply_count = (
+    SELECT COUNT(*) FROM comment_replies r WHERE r.comment_id = comments.id
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_comment_replies_insert_count
+AFTER INSERT ON comment_replies
+BEGIN
+    UPDATE comments SET reply_count = reply_count + 1 WHERE id = NEW.comment_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_comment_replies_delete_count
+AFTER DELETE ON comment_replies
+BEGIN
+    UPDATE comments SET reply_count = reply_count - 1 WHERE id = OLD.comment_id;
+END;
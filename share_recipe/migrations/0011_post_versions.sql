@@ -0,0 +1,184 @@
+-- Change tracking for HTTP conditional GET.
+-- post.version / post.modified change whenever anything shown on the recipe
+-- page changes: the post itself, its tags and images, its comments (content,
+-- reactions, reply counts), likes, saves, and the names/avatars shown next
+-- to it. 'listing_generation' / 'listing_modified' (unix time) in counters
+-- change whenever a listing card (home page, categories) can change.
+
+ALTER TABLE post ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE post ADD COLUMN modified TIMESTAMP;
+UPDATE post SET modified = created;
+
+INSERT OR IGNORE INTO counters (name, value) VALUES ('listing_generation', 0);
+INSERT OR IGNORE INTO counters (name, value)
+VALUES ('listing_modified', CAST(strftime('%s', 'now') AS INTEGER));
+
+-- Post versions
+
+CREATE TRIGGER IF NOT EXISTS trg_post_insert_modified
+AFTER INSERT ON post
+BEGIN
+    UPDATE post SET modified = NEW.created WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_update_version
+AFTER UPDATE OF title, description, ingredients, instructions, cooking_time, servings,
+                like_count ON post
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_tags_insert_version
+AFTER INSERT ON post_tags
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP WHERE id = NEW.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_tags_delete_version
+AFTER DELETE ON post_tags
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP WHERE id = OLD.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blog_images_insert_version
+AFTER INSERT ON blog_images
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP WHERE id = NEW.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blog_images_update_version
+AFTER UPDATE ON blog_images
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP
+    WHERE id IN (OLD.post_id, NEW.post_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blog_images_delete_version
+AFTER DELETE ON blog_images
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP WHERE id = OLD.post_id;
+END;
+
+-- Reactions and replies update the comment's counters, so the comment
+-- update trigger covers them as well.
+CREATE TRIGGER IF NOT EXISTS trg_comments_insert_version
+AFTER INSERT ON comments
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP WHERE id = NEW.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_comments_update_version
+AFTER UPDATE ON comments
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP WHERE id = NEW.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_comments_delete_version
+AFTER DELETE ON comments
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP WHERE id = OLD.post_id;
+END;
+
+-- Lưu công thức không đổi số đếm nào nhưng đổi nút "Đã lưu" của người xem
+CREATE TRIGGER IF NOT EXISTS trg_saved_recipes_insert_version
+AFTER INSERT ON saved_recipes
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP WHERE id = NEW.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_saved_recipes_delete_version
+AFTER DELETE ON saved_recipes
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP WHERE id = OLD.post_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_profile_version
+AFTER UPDATE OF username, avatar_path ON user
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP
+    WHERE author_id = NEW.id
+       OR id IN (SELECT post_id FROM comments WHERE author_id = NEW.id);
+END;
+
+-- Listing generation
+
+CREATE TRIGGER IF NOT EXISTS trg_post_insert_listing_generation
+AFTER INSERT ON post
+BEGIN
+    UPDATE counters SET value = CASE name
+        WHEN 'listing_generation' THEN value + 1
+        ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+    WHERE name IN ('listing_generation', 'listing_modified');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_update_listing_generation
+AFTER UPDATE OF title, created, author_id, like_count ON post
+BEGIN
+    UPDATE counters SET value = CASE name
+        WHEN 'listing_generation' THEN value + 1
+        ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+    WHERE name IN ('listing_generation', 'listing_modified');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_delete_listing_generation
+AFTER DELETE ON post
+BEGIN
+    UPDATE counters SET value = CASE name
+        WHEN 'listing_generation' THEN value + 1
+        ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+    WHERE name IN ('listing_generation', 'listing_modified');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_tags_insert_listing_generation
+AFTER INSERT ON post_tags
+BEGIN
+    UPDATE counters SET value = CASE name
+        WHEN 'listing_generation' THEN value + 1
+        ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+    WHERE name IN ('listing_generation', 'listing_modified');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_post_tags_delete_listing_generation
+AFTER DELETE ON post_tags
+BEGIN
+    UPDATE counters SET value = CASE name
+        WHEN 'listing_generation' THEN value + 1
+        ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+    WHERE name IN ('listing_generation', 'listing_modified');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blog_images_insert_listing_generation
+AFTER INSERT ON blog_images
+BEGIN
+    UPDATE counters SET value = CASE name
+        WHEN 'listing_generation' THEN value + 1
+        ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+    WHERE name IN ('listing_generation', 'listing_modified');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blog_images_update_listing_generation
+AFTER UPDATE ON blog_images
+BEGIN
+    UPDATE counters SET value = CASE name
+        WHEN 'listing_generation' THEN value + 1
+        ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+    WHERE name IN ('listing_generation', 'listing_modified');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blog_images_delete_listing_generation
+AFTER DELETE ON blog_images
+BEGIN
+    UPDATE counters SET value = CASE name
+        WHEN 'listing_generation' THEN value + 1
+        ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+    WHERE name IN ('listing_generation', 'listing_modified');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_rename_listing_generation
+AFTER UPDATE OF username ON user
+BEGIN
+    UPDATE counters SET value = CASE name
+        WHEN 'listing_generation' THEN value + 1
+        ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+    WHERE name IN ('listing_generation', 'listing_modified');
+END;
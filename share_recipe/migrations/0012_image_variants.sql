@@ -0,0 +1,18 @@
+-- Resized WebP derivatives of uploaded images (see share_recipe/images.py).
+-- blog_images.width/height are the original's dimensions; variants and
+-- user.avatar_variants hold JSON {"card": [{"path", "width", "height"}, ...]}
+-- and stay NULL until the image has been processed.
+
+ALTER TABLE blog_images ADD COLUMN width INTEGER;
+ALTER TABLE blog_images ADD COLUMN height INTEGER;
+ALTER TABLE blog_images ADD COLUMN variants TEXT;
+ALTER TABLE user ADD COLUMN avatar_variants TEXT;
+
+-- Ảnh đại diện mới (kể cả khi chỉ bổ sung variants) phải làm mới các trang có hiển thị nó
+CREATE TRIGGER IF NOT EXISTS trg_user_avatar_variants_version
+AFTER UPDATE OF avatar_variants ON user
+BEGIN
+    UPDATE post SET version = version + 1, modified = CURRENT_TIMESTAMP
+    WHERE author_id = NEW.id
+       OR id IN (SELECT post_id FROM comments WHERE author_id = NEW.id);
+END;
@@ -0,0 +1,84 @@
+-- Reference counts for uploaded files (see share_recipe/storage.py).
+-- One row per static path used by blog_images.image_path or user.avatar_path,
+-- with the number of rows pointing at it. Content-addressed uploads share a
+-- path when the bytes are identical; a file may be unlinked only once its
+-- row is gone.
+
+CREATE TABLE IF NOT EXISTS blobs (
+    path TEXT PRIMARY KEY,
+    refcount INTEGER NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
+INSERT INTO blobs (path, refcount)
+SELECT path, COUNT(*) FROM (
+    SELECT image_path AS path FROM blog_images
+    UNION ALL
+    SELECT avatar_path FROM user WHERE avatar_path IS NOT NULL AND avatar_path != ''
+)
+GROUP BY path;
+
+-- Tìm variants đã tạo cho cùng một blob
+CREATE INDEX IF NOT EXISTS idx_blog_images_path ON blog_images(image_path);
+
+-- blog_images
+
+CREATE TRIGGER IF NOT EXISTS trg_blog_images_insert_blob
+AFTER INSERT ON blog_images
+BEGIN
+    INSERT INTO blobs (path, refcount) VALUES (NEW.image_path, 1)
+    ON CONFLICT (path) DO UPDATE SET refcount = refcount + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blog_images_update_blob
+AFTER UPDATE OF image_path ON blog_images
+WHEN OLD.image_path IS NOT NEW.image_path
+BEGIN
+    INSERT INTO blobs (path, refcount) VALUES (NEW.image_path, 1)
+    ON CONFLICT (path) DO UPDATE SET refcount = refcount + 1;
+    UPDATE blobs SET refcount = refcount - 1 WHERE path = OLD.image_path;
+    DELETE FROM blobs WHERE path = OLD.image_path AND refcount <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blog_images_delete_blob
+AFTER DELETE ON blog_images
+BEGIN
+    UPDATE blobs SET refcount = refcount - 1 WHERE path = OLD.image_path;
+    DELETE FROM blobs WHERE path = OLD.image_path AND refcount <= 0;
+END;
+
+-- user.avatar_path ('' nghĩa là không có avatar)
+
+CREATE TRIGGER IF NOT EXISTS trg_user_insert_blob
+AFTER INSERT ON user
+WHEN NEW.avatar_path IS NOT NULL AND NEW.avatar_path != ''
+BEGIN
+    INSERT INTO blobs (path, refcount) VALUES (NEW.avatar_path, 1)
+    ON CONFLICT (path) DO UPDATE SET refcount = refcount + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_avatar_add_blob
+AFTER UPDATE OF avatar_path ON user
+WHEN OLD.avatar_path IS NOT NEW.avatar_path
+ AND NEW.avatar_path IS NOT NULL AND NEW.avatar_path != ''
+BEGIN
+    INSERT INTO blobs (path, refcount) VALUES (NEW.avatar_path, 1)
+    ON CONFLICT (path) DO UPDATE SET refcount = refcount + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_avatar_release_blob
+AFTER UPDATE OF avatar_path ON user
+WHEN OLD.avatar_path IS NOT NEW.avatar_path
+ AND OLD.avatar_path IS NOT NULL AND OLD.avatar_path != ''
+BEGIN
+    UPDATE blobs SET refcount = refcount - 1 WHERE path = OLD.avatar_path;
+    DELETE FROM blobs WHERE path = OLD.avatar_path AND refcount <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_delete_blob
+AFTER DELETE ON user
+WHEN OLD.avatar_path IS NOT NULL AND OLD.avatar_path != ''
+BEGIN
+    UPDATE blobs SET refcount = refcount - 1 WHERE path = OLD.avatar_path;
+    DELETE FROM blobs WHERE path = OLD.avatar_path AND refcount <= 0;
+END;
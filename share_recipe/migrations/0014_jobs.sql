@@ -0,0 +1,19 @@
+-- Durable background jobs (see share_recipe/jobs.py). A job is deleted when
+-- it succeeds; failed jobs are kept with their last error.
+-- status: 'queued' (waiting for run_at), 'running' (claimed until locked_until),
+-- 'failed' (gave up after max_attempts). Times are unix seconds.
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_at REAL NOT NULL,
+    locked_until REAL,
+    last_error TEXT,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs(status, run_at);
@@ -0,0 +1,19 @@
+-- 'user_generation' changes whenever a user is blocked or unblocked, changes
+-- role or is deleted. Every process compares it with the value stored next
+-- to its cached user rows (auth.load_user), so such a change applies to the
+-- next request everywhere instead of after USER_CACHE_TTL.
+
+INSERT OR IGNORE INTO counters (name, value) VALUES ('user_generation', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_user_access_generation
+AFTER UPDATE OF is_blocked, role ON user
+WHEN OLD.is_blocked IS NOT NEW.is_blocked OR OLD.role IS NOT NEW.role
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'user_generation';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_delete_generation
+AFTER DELETE ON user
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'user_generation';
+END;
@@ -0,0 +1,18 @@
+-- Trigger-maintained number of users, like 'posts' (migration 0004). The
+-- admin dashboard reads it instead of COUNT(*) and uses it, together with
+-- 'listing_generation' and 'user_generation', as its cache key, so every
+-- process sees new and deleted users without relying on invalidation.
+
+INSERT OR REPLACE INTO counters (name, value) SELECT 'users', COUNT(*) FROM user;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_insert_count
+AFTER INSERT ON user
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'users';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_delete_count
+AFTER DELETE ON user
+BEGIN
+    UPDATE counters SET value = value - 1 WHERE name = 'users';
+END;
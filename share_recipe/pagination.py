@@ -0,0 +1,119 @@
+"""Keyset (cursor) pagination for newest-first listings.
+
+Listings are ordered by ``(sort column, id column)`` descending. Instead of
+``OFFSET``, the next/previous links carry an opaque cursor holding the key
+of the last/first row shown, so every page costs the same index seek no
+matter how deep it is. Plain page numbers still work and fall back to
+``OFFSET`` for direct jumps.
+"""
+import base64
+import binascii
+import json
+import math
+from datetime import datetime
+
+
+def encode_cursor(direction, sort_value, row_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat(sep=' ')
+    payload = json.dumps([direction, sort_value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+# Giới hạn của SQLite INTEGER (signed 64-bit)
+SQLITE_INT_MIN = -2 ** 63
+SQLITE_INT_MAX = 2 ** 63 - 1
+
+
+def _is_key_value(value, types):
+    """Whether ``value`` can be bound as a cursor key: one of ``types``, no bool,
+    ints within SQLite's 64-bit range, finite floats."""
+    if not isinstance(value, types) or isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return SQLITE_INT_MIN <= value <= SQLITE_INT_MAX
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return True
+
+
+def decode_cursor(token):
+    """Return ``(direction, sort_value, row_id)`` or None if ``token`` is invalid."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if direction not in ('next', 'prev') or not _is_key_value(row_id, (int,)):
+        return None
+    # sort_value được bind thẳng vào SQL: cursor bị sửa (list, dict...) không được gây lỗi 500
+    if not _is_key_value(sort_value, (str, int, float)):
+        return None
+    return direction, sort_value, row_id
+
+
+class Page:
+    def __init__(self, items, page, total, per_page, next_cursor, prev_cursor):
+        self.items = items
+        self.page = page
+        self.total = total
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def total_pages(self):
+        return (self.total + self.per_page - 1) // self.per_page
+
+
+def paginate(db, select, conditions, params, sort_column, id_column,
+             per_page, page=1, cursor=None, total=0):
+    """Fetch one newest-first page of ``select``.
+
+    ``select`` is a query without WHERE/ORDER BY/LIMIT whose rows expose
+    ``cursor_sort`` and ``cursor_id`` columns (the values of ``sort_column``
+    and ``id_column``). ``conditions`` are ANDed into the WHERE clause.
+    """
+    conditions = list(conditions)
+    params = list(params)
+    key = decode_cursor(cursor)
+    direction = key[0] if key else 'next'
+
+    if key:
+        op = '<' if direction == 'next' else '>'
+        conditions.append(f'({sort_column}, {id_column}) {op} (?, ?)')
+        params.extend(key[1:])
+
+    order = 'DESC' if direction == 'next' else 'ASC'
+    sql = select
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += f' ORDER BY {sort_column} {order}, {id_column} {order} LIMIT ?'
+    params.append(per_page + 1)
+    if not key:
+        sql += ' OFFSET ?'
+        params.append(max(page - 1, 0) * per_page)
+
+    rows = db.execute(sql, params).fetchall()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    if key is None:
+        has_next, has_prev = has_more, page > 1
+    elif direction == 'next':
+        has_next, has_prev = has_more, True
+    else:
+        has_next, has_prev = True, has_more
+
+    next_cursor = prev_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor('next', rows[-1]['cursor_sort'], rows[-1]['cursor_id'])
+    if rows and has_prev:
+        prev_cursor = encode_cursor('prev', rows[0]['cursor_sort'], rows[0]['cursor_id'])
+
+    return Page([dict(row) for row in rows], page, total, per_page,
+                next_cursor, prev_cursor)
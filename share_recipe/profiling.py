@@ -0,0 +1,180 @@
+"""Per-request SQL instrumentation.
+
+``get_db`` wraps pooled connections in :class:`InstrumentedConnection`, which
+records the normalized SQL, duration (execute + fetch) and row count of
+every statement in ``g.sql_stats``. At the end of the request statements
+slower than ``SQL_SLOW_QUERY_MS`` are logged, repeated statement shapes
+(N+1 patterns) are flagged, and, when ``SQL_DEBUG_HEADERS`` is on (or the
+app runs in debug mode), totals are exposed in response headers.
+"""
+import re
+import time
+from collections import Counter
+
+from flask import current_app, g
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Reduce a statement to its shape: literals become ``?``."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(?, ...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class QueryRecord:
+    __slots__ = ('sql', 'duration', 'rows')
+
+    def __init__(self, sql, duration, rows):
+        self.sql = sql
+        self.duration = duration
+        self.rows = rows
+
+
+class QueryStats:
+    """Statements executed during one app context."""
+
+    def __init__(self):
+        self.records = []
+        self.shapes = Counter()
+
+    def record(self, sql, duration, rows):
+        record = QueryRecord(normalize_sql(sql), duration, rows)
+        self.records.append(record)
+        self.shapes[record.sql] += 1
+        return record
+
+    @property
+    def count(self):
+        return len(self.records)
+
+    @property
+    def total_time(self):
+        return sum(record.duration for record in self.records)
+
+    def slow(self, threshold):
+        return [record for record in self.records if record.duration >= threshold]
+
+    def repeated(self, threshold):
+        """Statement shapes executed at least ``threshold`` times."""
+        return [(sql, n) for sql, n in self.shapes.most_common() if n >= threshold]
+
+
+def get_stats():
+    if 'sql_stats' not in g:
+        g.sql_stats = QueryStats()
+    return g.sql_stats
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, record):
+        self._cursor = cursor
+        self._record = record
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        self._record.duration += time.perf_counter() - started
+        return result
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None:
+            self._record.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._timed(self._cursor.fetchmany, *args)
+        self._record.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._record.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Proxy around a ``sqlite3.Connection`` that records every statement."""
+
+    def __init__(self, connection, stats):
+        self.connection = connection
+        self.stats = stats
+
+    def _run(self, method, sql, *args):
+        started = time.perf_counter()
+        cursor = method(sql, *args)
+        elapsed = time.perf_counter() - started
+        rows = cursor.rowcount if cursor.rowcount > 0 else 0
+        return InstrumentedCursor(cursor, self.stats.record(sql, elapsed, rows))
+
+    def execute(self, sql, parameters=()):
+        return self._run(self.connection.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(self.connection.executemany, sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self._run(self.connection.executescript, script)
+
+    def __enter__(self):
+        self.connection.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.connection.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+def unwrap(connection):
+    return getattr(connection, 'connection', connection)
+
+
+def _report(response):
+    stats = g.get('sql_stats')
+    if stats is None or not stats.count:
+        return response
+
+    config = current_app.config
+    logger = current_app.logger
+    slow_threshold = config['SQL_SLOW_QUERY_MS'] / 1000
+    for record in stats.slow(slow_threshold):
+        logger.warning(
+            'Slow query (%.1f ms, %d rows): %s',
+            record.duration * 1000, record.rows, record.sql
+        )
+
+    repeated = stats.repeated(config['SQL_N_PLUS_ONE_THRESHOLD'])
+    for sql, n in repeated:
+        logger.warning('Possible N+1: %d x %s', n, sql)
+
+    if config['SQL_DEBUG_HEADERS'] or current_app.debug:
+        total_ms = stats.total_time * 1000
+        response.headers['X-SQL-Queries'] = str(stats.count)
+        response.headers['X-SQL-Time-Ms'] = f'{total_ms:.2f}'
+        response.headers['X-SQL-N-Plus-One'] = str(len(repeated))
+        response.headers.add(
+            'Server-Timing', f'sql;dur={total_ms:.2f};desc="{stats.count} queries"'
+        )
+    return response
+
+
+def init_app(app):
+    app.after_request(_report)
@@ -0,0 +1,110 @@
+"""Planner checks for the hot queries.
+
+Each entry pairs a query shaped like one a view runs with the index the
+planner is expected to use for it. ``flask check-indexes`` runs EXPLAIN
+QUERY PLAN for every entry and fails when the index is not used, or when
+the query needs a temp B-tree sort it should not.
+"""
+import click
+
+from share_recipe.db import get_db
+
+# (name, expected index, sql, params, may sort in a temp B-tree)
+HOT_QUERIES = [
+    ('blog.index: newest posts', 'idx_post_created',
+     'SELECT p.id, p.title, p.created FROM post p '
+     'ORDER BY p.created DESC LIMIT 9', (), False),
+    ('blog.index: keyset page', 'idx_post_created',
+     'SELECT p.id FROM post p WHERE (p.created, p.id) < (?, ?) '
+     'ORDER BY p.created DESC, p.id DESC LIMIT 10',
+     ('2025-01-01 00:00:00', 1), False),
+    ('listing: main image', 'idx_blog_images_main',
+     'SELECT p.id, bi.image_path FROM post p '
+     'LEFT JOIN blog_images bi ON p.id = bi.post_id AND bi.is_main_image = 1 '
+     'ORDER BY p.created DESC LIMIT 9', (), False),
+    ('sort=likes', 'idx_post_like_count',
+     'SELECT p.id FROM post p ORDER BY p.like_count DESC, p.created DESC LIMIT 9',
+     (), False),
+    ('recount: likes per post', 'idx_favorites_post',
+     'SELECT COUNT(*) FROM favorites f WHERE f.post_id = ?', (1,), False),
+    ('blog.detail: comment page', 'idx_comments_post_created',
+     'SELECT c.id FROM comments c WHERE c.post_id = ? '
+     'AND (c.created, c.id) < (?, ?) '
+     'ORDER BY c.created DESC, c.id DESC LIMIT 21',
+     (1, '2025-01-01 00:00:00', 1), False),
+    ('blog.comment_replies', 'idx_comment_replies_comment_created',
+     'SELECT r.id FROM comment_replies r WHERE r.comment_id = ? '
+     'AND (r.created, r.id) > (?, ?) ORDER BY r.created, r.id LIMIT 21',
+     (1, '2025-01-01 00:00:00', 1), False),
+    ('comments: user reactions', 'sqlite_autoindex_comment_reactions_1',
+     'SELECT comment_id, reaction_type FROM comment_reactions '
+     'WHERE user_id = ? AND comment_id IN (?, ?)', (1, 1, 2), False),
+    ('recount: reactions per comment', 'idx_comment_reactions_comment_type',
+     'SELECT COUNT(DISTINCT user_id) FROM comment_reactions '
+     'WHERE comment_id = ? AND reaction_type = ?', (1, 'like'), False),
+    ('blog.favorites', 'idx_favorites_user_created',
+     'SELECT f.post_id FROM favorites f WHERE f.user_id = ? '
+     'AND (f.created_at, f.post_id) < (?, ?) '
+     'ORDER BY f.created_at DESC, f.post_id DESC LIMIT 10',
+     (1, '2025-01-01 00:00:00', 1), False),
+    ('blog.saved_recipes', 'idx_saved_recipes_user_created',
+     'SELECT sr.post_id FROM saved_recipes sr WHERE sr.user_id = ? '
+     'AND (sr.created, sr.post_id) < (?, ?) '
+     'ORDER BY sr.created DESC, sr.post_id DESC LIMIT 10',
+     (1, '2025-01-01 00:00:00', 1), False),
+    ('blog.toggle_save', 'idx_saved_recipes_user_post',
+     'SELECT 1 FROM saved_recipes WHERE user_id = ? AND post_id = ?',
+     (1, 1), False),
+    ('blog.category', 'idx_post_tags_tag_post',
+     'SELECT p.id FROM post p JOIN post_tags pt ON p.id = pt.post_id '
+     'JOIN tags t ON pt.tag_id = t.id WHERE t.name = ? '
+     'ORDER BY p.created DESC LIMIT 9', ('Món nước',), True),
+    ('auth.profile', 'idx_post_author_created',
+     'SELECT p.id FROM post p WHERE p.author_id = ? ORDER BY p.created DESC',
+     (1,), False),
+    ('search: ingredient range', 'idx_ingredient_key',
+     'SELECT i.id FROM ingredient i WHERE i.key >= ? AND i.key < ?',
+     ('nam', 'nam!'), False),
+    ('search: ingredients per post', 'idx_post_ingredient_post',
+     'SELECT COUNT(*) FROM post_ingredient x WHERE x.post_id = ?', (1,), False),
+    ('jobs: claim next due job', 'idx_jobs_status_run_at',
+     "SELECT id FROM jobs WHERE status = 'queued' AND run_at <= ? "
+     'ORDER BY run_at, id LIMIT 1', (0,), False),
+]
+
+
+def explain(db, sql, params=()):
+    return [row['detail'] for row in db.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def check_query_plans(db, queries=HOT_QUERIES):
+    """Return ``(name, index, ok, plan)`` for every hot query."""
+    results = []
+    for name, index, sql, params, may_sort in queries:
+        plan = explain(db, sql, params)
+        uses_index = any(
+            f'INDEX {index} ' in detail or detail.endswith(f'INDEX {index}')
+            for detail in plan
+        )
+        sorts = any('USE TEMP B-TREE FOR ORDER BY' in detail for detail in plan)
+        results.append((name, index, uses_index and (may_sort or not sorts), plan))
+    return results
+
+
+@click.command('check-indexes')
+@click.option('--verbose', '-v', is_flag=True, help='Print every query plan.')
+def check_indexes_command(verbose):
+    """Verify the planner uses the expected index for each hot query."""
+    failed = 0
+    for name, index, ok, plan in check_query_plans(get_db()):
+        click.echo(f"{'ok  ' if ok else 'FAIL'} {name} -> {index}")
+        if verbose or not ok:
+            for detail in plan:
+                click.echo(f'       {detail}')
+        failed += not ok
+    if failed:
+        raise click.ClickException(f'{failed} hot queries do not use their index.')
+
+
+def init_app(app):
+    app.cli.add_command(check_indexes_command)
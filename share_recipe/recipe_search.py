@@ -0,0 +1,288 @@
+"""Full-text recipe search backed by the ``post_fts`` FTS5 index.
+
+The index covers title, description, ingredients, instructions, tag names
+and ``post.search_key`` and is kept in sync by triggers. Queries are
+accent-folded and turned into prefix terms (``"bun"* "bo"*``), ranked with
+BM25 and returned with a highlighted snippet.
+
+``search_key`` is the accent-folded title computed at write time by
+:func:`fold_text`. The FTS5 ``unicode61`` tokenizer already ignores most
+diacritics but keeps ``đ`` distinct from ``d``; the folded column is what
+lets "dau hu" find "Đậu hũ".
+"""
+import re
+import unicodedata
+
+import click
+from markupsafe import Markup, escape
+
+from share_recipe.db import get_db
+
+# BM25 weights for title, description, ingredients, instructions, tags, search_key
+BM25_WEIGHTS = (10.0, 4.0, 2.0, 1.0, 5.0, 8.0)
+SORTS = ('relevance', 'newest', 'likes')
+
+# Facet buckets: (key, label, low, high) with low <= value < high
+TIME_BUCKETS = (
+    ('under-15', 'Dưới 15 phút', 1, 15),
+    ('15-30', '15–30 phút', 15, 31),
+    ('30-60', '30–60 phút', 31, 61),
+    ('over-60', 'Trên 60 phút', 61, None),
+)
+SERVINGS_BUCKETS = (
+    ('1-2', '1–2 người', 1, 3),
+    ('3-4', '3–4 người', 3, 5),
+    ('5+', 'Từ 5 người', 5, None),
+)
+
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+_TOKEN_RE = re.compile(r'\w+')
+
+POST_COLUMNS = (
+    'p.id, p.title, p.description, p.created, p.author_id, '
+    'u.username, bi.image_path, bi.variants AS image_variants, p.like_count, p.search_key, '
+    '(SELECT group_concat(t.name, \', \') FROM post_tags pt '
+    ' JOIN tags t ON t.id = pt.tag_id WHERE pt.post_id = p.id) AS tag'
+)
+POST_JOINS = (
+    'JOIN user u ON p.author_id = u.id '
+    'LEFT JOIN blog_images bi ON p.id = bi.post_id AND bi.is_main_image = 1'
+)
+TAG_FILTER = (
+    'EXISTS (SELECT 1 FROM post_tags pt JOIN tags t ON t.id = pt.tag_id '
+    'WHERE pt.post_id = p.id AND t.name = ?)'
+)
+
+
+def fold_text(text):
+    """Lowercase, strip Vietnamese diacritics (đ included) and punctuation.
+
+    >>> fold_text('Phở bò Nam Định!')
+    'pho bo nam dinh'
+    """
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFD', text.lower().replace('đ', 'd'))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(_TOKEN_RE.findall(text))
+
+
+def match_expression(query, column=None):
+    """Build an FTS5 MATCH expression: every word is a required prefix term.
+
+    The tokenizer folds every accent except ``đ``, so a word containing it
+    also matches its folded form in ``search_key`` ("đậu" finds "Đậu" but
+    not "dầu"). With ``column`` the folded terms must match that column.
+    """
+    words = _TOKEN_RE.findall(unicodedata.normalize('NFC', query.lower()))
+    if not words:
+        return None
+    if column:
+        terms = ' '.join(f'"{fold_text(word)}"*' for word in words)
+        return f'{column} : ({terms})'
+    terms = []
+    for word in words:
+        if 'đ' in word:
+            terms.append(f'("{word}"* OR search_key : "{fold_text(word)}"*)')
+        else:
+            terms.append(f'"{word}"*')
+    return ' '.join(terms)
+
+
+def _bucket_range(column, buckets, key):
+    """SQL condition and params selecting ``column`` values in bucket ``key``."""
+    for bucket_key, _, low, high in buckets:
+        if bucket_key == key:
+            if high is None:
+                return f'{column} >= ?', [low]
+            return f'{column} >= ? AND {column} < ?', [low, high]
+    return None, []
+
+
+def _bucket_case(column, buckets):
+    whens = []
+    for key, _, low, high in buckets:
+        condition = f'{column} >= {low:d}'
+        if high is not None:
+            condition += f' AND {column} < {high:d}'
+        whens.append(f"WHEN {condition} THEN '{key}'")
+    return f"CASE {' '.join(whens)} END"
+
+
+def highlight(snippet):
+    """Escape an FTS snippet and turn its match markers into <mark> tags."""
+    if not snippet:
+        return None
+    html = str(escape(snippet))
+    html = html.replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>')
+    return Markup(html)
+
+
+def search_posts(db, query='', tag='', sort='relevance', time_bucket='', servings_bucket='',
+                 limit=None, offset=0):
+    """Return posts matching ``query`` and the filters as a list of dicts."""
+    match = match_expression(query) if query else None
+    conditions = []
+    params = []
+
+    if match:
+        weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+        sql = (
+            f'SELECT {POST_COLUMNS}, '
+            f"snippet(post_fts, -1, ?, ?, '…', 16) AS snippet, "
+            f'bm25(post_fts, {weights}) AS rank '
+            f'FROM post_fts JOIN post p ON p.id = post_fts.rowid {POST_JOINS}'
+        )
+        params.extend([_HIGHLIGHT_START, _HIGHLIGHT_END])
+        conditions.append('post_fts MATCH ?')
+        params.append(match)
+    elif query:
+        # Chỉ có ký tự đặc biệt: không có từ nào để tìm
+        return []
+    else:
+        sql = f'SELECT {POST_COLUMNS}, NULL AS snippet, 0 AS rank FROM post p {POST_JOINS}'
+
+    if tag:
+        conditions.append(TAG_FILTER)
+        params.append(tag)
+    for column, buckets, key in (('p.cooking_time', TIME_BUCKETS, time_bucket),
+                                 ('p.servings', SERVINGS_BUCKETS, servings_bucket)):
+        condition, values = _bucket_range(column, buckets, key)
+        if condition:
+            conditions.append(condition)
+            params.extend(values)
+
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+
+    if sort == 'likes':
+        sql += ' ORDER BY p.like_count DESC, p.created DESC'
+    elif sort == 'relevance' and match:
+        sql += ' ORDER BY rank, p.created DESC'
+    else:
+        sql += ' ORDER BY p.created DESC'
+    if limit is not None:
+        sql += ' LIMIT ? OFFSET ?'
+        params.extend([limit, offset])
+
+    posts = [dict(row) for row in db.execute(sql, params).fetchall()]
+    for post in posts:
+        snippet = post.pop('snippet')
+        search_key = post.pop('search_key')
+        # Đoạn trích lấy từ search_key chỉ là tiêu đề không dấu: bỏ qua
+        if snippet and fold_text(snippet) == search_key:
+            snippet = None
+        post['snippet'] = highlight(snippet)
+    return posts
+
+
+def search_facets(db, query='', tag='', time_bucket='', servings_bucket=''):
+    """Count results per tag, cooking-time bucket and servings bucket.
+
+    One statement: the posts matching ``query`` are materialized once with
+    their buckets, then each facet is grouped over them with the *other*
+    facets' filters applied, so every count is the number of results that
+    choosing that value would leave. The same pass counts the results.
+    Returns ``{'total': n, 'tag': [(name, n)], 'time': [(key, label, n)],
+    'servings': [...]}``.
+    """
+    match = match_expression(query) if query else None
+    if query and not match:
+        return {'total': 0, 'tag': [], 'time': [], 'servings': []}
+
+    base = (
+        f"SELECT p.id, {_bucket_case('p.cooking_time', TIME_BUCKETS)} AS time_bucket, "
+        f"{_bucket_case('p.servings', SERVINGS_BUCKETS)} AS servings_bucket "
+    )
+    params = []
+    if match:
+        base += 'FROM post_fts JOIN post p ON p.id = post_fts.rowid WHERE post_fts MATCH ?'
+        params.append(match)
+    else:
+        base += 'FROM post p'
+
+    tag_filter = (
+        'EXISTS (SELECT 1 FROM post_tags ft JOIN tags t2 ON t2.id = ft.tag_id '
+        'WHERE ft.post_id = b.id AND t2.name = ?)'
+    )
+    filters = {
+        'tag': (tag_filter, [tag]) if tag else None,
+        'time': ('b.time_bucket = ?', [time_bucket]) if time_bucket else None,
+        'servings': ('b.servings_bucket = ?', [servings_bucket]) if servings_bucket else None,
+    }
+
+    def where(facet, *extra):
+        conditions = list(extra)
+        for name, value in filters.items():
+            if name != facet and value:
+                conditions.append(value[0])
+                params.extend(value[1])
+        return (' WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
+    sql = f'WITH base AS MATERIALIZED ({base}) '
+    sql += (
+        "SELECT 'tag' AS facet, t.name AS value, COUNT(*) AS n FROM base b "
+        'JOIN post_tags pt ON pt.post_id = b.id JOIN tags t ON t.id = pt.tag_id'
+        + where('tag') + ' GROUP BY t.name'
+    )
+    for facet in ('time', 'servings'):
+        sql += (
+            f" UNION ALL SELECT '{facet}', b.{facet}_bucket, COUNT(*) FROM base b"
+            + where(facet, f'b.{facet}_bucket IS NOT NULL') + f' GROUP BY b.{facet}_bucket'
+        )
+
+    sql += " UNION ALL SELECT 'total', NULL, COUNT(*) FROM base b" + where('total')
+
+    counts = {'tag': {}, 'time': {}, 'servings': {}, 'total': {}}
+    for row in db.execute(sql, params):
+        counts[row['facet']][row['value']] = row['n']
+    return {
+        'total': counts['total'].get(None, 0),
+        'tag': sorted(counts['tag'].items(), key=lambda item: (-item[1], item[0])),
+        'time': [(key, label, counts['time'][key])
+                 for key, label, _, _ in TIME_BUCKETS if key in counts['time']],
+        'servings': [(key, label, counts['servings'][key])
+                     for key, label, _, _ in SERVINGS_BUCKETS if key in counts['servings']],
+    }
+
+
+def backfill_search_keys(db, only_missing=False):
+    """Recompute ``post.search_key`` from the titles."""
+    sql = 'SELECT id, title FROM post'
+    if only_missing:
+        sql += ' WHERE search_key IS NULL'
+    rows = db.execute(sql).fetchall()
+    db.executemany(
+        'UPDATE post SET search_key = ? WHERE id = ?',
+        [(fold_text(row['title']), row['id']) for row in rows]
+    )
+    return len(rows)
+
+
+def rebuild_index(db=None):
+    """Repopulate ``post_fts`` from the source tables."""
+    db = get_db() if db is None else db
+    with db:
+        backfill_search_keys(db)
+        db.execute('DELETE FROM post_fts')
+        db.execute(
+            'INSERT INTO post_fts (rowid, title, description, ingredients, instructions, tags, search_key) '
+            "SELECT p.id, p.title, coalesce(p.description, ''), p.ingredients, p.instructions, "
+            "coalesce((SELECT group_concat(t.name, ' ') FROM post_tags pt "
+            "JOIN tags t ON t.id = pt.tag_id WHERE pt.post_id = p.id), ''), "
+            "coalesce(p.search_key, '') "
+            'FROM post p'
+        )
+        db.execute("INSERT INTO post_fts (post_fts) VALUES ('optimize')")
+    return db.execute('SELECT COUNT(*) FROM post_fts').fetchone()[0]
+
+
+@click.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the full-text recipe search index."""
+    click.echo(f'Indexed {rebuild_index()} recipes.')
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_search_index_command)
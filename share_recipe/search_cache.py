@@ -0,0 +1,106 @@
+"""Result cache for ``blog.search``.
+
+Entries are kept in a size-bounded LRU with a TTL, keyed by the normalized
+search parameters plus the current cache generation. The generations live
+in the ``counters`` table and are bumped by triggers (migration 0009) on
+every write that can change a result, so invalidation needs no hooks in the
+views and reaches every worker process: the next lookup simply misses. Only
+``sort=likes`` results depend on ``likes_generation``, so favorite toggles
+leave the other entries alone.
+"""
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class SearchCache:
+    def __init__(self, max_entries=256, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+def get_cache(app=None):
+    app = app or current_app
+    return app.extensions['search_cache']
+
+
+def normalize_query(text):
+    """Canonical form of a search string: NFC, lowercase, single spaces."""
+    return ' '.join(unicodedata.normalize('NFC', text).lower().split())
+
+
+def generations(db):
+    rows = db.execute(
+        "SELECT name, value FROM counters WHERE name IN ('search_generation', 'likes_generation')"
+    ).fetchall()
+    return {row['name']: row['value'] for row in rows}
+
+
+def cached(db, key, sort, compute):
+    """Return ``compute()`` for ``key``, from the cache when still valid."""
+    cache = get_cache()
+    if cache.max_entries <= 0:
+        return compute()
+    gens = generations(db)
+    full_key = key + (gens.get('search_generation'),)
+    if sort == 'likes':
+        full_key += (gens.get('likes_generation'),)
+    value = cache.get(full_key)
+    if value is None:
+        value = compute()
+        cache.set(full_key, value)
+    return value
+
+
+def init_app(app):
+    app.extensions['search_cache'] = SearchCache(
+        app.config['SEARCH_CACHE_SIZE'], app.config['SEARCH_CACHE_TTL']
+    )
@@ -0,0 +1,395 @@
+"""Content-addressed storage for uploaded images.
+
+An upload is streamed to a temporary file in fixed-size chunks while its
+SHA-256 is computed, then moved to ``uploads/blobs/ab/cd/<sha256>.<ext>``.
+Identical bytes therefore always land on the same path and are stored once,
+however many posts or avatars use them.
+
+The ``blobs`` table counts the ``blog_images.image_path`` and
+``user.avatar_path`` rows pointing at each path; triggers keep it current
+(migration 0013). :func:`release` unlinks a file only once no row
+references it any more. Paths from before this module (``uploads/blog_images``,
+``uploads/avatars``) are counted the same way and can be moved into the
+blob store with ``flask dedupe-uploads``.
+
+Uploads never pass through Werkzeug's in-memory spooling: :class:`UploadRequest`
+hands every multipart file part to an :class:`UploadSink`, which writes it
+straight to a temp file under ``uploads/blobs/tmp`` while hashing it,
+identifies the image type from its magic bytes and enforces the per-type
+size limit (``UPLOAD_TYPE_LIMITS``) as the bytes arrive, so a bad or
+oversized file aborts the request before the rest is read. :func:`save`
+only stages the file; :func:`publish` renames the staged files into place
+after the view has committed, and anything not published is deleted when
+the request ends. Views drop references in their transaction and queue a
+``storage.release`` job (share_recipe/jobs.py) instead of unlinking files
+while the request waits.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import click
+from flask import Request, current_app, g, request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+from share_recipe import images, jobs
+from share_recipe.db import get_db
+
+BLOB_DIR = 'uploads/blobs'
+CHUNK_SIZE = 64 * 1024
+# Cùng nội dung thì cùng đuôi file, nếu không sẽ thành hai blob
+EXTENSION_ALIASES = {'jpeg': 'jpg'}
+# (đuôi file, các byte đầu tiên) của các loại ảnh được chấp nhận
+MAGIC_NUMBERS = (
+    ('jpg', b'\xff\xd8\xff'),
+    ('png', b'\x89PNG\r\n\x1a\n'),
+    ('gif', b'GIF87a'),
+    ('gif', b'GIF89a'),
+)
+SNIFF_BYTES = 8
+
+
+def _static_path(path):
+    return os.path.join(current_app.static_folder, path)
+
+
+def extension(filename):
+    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'bin'
+    return EXTENSION_ALIASES.get(ext, ext)
+
+
+def blob_path(digest, ext):
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}.{ext}'
+
+
+def _store(stream, ext):
+    """Copy ``stream`` into the blob store chunk by chunk; return its path."""
+    tmp_dir = _static_path(os.path.join(BLOB_DIR, 'tmp'))
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+        path = blob_path(digest.hexdigest(), ext)
+        full_path = _static_path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Ghi đè một blob đã có bằng chính nội dung của nó: vô hại và atomic
+        os.replace(tmp_path, full_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def sniff(head):
+    """Image type (file extension) from the first bytes of a file, or None."""
+    for ext, magic in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return ext
+    return None
+
+
+class UploadSink:
+    """Write target for one uploaded file: hashes, sniffs and size-checks
+    the bytes as the multipart parser streams them to a temp file."""
+
+    def __init__(self, tmp_dir, limits):
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self._digest = hashlib.sha256()
+        self._head = b''
+        self._limits = limits
+        self.ext = None
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.ext is None:
+            self._head = (self._head + data)[:SNIFF_BYTES]
+            if len(self._head) == SNIFF_BYTES:
+                self._check_type()
+        if self.ext is not None and self.size > self._limits.get(self.ext, 0):
+            limit = self._limits.get(self.ext, 0) / (1024 * 1024)
+            raise RequestEntityTooLarge(f'Ảnh {self.ext.upper()} không được lớn hơn {limit:.3g}MB.')
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def _check_type(self):
+        self.ext = sniff(self._head)
+        if self.ext is None:
+            raise UnsupportedMediaType('File tải lên không phải ảnh PNG, JPG hoặc GIF.')
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # Parser gọi seek(0) khi file đã nhận xong: file quá ngắn thì kiểm tra lúc này
+        if self.ext is None and self.size:
+            self._check_type()
+        return self._file.seek(offset, whence)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+def _new_sink():
+    sink = UploadSink(_static_path(os.path.join(BLOB_DIR, 'tmp')),
+                      current_app.config['UPLOAD_TYPE_LIMITS'])
+    g.setdefault('upload_sinks', []).append(sink)
+    return sink
+
+
+class UploadRequest(Request):
+    """Request whose multipart file parts go to an :class:`UploadSink`."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return _new_sink()
+
+
+def save(file):
+    """Stage an uploaded ``FileStorage`` in the blob store; return its static path.
+
+    The file becomes visible at that path only when :func:`publish` runs
+    after the database commit.
+    """
+    sink = file.stream
+    if not isinstance(sink, UploadSink):
+        # Không qua UploadRequest: chép qua một sink để được kiểm tra như nhau
+        sink = _new_sink()
+        for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+            sink.write(chunk)
+    sink.seek(0)
+    if sink.ext is None:
+        raise UnsupportedMediaType('File tải lên rỗng.')
+    path = blob_path(sink.hexdigest(), sink.ext)
+    g.setdefault('staged_uploads', {})[path] = sink.tmp_path
+    return path
+
+
+def local_path(path):
+    """Where the bytes of ``path`` can be read now: the staged temp file
+    before :func:`publish`, the static file afterwards."""
+    return g.get('staged_uploads', {}).get(path) or _static_path(path)
+
+
+def publish():
+    """Move the files staged by :func:`save` into place. Call after commit."""
+    staged = g.pop('staged_uploads', {})
+    for path, tmp_path in staged.items():
+        full_path = _static_path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Ghi đè một blob đã có bằng chính nội dung của nó: vô hại và atomic
+        os.replace(tmp_path, full_path)
+
+
+def discard(exc=None):
+    """Delete the temp files of uploads that were not published."""
+    g.pop('staged_uploads', None)
+    for sink in g.pop('upload_sinks', []):
+        sink.close()
+        try:
+            os.remove(sink.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def is_referenced(db, path):
+    return db.execute('SELECT 1 FROM blobs WHERE path = ?', (path,)).fetchone() is not None
+
+
+def release(db, path, variants=None):
+    """Delete ``path`` and its ``variants`` if no row references it any more.
+
+    Call after the rows have been changed on the same connection, so the
+    triggers have already updated ``blobs``. Returns True if a file was
+    removed.
+    """
+    if not path or is_referenced(db, path):
+        return False
+    images.delete_variants(variants)
+    try:
+        os.remove(_static_path(path))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+@jobs.task('storage.release')
+def release_job(path, variants=None):
+    """Background :func:`release`, queued by views after they drop a reference."""
+    db = get_db()
+    # Giữ write lock từ lúc kiểm tra tới lúc xóa: upload cùng nội dung không thể
+    # commit một tham chiếu mới vào giữa (publish của nó chạy sau commit)
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        release(db, path, variants)
+    finally:
+        db.commit()
+
+
+def _file_digest(full_path):
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dedupe(db, dry_run=False):
+    """Move uploads stored outside ``BLOB_DIR`` into the blob store.
+
+    Rows are repointed at the content-addressed path and the old file is
+    released. Variants named after the old path are dropped (the rows get
+    ``variants = NULL``) and rebuilt afterwards when Pillow is available.
+    Returns a dict of counts and byte totals.
+    """
+    legacy = db.execute(
+        'SELECT path FROM blobs WHERE path NOT LIKE ? ORDER BY path', (BLOB_DIR + '/%',)
+    ).fetchall()
+    stats = {'files': 0, 'missing': 0, 'blobs': 0, 'bytes': 0, 'freed': 0}
+    seen = set()
+    for row in legacy:
+        old_path = row['path']
+        full_path = _static_path(old_path)
+        if not os.path.isfile(full_path):
+            stats['missing'] += 1
+            continue
+        size = os.path.getsize(full_path)
+        new_path = blob_path(_file_digest(full_path), extension(old_path))
+        stats['files'] += 1
+        stats['bytes'] += size
+        if new_path in seen or is_referenced(db, new_path):
+            stats['freed'] += size
+        else:
+            stats['blobs'] += 1
+        seen.add(new_path)
+        if dry_run:
+            continue
+
+        if not os.path.exists(_static_path(new_path)):
+            with open(full_path, 'rb') as f:
+                _store(f, extension(old_path))
+        old_variants = [r['variants'] for r in db.execute(
+            'SELECT variants FROM blog_images WHERE image_path = ? AND variants IS NOT NULL '
+            'UNION SELECT avatar_variants FROM user '
+            'WHERE avatar_path = ? AND avatar_variants IS NOT NULL',
+            (old_path, old_path)
+        )]
+        with db:
+            db.execute('UPDATE blog_images SET image_path = ?, variants = NULL WHERE image_path = ?',
+                       (new_path, old_path))
+            db.execute('UPDATE user SET avatar_path = ?, avatar_variants = NULL WHERE avatar_path = ?',
+                       (new_path, old_path))
+        for variants in old_variants:
+            images.delete_variants(variants)
+        release(db, old_path)
+
+    if not dry_run and images.available():
+        stats['variants'] = images.build_missing(db)[0]
+    return stats
+
+
+@click.command('dedupe-uploads')
+@click.option('--dry-run', is_flag=True, help='Only report what would be moved.')
+def dedupe_uploads_command(dry_run):
+    """Move existing uploads into content-addressed storage, merging duplicates."""
+    stats = dedupe(get_db(), dry_run)
+    prefix = 'Dry run: ' if dry_run else ''
+    click.echo(f"{prefix}{stats['files']} files ({stats['bytes'] / 1024:.1f} KiB) -> "
+               f"{stats['blobs']} new blobs, {stats['freed'] / 1024:.1f} KiB of duplicates.")
+    if stats['missing']:
+        click.echo(f"{stats['missing']} referenced files are missing on disk.")
+    if stats.get('variants'):
+        click.echo(f"Rebuilt variants for {stats['variants']} images.")
+
+
+def _upload_body(size):
+    boundary = 'bench-upload-boundary'
+    head = (f'--{boundary}\r\nContent-Disposition: form-data; name="image"; '
+            f'filename="bench.jpg"\r\nContent-Type: image/jpeg\r\n\r\n').encode()
+    payload = b'\xff\xd8\xff\xe0' + bytes(size - 4)
+    return head + payload + f'\r\n--{boundary}--\r\n'.encode(), boundary
+
+
+def _measure_uploads(app, request_class, body, boundary, concurrency, store):
+    """Peak traced memory while ``concurrency`` threads each parse and store one upload."""
+    errors = []
+
+    def upload():
+        try:
+            with app.test_request_context(
+                '/', method='POST', input_stream=io.BytesIO(body),
+                content_type=f'multipart/form-data; boundary={boundary}',
+                content_length=len(body),
+            ):
+                store(request.files['image'])
+        except Exception as e:
+            errors.append(e)
+
+    saved = app.request_class
+    app.request_class = request_class
+    threads = [threading.Thread(target=upload) for _ in range(concurrency)]
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        app.request_class = saved
+    if errors:
+        raise errors[0]
+    return peak, time.perf_counter() - started
+
+
+def _save_default(file):
+    # Cách cũ: Werkzeug spool vào SpooledTemporaryFile rồi FileStorage.save chép lại
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file.save(os.path.join(tmp_dir, 'upload'))
+
+
+@click.command('bench-uploads')
+@click.option('--size-mb', type=float, default=8.0, help='Size of each upload.')
+@click.option('--concurrency', type=int, default=4, help='Uploads parsed at the same time.')
+def bench_uploads_command(size_mb, concurrency):
+    """Measure memory per concurrent upload: Werkzeug default vs streaming sink."""
+    app = current_app._get_current_object()
+    body, boundary = _upload_body(int(size_mb * 1024 * 1024))
+    click.echo(f'{concurrency} concurrent uploads of {size_mb:g} MiB')
+    # save() chỉ stage file tạm; teardown của request context xóa nó
+    for label, request_class, store in (('werkzeug default', Request, _save_default),
+                                        ('streaming sink', UploadRequest, save)):
+        peak, seconds = _measure_uploads(app, request_class, body, boundary, concurrency, store)
+        click.echo(f'{label}: peak {peak / concurrency / 1024:.0f} KiB per upload, '
+                   f'{seconds * 1000:.0f} ms')
+
+
+def init_app(app):
+    app.request_class = UploadRequest
+    app.teardown_request(discard)
+    app.cli.add_command(dedupe_uploads_command)
+    app.cli.add_command(bench_uploads_command)
@@ -0,0 +1,185 @@
+"""Garbage collection of uploaded files that no row references.
+
+Files can outlive their rows: a process killed between commit and the
+``storage.release`` job, temp files of interrupted uploads, or uploads
+from before reference counting. :func:`collect` lists every file under
+:data:`UPLOAD_DIRS` and subtracts, as sets, everything the database points
+at: ``blog_images.image_path``, ``user.avatar_path`` and the WebP variants
+listed in their JSON columns. What is left and older than
+``UPLOAD_GC_GRACE`` seconds is deleted in batches of
+``UPLOAD_GC_BATCH_SIZE``.
+
+The grace period covers uploads still in flight (staged, or published
+but waiting for their variants job). Each batch is also re-checked
+against the database while holding the write lock, so a row committed
+after the scan keeps its file.
+
+Run it with ``flask gc-uploads [--dry-run]``. The ``uploads.gc`` job,
+run every ``UPLOAD_GC_INTERVAL`` seconds, only sweeps the blob store
+(:data:`SCHEDULED_DIRS`): the legacy directories also hold seed images
+tracked in git that no row references, so they are cleaned only when an
+admin runs the command.
+"""
+import os
+import time
+
+import click
+from flask import current_app
+
+from share_recipe import jobs, storage
+from share_recipe.db import get_db
+
+# Thư mục chứa file người dùng tải lên; uploads/logo là ảnh tĩnh của site
+UPLOAD_DIRS = (storage.BLOB_DIR, 'uploads/blog_images', 'uploads/avatars')
+# Job định kỳ chỉ dọn những gì chính storage.py đã ghi
+SCHEDULED_DIRS = (storage.BLOB_DIR,)
+
+REFERENCED_SQL = '''
+    SELECT image_path AS path FROM blog_images
+    UNION SELECT avatar_path FROM user WHERE avatar_path IS NOT NULL AND avatar_path != ''
+    UNION SELECT json_extract(v.value, '$.path')
+          FROM blog_images bi, json_each(bi.variants) s, json_each(s.value) v
+          WHERE bi.variants IS NOT NULL
+    UNION SELECT json_extract(v.value, '$.path')
+          FROM user u, json_each(u.avatar_variants) s, json_each(s.value) v
+          WHERE u.avatar_variants IS NOT NULL
+'''
+
+
+def _static_path(path):
+    return os.path.join(current_app.static_folder, path)
+
+
+def scan(dirs=UPLOAD_DIRS):
+    """Yield ``(path, size, mtime)`` for every file under ``dirs``."""
+    static = current_app.static_folder
+    for upload_dir in dirs:
+        for root, _dirs, files in os.walk(_static_path(upload_dir)):
+            for name in files:
+                full_path = os.path.join(root, name)
+                try:
+                    st = os.stat(full_path)
+                except FileNotFoundError:
+                    continue
+                path = os.path.relpath(full_path, static).replace(os.sep, '/')
+                yield path, st.st_size, st.st_mtime
+
+
+def referenced_paths(db, paths=None):
+    """Static paths the database points at, optionally only among ``paths``."""
+    if paths is None:
+        return {row[0] for row in db.execute(REFERENCED_SQL)}
+    placeholders = ', '.join('?' * len(paths))
+    return {row[0] for row in db.execute(
+        f'SELECT path FROM ({REFERENCED_SQL}) WHERE path IN ({placeholders})', list(paths)
+    )}
+
+
+def _remove_empty_dirs(full_path):
+    # Bỏ các thư mục shard rỗng (blobs/ab/cd), dừng ở thư mục upload
+    stop = {os.path.normpath(_static_path(d)) for d in UPLOAD_DIRS}
+    parent = os.path.dirname(full_path)
+    while os.path.normpath(parent) not in stop:
+        try:
+            os.rmdir(parent)
+        except OSError:
+            return
+        parent = os.path.dirname(parent)
+
+
+def _delete_batch(db, batch, cutoff):
+    """Delete the orphans in ``batch`` still unreferenced and old; return (files, bytes)."""
+    deleted = freed = 0
+    # Write lock: không upload nào commit tham chiếu mới tới các path này trong lúc xóa
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        referenced = referenced_paths(db, [path for path, _size in batch])
+        for path, size in batch:
+            full_path = _static_path(path)
+            try:
+                if path in referenced or os.stat(full_path).st_mtime > cutoff:
+                    continue
+                os.remove(full_path)
+            except FileNotFoundError:
+                continue
+            _remove_empty_dirs(full_path)
+            deleted += 1
+            freed += size
+    finally:
+        db.commit()
+    return deleted, freed
+
+
+def collect(db, dry_run=False, grace=None, dirs=UPLOAD_DIRS):
+    """Find (and unless ``dry_run`` delete) unreferenced uploads under ``dirs``.
+
+    Returns a dict of counts: ``files``/``bytes`` scanned, ``orphans`` and
+    ``orphan_bytes`` old enough to delete, ``recent`` orphans kept for the
+    grace period, and ``deleted``/``freed``.
+    """
+    config = current_app.config
+    grace = config['UPLOAD_GC_GRACE'] if grace is None else grace
+    cutoff = time.time() - grace
+    referenced = referenced_paths(db)
+    stats = dict.fromkeys(('files', 'bytes', 'orphans', 'orphan_bytes', 'recent',
+                           'deleted', 'freed'), 0)
+    orphans = []
+    for path, size, mtime in scan(dirs):
+        stats['files'] += 1
+        stats['bytes'] += size
+        if path in referenced:
+            continue
+        if mtime > cutoff:
+            stats['recent'] += 1
+            continue
+        stats['orphans'] += 1
+        stats['orphan_bytes'] += size
+        orphans.append((path, size))
+
+    if not dry_run:
+        batch_size = config['UPLOAD_GC_BATCH_SIZE']
+        for start in range(0, len(orphans), batch_size):
+            deleted, freed = _delete_batch(db, orphans[start:start + batch_size], cutoff)
+            stats['deleted'] += deleted
+            stats['freed'] += freed
+    return stats
+
+
+@jobs.task('uploads.gc')
+def gc_job():
+    """Scheduled :func:`collect`; queues its next run when it succeeds."""
+    stats = collect(get_db(), dirs=SCHEDULED_DIRS)
+    current_app.logger.info('Upload GC: deleted %s orphaned files (%.1f KiB)',
+                            stats['deleted'], stats['freed'] / 1024)
+    db = get_db()
+    with db:
+        jobs.enqueue('uploads.gc', delay=current_app.config['UPLOAD_GC_INTERVAL'])
+
+
+def schedule():
+    """Start the periodic GC unless it is already queued (or disabled)."""
+    interval = current_app.config['UPLOAD_GC_INTERVAL']
+    if interval:
+        db = get_db()
+        with db:
+            jobs.schedule('uploads.gc', delay=interval)
+
+
+@click.command('gc-uploads')
+@click.option('--dry-run', is_flag=True, help='Only report what would be deleted.')
+@click.option('--grace', type=float, default=None,
+              help='Keep orphans younger than this many seconds (default UPLOAD_GC_GRACE).')
+def gc_uploads_command(dry_run, grace):
+    """Delete uploaded files that no post image or avatar references."""
+    stats = collect(get_db(), dry_run, grace)
+    click.echo(f"Scanned {stats['files']} files ({stats['bytes'] / 1024:.1f} KiB).")
+    click.echo(f"{stats['orphans']} orphaned files ({stats['orphan_bytes'] / 1024:.1f} KiB) "
+               f"past the grace period, {stats['recent']} newer ones kept.")
+    if dry_run:
+        click.echo('Dry run: nothing deleted.')
+    else:
+        click.echo(f"Deleted {stats['deleted']} files ({stats['freed'] / 1024:.1f} KiB).")
+
+
+def init_app(app):
+    app.cli.add_command(gc_uploads_command)
@@ -0,0 +1,31 @@
+import os
+import tempfile
+
+import pytest
+
+from share_recipe import create_app
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(db_fd)
+    os.remove(db_path)  # database mới: create_app chạy migration và tạo admin mặc định
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': db_path,
+        'SQL_DEBUG_HEADERS': True,
+        'JOBS_EMBEDDED_WORKER': False,
+        'UPLOAD_GC_INTERVAL': 0,
+    })
+    yield app
+    os.remove(db_path)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, email='admin@example.com', password='admin123'):
+    return client.post('/auth/login', data={'email': email, 'password': password})
@@ -0,0 +1,34 @@
+import re
+
+from werkzeug.security import generate_password_hash
+
+from share_recipe import create_app
+from share_recipe.db import get_db
+from tests.conftest import login
+
+
+def dashboard_totals(client):
+    html = client.get('/admin/').get_data(as_text=True)
+    return [int(n) for n in re.findall(r'<h2 class="mt-2 mb-0">(\d+)</h2>', html)[:2]]
+
+
+def test_dashboard_sees_changes_from_other_processes(app, client):
+    login(client)
+    users, posts = dashboard_totals(client)  # được cache trong process này
+
+    # Một process khác (app khác, cùng database) thêm user và bài viết
+    other = create_app(dict(app.config, TESTING=True))
+    with other.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO user (username, email, password) VALUES ('cook', 'cook@example.com', ?)",
+            (generate_password_hash('secret1'),)
+        )
+        db.execute(
+            'INSERT INTO post (author_id, title, ingredients, instructions) '
+            "VALUES (1, 'Phở mới', 'muối', 'nấu')"
+        )
+        db.commit()
+
+    assert dashboard_totals(client) == [users + 1, posts + 1]
+    assert 'Phở mới' in client.get('/admin/').get_data(as_text=True)
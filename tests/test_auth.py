@@ -0,0 +1,28 @@
+from werkzeug.security import generate_password_hash
+
+from share_recipe import create_app
+from share_recipe.db import get_db
+from tests.conftest import login
+
+
+def test_block_applies_at_once_in_other_processes(app, client):
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO user (username, email, password) VALUES ('cook', 'cook@example.com', ?)",
+            (generate_password_hash('secret1'),)
+        )
+        db.commit()
+        user_id = db.execute("SELECT id FROM user WHERE email = 'cook@example.com'").fetchone()[0]
+    login(client, 'cook@example.com', 'secret1')
+    assert client.get('/').status_code == 200  # user được cache trong process này
+
+    # Một process khác (app khác, cùng database) khóa tài khoản
+    other = create_app(dict(app.config, TESTING=True))
+    admin = other.test_client()
+    login(admin)
+    admin.post(f'/admin/users/{user_id}/block')
+
+    response = client.get('/')
+    assert response.status_code == 302
+    assert '/auth/login' in response.headers['Location']
@@ -0,0 +1,26 @@
+from share_recipe.autocomplete import POST, TAG, PrefixIndex
+
+
+def make_index():
+    index = PrefixIndex()
+    # 300 tiêu đề có từ giữa bắt đầu bằng "ba...": xếp trước "bun" trong thứ tự chữ cái
+    items = [(POST, i, f'Gà bao {i:03d}') for i in range(300)]
+    items += [(POST, 1000, 'Bún bò Huế'), (TAG, 1, 'Bún')]
+    index.load(items)
+    return index
+
+
+def test_tags_and_start_matches_beyond_scan_limit():
+    suggestions = make_index().suggest('b', limit=3)
+    assert suggestions[:2] == [(TAG, 1, 'Bún'), (POST, 1000, 'Bún bò Huế')]
+    assert suggestions[2][0] == POST and suggestions[2][2].startswith('Gà bao')
+
+
+def test_add_and_remove_keep_ranking():
+    index = make_index()
+    index.add(POST, 2000, 'Bánh xèo')
+    assert (POST, 2000, 'Bánh xèo') in index.suggest('b', limit=3)
+    index.remove(TAG, 1)
+    index.remove(POST, 1000)
+    assert [ref_id for _, ref_id, _ in index.suggest('bu')] == []
+    assert index.suggest('xeo') == [(POST, 2000, 'Bánh xèo')]
@@ -0,0 +1,64 @@
+import pytest
+
+from share_recipe.db import get_db
+from tests.conftest import login
+
+
+def create_post(app, title, comments=0, replies_per_comment=0):
+    # App context riêng: g.sql_stats của request không được đếm các lệnh seed
+    with app.app_context():
+        return _insert_post(get_db(), title, comments, replies_per_comment)
+
+
+def _insert_post(db, title, comments, replies_per_comment):
+    post_id = db.execute(
+        'INSERT INTO post (author_id, title, description, ingredients, instructions) '
+        "VALUES (1, ?, 'mô tả', 'muối', 'nấu') RETURNING id", (title,)
+    ).fetchone()[0]
+    for i in range(comments):
+        comment_id = db.execute(
+            'INSERT INTO comments (post_id, author_id, content) VALUES (?, 1, ?) RETURNING id',
+            (post_id, f'bình luận {i}')
+        ).fetchone()[0]
+        db.executemany(
+            'INSERT INTO comment_replies (comment_id, author_id, content) VALUES (?, 1, ?)',
+            [(comment_id, f'trả lời {j}') for j in range(replies_per_comment)]
+        )
+    db.commit()
+    return post_id
+
+
+def detail_statements(client, post_id):
+    response = client.get(f'/{post_id}/detail')
+    assert response.status_code == 200
+    return int(response.headers['X-SQL-Queries'])
+
+
+@pytest.mark.parametrize('logged_in', [False, True])
+def test_detail_statement_count_does_not_grow_with_comments(app, client, logged_in):
+    empty = create_post(app, 'Không có bình luận')
+    busy = create_post(app, 'Nhiều bình luận', comments=300, replies_per_comment=2)
+    if logged_in:
+        login(client)
+        # Lần đầu tải user vào cache của process: không tính vào phép so sánh
+        client.get('/')
+
+    assert detail_statements(client, empty) == detail_statements(client, busy)
+
+
+def test_detail_includes_current_user_reactions(app, client):
+    post_id = create_post(app, 'Có phản ứng', comments=3)
+    with app.app_context():
+        db = get_db()
+        comment_id = db.execute(
+            'SELECT id FROM comments WHERE post_id = ? ORDER BY id LIMIT 1', (post_id,)
+        ).fetchone()[0]
+        db.execute(
+            "INSERT INTO comment_reactions (comment_id, user_id, reaction_type) VALUES (?, 1, 'like')",
+            (comment_id,)
+        )
+        db.commit()
+    login(client)
+
+    html = client.get(f'/{post_id}/detail').get_data(as_text=True)
+    assert f'&#34;{comment_id}&#34;: &#34;like&#34;' in html
@@ -0,0 +1,42 @@
+import sqlite3
+
+from share_recipe import ingredients, migrate, recipe_search
+
+POSTS = [
+    ('Phở bò Hà Nội', '- 500g thịt bò\n- Bánh phở\nGia vị: muối, tiêu, hành (lá)'),
+    ('Đậu hũ sốt cà', 'Đậu hũ: 2 miếng\n3 quả cà chua và 1 củ hành tím'),
+]
+
+
+def _search_keys(db):
+    return [tuple(row) for row in db.execute('SELECT id, search_key FROM post ORDER BY id')]
+
+
+def _index(db):
+    return sorted(tuple(row) for row in db.execute(
+        'SELECT pi.post_id, i.key, i.name FROM post_ingredient pi '
+        'JOIN ingredient i ON i.id = pi.ingredient_id'
+    ))
+
+
+def test_backfill_migrations_match_app_code():
+    db = sqlite3.connect(':memory:')
+    db.row_factory = sqlite3.Row
+    migrate.upgrade(db, target=5, log=lambda *args: None)
+    db.execute("INSERT INTO user (username, password, email) VALUES ('a', 'x', 'a@example.com')")
+    db.executemany(
+        "INSERT INTO post (author_id, title, ingredients, instructions) VALUES (1, ?, ?, '')",
+        POSTS
+    )
+    migrate.upgrade(db, target=8, log=lambda *args: None)
+
+    migrated_keys = _search_keys(db)
+    migrated_index = _index(db)
+    assert migrated_keys[0] == (1, 'pho bo ha noi')
+    assert migrated_index
+
+    # Các CLI rebuild dùng code hiện tại phải cho cùng kết quả với bản đóng băng
+    recipe_search.backfill_search_keys(db)
+    ingredients.reindex_all(db)
+    assert _search_keys(db) == migrated_keys
+    assert _index(db) == migrated_index
@@ -0,0 +1,43 @@
+import base64
+import json
+
+import pytest
+
+from share_recipe.pagination import decode_cursor, encode_cursor
+
+
+def make_token(payload):
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def test_round_trip():
+    token = encode_cursor('next', '2024-01-02 03:04:05', 42)
+    assert decode_cursor(token) == ('next', '2024-01-02 03:04:05', 42)
+
+
+@pytest.mark.parametrize('payload', [
+    json.dumps(['next', 1, 10 ** 30]),
+    json.dumps(['next', 10 ** 30, 1]),
+    json.dumps(['prev', -2 ** 63 - 1, 1]),
+    json.dumps(['next', 1, 2 ** 63]),
+    '["next", NaN, 1]',
+    '["next", Infinity, 1]',
+    '["next", -Infinity, 1]',
+    json.dumps(['next', [1], 1]),
+    json.dumps(['next', {'a': 1}, 1]),
+    json.dumps(['next', True, 1]),
+    json.dumps(['next', 'x', 1.5]),
+    json.dumps({'a': 1}),
+])
+def test_rejects_unbindable_cursors(payload):
+    assert decode_cursor(make_token(payload)) is None
+
+
+def test_accepts_64_bit_bounds():
+    assert decode_cursor(make_token(json.dumps(['next', -2 ** 63, 2 ** 63 - 1]))) is not None
+
+
+@pytest.mark.parametrize('url', ['/', '/category/Món nước'])
+def test_listing_ignores_oversized_cursor(client, url):
+    token = make_token(json.dumps(['next', 1, 10 ** 30]))
+    assert client.get(url, query_string={'cursor': token}).status_code == 200